@@ -1,32 +1,47 @@
 # app_crud.py - Streamlit (Movimentações + Planejamentos + Calendário Anual)
 
+import time
+
+_t0_imports = time.perf_counter()
+
+import os
+import tempfile
 import datetime
 import pandas as pd
 import streamlit as st
 
+import dinheiro
+import exportacao
+from grid_diff import diff_grid, linhas_marcadas
+
 from db_crud import (
-    get_supabase_client,
+    get_client,
+    registrar_tempo_startup,
+    relatorio_startup,
+    startup_report_ativo,
+    relatorio_memoria,
     # mov
     inserir_movimentacao,
-    atualizar_movimentacao,
-    carregar_movimentacoes,
+    atualizar_movimentacao_campos,
+    carregar_extrato_pagina,
+    buscar_movimentacoes,
     deletar_movimentacao,
     # plan
     inserir_planejado,
-    atualizar_planejado,
+    atualizar_planejados_em_lote,
     buscar_planejados,
     # lookups
     buscar_caixinhas,
     buscar_pessoas,
+    # update em lote (grids)
+    atualizar_em_lote,
     # calendario
-    carregar_eventos_calendario,
+    carregar_eventos_calendario_por_mes,
     inserir_evento_calendario,
-    atualizar_evento_calendario,
     deletar_evento_calendario,
-    converter_evento_para_planejado,
+    converter_eventos_para_planejado,
     TIPO_EVENTO_CALENDARIO,
     # metas
-    carregar_metas_semestre,
     inserir_meta,
     atualizar_meta,
     deletar_meta,
@@ -36,53 +51,44 @@ from db_crud import (
     # prioridades
     carregar_prioridades,
     inserir_prioridade,
-    atualizar_prioridade,
     deletar_prioridade,
     STATUS_PRIORIDADE_OPTIONS,
     HORIZONTE_PRIORIDADE_OPTIONS,
     # círculo da vida
-    carregar_areas_vida,
-    carregar_checkin_mes,
-    salvar_checkin_area,
-    historico_checkins_ano,
+    salvar_checkins_mes,
+    historico_checkins_periodo,
     # desapego
     carregar_desapego,
     inserir_desapego_item,
-    atualizar_desapego_item,
     deletar_desapego_item,
-    criar_planejado_de_desapego,
+    criar_planejados_de_desapego,
     DECISAO_DESAPEGO_OPTIONS,
     # dashboard
     carregar_mov_mes_agregado,
     carregar_planejado_mes_agregado,
-    inserir_movimentacoes_em_lote,
     carregar_mov_mes_agregado_caixinha,
     carregar_planejado_mes_agregado_caixinha,
+    carregar_real_x_planejado_periodo,
+    panorama_ano,
+    carregar_previsao_caixa,
+    carregar_simulacao_saldo,
+    inserir_movimentacoes_em_lote,
 )
 
+registrar_tempo_startup("imports (app)", _t0_imports)
+
 STATUS_MOV_OPTIONS = ["PENDENTE", "CONFIRMADO", "CONCILIADO"]
+ORIGEM_MOV_OPTIONS = ["PLANEJADO", "EXTRATO_BANCO", "MANUAL"]
 RECORRENCIA_OPTIONS = ["MENSAL", "SEMANAL", "UNICO"]
+EXTRATO_POR_PAGINA = 100
 
 st.set_page_config(layout="wide", page_title="Finanças - Casal")
 
-# --- CONEXÃO E LISTAS ---
-try:
-    _client = get_supabase_client()
-    caixinhas_map = buscar_caixinhas()
-    pessoas_map = buscar_pessoas()
-
-    if not caixinhas_map:
-        st.sidebar.warning("⚠️ Nenhuma caixinha encontrada.")
-    if not pessoas_map:
-        st.sidebar.warning("⚠️ Nenhuma pessoa encontrada. Cadastre em pessoa primeiro.")
 
-    st.sidebar.success("✅ Conectado ao Supabase")
-except Exception as e:
-    st.sidebar.error(f"❌ Erro de conexão: {e}")
-    st.stop()
+@st.cache_data(ttl=600, show_spinner=False)
+def _carregar_listas():
+    return buscar_caixinhas(), buscar_pessoas()
 
-DEFAULT_PESSOA = "Casal" if "Casal" in pessoas_map else (list(pessoas_map.keys())[0] if pessoas_map else None)
-DEFAULT_PESSOA_INDEX = (list(pessoas_map.keys()).index(DEFAULT_PESSOA) if DEFAULT_PESSOA in pessoas_map else 0)
 
 # --- SIDEBAR ---
 st.sidebar.title("💰 Sistema Financeiro de Casal")
@@ -184,8 +190,51 @@ opcao = active_label
 
 
 if st.sidebar.button("🔄 Recarregar listas (Caixinhas/Pessoas)"):
+    _carregar_listas.clear()
     st.rerun()
 
+# --- CONEXÃO E LISTAS ---
+# Só depois do menu: o sidebar já aparece enquanto o banco responde.
+# Listas ficam em cache no processo (compartilhadas entre sessões) até o botão acima.
+try:
+    get_client()
+    _t0_listas = time.perf_counter()
+    caixinhas_map, pessoas_map = _carregar_listas()
+    registrar_tempo_startup("primeira query (listas)", _t0_listas)
+
+    if not caixinhas_map:
+        st.sidebar.warning("⚠️ Nenhuma caixinha encontrada.")
+    if not pessoas_map:
+        st.sidebar.warning("⚠️ Nenhuma pessoa encontrada. Cadastre em pessoa primeiro.")
+
+    st.sidebar.success("✅ Conectado ao Supabase")
+except Exception as e:
+    st.sidebar.error(f"❌ Erro de conexão: {e}")
+    st.stop()
+
+DEFAULT_PESSOA = "Casal" if "Casal" in pessoas_map else (list(pessoas_map.keys())[0] if pessoas_map else None)
+DEFAULT_PESSOA_INDEX = (list(pessoas_map.keys()).index(DEFAULT_PESSOA) if DEFAULT_PESSOA in pessoas_map else 0)
+
+if startup_report_ativo():
+    from db_transporte import estatisticas_pool
+
+    with st.sidebar.expander("⏱️ Startup (ms)", expanded=False):
+        for etapa, ms in relatorio_startup().items():
+            st.write(f"{etapa}: **{ms:,.0f} ms**")
+
+        pool = estatisticas_pool()
+        if pool:
+            st.caption(
+                f"Pool HTTP: {pool['em_voo']}/{pool['max_conexoes']} em uso "
+                f"(pico {pool['pico']}, abertas {pool['abertas']}, ociosas {pool['ociosas']}, "
+                f"HTTP/2 {'sim' if pool['http2'] else 'não'})"
+            )
+            if pool["saturadas"]:
+                st.warning(
+                    f"{pool['saturadas']} de {pool['requisicoes']} requisições esperaram conexão livre "
+                    f"({pool['pct_saturadas']:.1f}%). Aumente SUPABASE_MAX_CONEXOES."
+                )
+
 # ======================================================================================
 # MÓDULO: DASHBOARD
 # ======================================================================================
@@ -210,9 +259,88 @@ if opcao == "📊 Dashboard":
     id_pessoa = None if pessoa_nome == "(Todas)" else pessoas_map.get(pessoa_nome)
 
     somente_confirmado = st.checkbox("Considerar apenas CONFIRMADO/CONCILIADO no Real", value=True)
+    modo = st.radio("Visão", ["Mês", "Tendência"], horizontal=True)
+    usar_espelho = modo == "Mês" and st.checkbox("Usar espelho local (baixa só o que mudou desde a última vez)", value=False)
+
+    if usar_espelho:
+        import espelho_local
+
+        ok, stats = espelho_local.sincronizar()
+        if ok:
+            st.caption(
+                "Espelho sincronizado: "
+                + ", ".join(f"{t} +{v['alteradas']}/-{v['excluidas']} ({v['total']} linhas)" for t, v in stats.items())
+            )
+        else:
+            st.warning(f"{stats} Lendo direto do Supabase.")
+            usar_espelho = False
+
+    if modo == "Tendência":
+        # ==========================
+        # TENDÊNCIA: n meses terminando em dezembro do ano escolhido
+        # ==========================
+        t1, t2 = st.columns(2)
+        n_meses = t1.selectbox("Meses", [12, 18, 24], index=0)
+        nivel = t2.radio("Agrupar por", ["categoria", "caixinha"], horizontal=True)
+
+        fim_periodo = datetime.date(ano, 12, 1)
+        ini_periodo = (pd.Timestamp(fim_periodo) - pd.DateOffset(months=n_meses - 1)).date()
+
+        with st.spinner("Carregando período..."):
+            df_tend = carregar_real_x_planejado_periodo(ini_periodo, n_meses, id_pessoa, somente_confirmado, nivel)
+
+        if df_tend.empty:
+            st.info("Sem planejado nem movimentações no período.")
+            st.stop()
+
+        if ano == hoje.year:
+            st.subheader(f"Panorama {ano}")
+            pan = panorama_ano(df_tend, ano, hoje).set_index("tipo")
+            p1, p2 = st.columns(2)
+            for col, tipo, rotulo in ((p1, "ENTRADA", "Receitas"), (p2, "SAIDA", "Despesas")):
+                if tipo in pan.index:
+                    r = pan.loc[tipo]
+                    col.metric(
+                        f"{rotulo}: previsão de fechamento",
+                        f"{r['previsao_fechamento']:,.2f}",
+                        delta=f"{(r['previsao_fechamento'] - r['planejado_ano']):,.2f} vs planejado",
+                    )
+                    col.caption(
+                        f"Real até agora {r['real_ate_hoje']:,.2f} + projetado {r['projetado_restante']:,.2f}"
+                    )
+            st.caption("Mês atual conta o maior entre real e planejado; meses seguintes, o planejado.")
+
+        st.subheader("Por mês")
+        tot = df_tend.groupby(["mes", "tipo"])[["planejado", "real"]].sum().unstack("tipo", fill_value=0.0)
+        tot.columns = [f"{v} {t}" for v, t in tot.columns]
+        st.line_chart(tot)
+
+        st.subheader(f"Gap (planejado - real) por {nivel}")
+        for tipo, rotulo in (("ENTRADA", "Receitas"), ("SAIDA", "Despesas")):
+            parte = df_tend[df_tend["tipo"].astype(str).str.upper() == tipo]
+            if parte.empty:
+                continue
+            st.markdown(f"**{rotulo}**")
+            gap = parte.pivot_table(index=nivel, columns="mes", values="gap", aggfunc="sum", fill_value=0.0)
+            gap.columns = [pd.Timestamp(c).strftime("%m/%Y") for c in gap.columns]
+            st.dataframe(gap.round(2), use_container_width=True)
+        st.stop()
+
+    if usar_espelho:
+        df_real = carregar_mov_mes_agregado(ano, mes, id_pessoa, somente_confirmado, usar_espelho=True)
+        df_plan = carregar_planejado_mes_agregado(ano, mes, id_pessoa, usar_espelho=True)
+        df_real_cx = carregar_mov_mes_agregado_caixinha(ano, mes, id_pessoa, somente_confirmado, usar_espelho=True)
+        df_plan_cx = carregar_planejado_mes_agregado_caixinha(ano, mes, id_pessoa, usar_espelho=True)
+    else:
+        # as 4 consultas são independentes: vão juntas (a página espera só a mais lenta)
+        import db_crud_async as dba
 
-    df_real = carregar_mov_mes_agregado(ano, mes, id_pessoa=id_pessoa, somente_confirmado=somente_confirmado)
-    df_plan = carregar_planejado_mes_agregado(ano, mes, id_pessoa=id_pessoa)
+        df_real, df_plan, df_real_cx, df_plan_cx = dba.rodar_em_paralelo(
+            dba.carregar_mov_mes_agregado(ano, mes, id_pessoa=id_pessoa, somente_confirmado=somente_confirmado),
+            dba.carregar_planejado_mes_agregado(ano, mes, id_pessoa=id_pessoa),
+            dba.carregar_mov_mes_agregado_caixinha(ano, mes, id_pessoa=id_pessoa, somente_confirmado=somente_confirmado),
+            dba.carregar_planejado_mes_agregado_caixinha(ano, mes, id_pessoa=id_pessoa),
+        )
 
     def norm(df):
         if df is None or df.empty:
@@ -242,16 +370,22 @@ if opcao == "📊 Dashboard":
     receitas = base[base["tipo"] == "ENTRADA"].copy()
     despesas = base[base["tipo"] == "SAIDA"].copy()
 
-    total_rec_plan = float(receitas["planejado"].sum()) if not receitas.empty else 0.0
-    total_rec_real = float(receitas["real"].sum()) if not receitas.empty else 0.0
-    gap_rec = total_rec_plan - total_rec_real
+    # totais em centavos (sem resíduo de float nos KPIs)
+    c_rec_plan = int(dinheiro.centavos_array(receitas["planejado"]).sum())
+    c_rec_real = int(dinheiro.centavos_array(receitas["real"]).sum())
+    c_desp_plan = int(dinheiro.centavos_array(despesas["planejado"]).sum())
+    c_desp_real = int(dinheiro.centavos_array(despesas["real"]).sum())
 
-    total_desp_plan = float(despesas["planejado"].sum()) if not despesas.empty else 0.0
-    total_desp_real = float(despesas["real"].sum()) if not despesas.empty else 0.0
-    gap_desp = total_desp_plan - total_desp_real  # positivo = sobrou orçamento / negativo = estourou
+    total_rec_plan = dinheiro.em_reais(c_rec_plan)
+    total_rec_real = dinheiro.em_reais(c_rec_real)
+    gap_rec = dinheiro.em_reais(c_rec_plan - c_rec_real)
 
-    saldo_plan = total_rec_plan - total_desp_plan
-    saldo_real = total_rec_real - total_desp_real
+    total_desp_plan = dinheiro.em_reais(c_desp_plan)
+    total_desp_real = dinheiro.em_reais(c_desp_real)
+    gap_desp = dinheiro.em_reais(c_desp_plan - c_desp_real)  # positivo = sobrou orçamento / negativo = estourou
+
+    saldo_plan = dinheiro.em_reais(c_rec_plan - c_desp_plan)
+    saldo_real = dinheiro.em_reais(c_rec_real - c_desp_real)
 
     # ==========================
     # KPIs (SEPARADOS)
@@ -346,13 +480,6 @@ if opcao == "📊 Dashboard":
     # ==========================
     st.subheader("Despesas — Planejado x Real (SAÍDA) — por caixinha")
 
-    df_real_cx = carregar_mov_mes_agregado_caixinha(
-        ano, mes, id_pessoa=id_pessoa, somente_confirmado=somente_confirmado
-    )
-    df_plan_cx = carregar_planejado_mes_agregado_caixinha(
-        ano, mes, id_pessoa=id_pessoa
-    )
-
     def norm_cx(df):
         if df is None or df.empty:
             return pd.DataFrame(columns=["caixinha", "tipo", "valor"])
@@ -386,6 +513,79 @@ if opcao == "📊 Dashboard":
         dview_cx["gap"] = dview_cx["gap"].round(2)
         st.dataframe(dview_cx[["caixinha", "planejado", "real", "gap"]], use_container_width=True)
 
+    # ==========================
+    # VÁRIOS ANOS (DuckDB sobre o espelho)
+    # ==========================
+    import analise_duckdb
+
+    if usar_espelho and analise_duckdb.duckdb_disponivel():
+        with st.expander("📈 Vários anos (análise local)", expanded=False):
+            a1, a2 = st.columns(2)
+            ano_ini = a1.number_input("De", value=ano - 1, step=1)
+            ano_fim = a2.number_input("Até", value=ano, step=1)
+            if ano_ini > ano_fim:
+                st.warning("Ano inicial maior que o final.")
+            else:
+                tot = analise_duckdb.totais_mensais(int(ano_ini), int(ano_fim), id_pessoa, somente_confirmado)
+                if tot.empty:
+                    st.info("Sem dados no período.")
+                else:
+                    st.line_chart(tot.set_index("mes")[["saldo_planejado", "saldo_real"]])
+                    st.dataframe(tot.round(2), use_container_width=True)
+
+    # ==========================
+    # SALDO PREVISTO (PRÓXIMOS DIAS)
+    # ==========================
+    with st.expander("🔮 Saldo previsto (pendentes + planejados)", expanded=False):
+        dias_prev = st.select_slider("Horizonte (dias)", options=[30, 60, 90, 180, 365], value=90)
+        # o corpo do expander roda mesmo fechado: as consultas só saem no clique, e o
+        # resultado fica na sessão para os próximos reruns (mesmo horizonte/pessoa)
+        chave_prev = (dias_prev, id_pessoa)
+        if st.button("Prever saldo"):
+            with st.spinner("Projetando..."):
+                st.session_state["previsao_caixa"] = (chave_prev, carregar_previsao_caixa(dias_prev, id_pessoa))
+        guardado = st.session_state.get("previsao_caixa")
+        prev = guardado[1].copy() if guardado and guardado[0] == chave_prev else None
+        if prev is not None and prev.empty:
+            st.info("Sem saldo, pendentes ou planejados para projetar.")
+        elif prev is not None:
+            nomes = {v: k for k, v in pessoas_map.items()}
+            prev["pessoa"] = prev["fk_pessoa_id"].map(nomes).fillna(prev["fk_pessoa_id"].astype(str))
+            st.line_chart(prev.pivot_table(index="data", columns="pessoa", values="saldo"))
+
+            minimos = prev.loc[prev.groupby("pessoa")["saldo"].idxmin(), ["pessoa", "data", "saldo"]]
+            for _, r in minimos.iterrows():
+                msg = f"{r['pessoa']}: menor saldo {r['saldo']:,.2f} em {pd.Timestamp(r['data']):%d/%m/%Y}"
+                if r["saldo"] < 0:
+                    st.error(msg)
+                else:
+                    st.caption(msg)
+
+    # ==========================
+    # SIMULAÇÃO (MONTE CARLO)
+    # ==========================
+    with st.expander("🎲 Simulação de cenários (Monte Carlo)", expanded=False):
+        s1, s2, s3 = st.columns(3)
+        meses_sim = s1.selectbox("Meses à frente", [6, 12, 24], index=1)
+        caminhos = s2.selectbox("Caminhos", [1_000, 10_000, 50_000], index=1)
+        processos = s3.number_input("Processos", min_value=1, max_value=8, value=1, step=1)
+        if st.button("Simular"):
+            with st.spinner("Simulando..."):
+                sim = carregar_simulacao_saldo(meses_sim, caminhos, id_pessoa, processos=int(processos))
+            if not sim:
+                st.info("Sem histórico nem planejado para simular.")
+            else:
+                faixas = sim["faixas"].set_index("mes")
+                st.markdown("**Saldo de fim de mês (percentis)**")
+                st.line_chart(faixas)
+                est = sim["estouro"].copy()
+                est["prob_estouro"] = (est["prob_estouro"] * 100).round(1)
+                st.markdown("**Chance de as despesas passarem do planejado (%)**")
+                st.dataframe(est.round(2), use_container_width=True)
+                with st.expander("Distribuição por caixinha", expanded=False):
+                    st.dataframe(sim["caixinhas"], use_container_width=True)
+                st.caption("Base = média histórica da caixinha (planejado só sem histórico), variação = CV dos últimos 12 meses; estouro = despesas das caixinhas planejadas acima do planejado.")
+
 
 
 
@@ -615,18 +815,134 @@ elif opcao == "📥 Movimentações":
             colB.caption("Dica: se faltar a caixinha default, crie as caixinhas 'RECEITA' e 'PENDENTE DE CAIXINHA' no banco.")
 
 
+    # ==========================
+    # EXPORTAR (CSV / PARQUET)
+    # ==========================
+    with st.expander("⬇️ Exportar movimentações", expanded=False):
+        st.caption(
+            "O arquivo é montado no servidor e enviado pelo navegador. Para exportações grandes "
+            "(anos inteiros, todas as pessoas), prefira rodar `exportacao.exportar_movimentacoes` "
+            "direto num terminal Python, gravando no disco."
+        )
+        e1, e2 = st.columns(2)
+        exp_ini = e1.date_input("De", value=datetime.date.today().replace(month=1, day=1), key="exp_ini")
+        exp_fim = e2.date_input("Até", value=datetime.date.today(), key="exp_fim")
+        e3, e4, e5 = st.columns(3)
+        exp_pessoa = e3.selectbox("Pessoa", ["(Todas)"] + list(pessoas_map.keys()), key="exp_pessoa")
+        exp_cx = e4.multiselect("Caixinhas", list(caixinhas_map.keys()), key="exp_cx")
+        exp_status = e5.multiselect("Status", STATUS_MOV_OPTIONS, key="exp_status")
+        exp_formato = st.radio("Formato", exportacao.FORMATOS, horizontal=True, key="exp_formato")
+
+        if st.button("Gerar arquivo"):
+            fd, caminho = tempfile.mkstemp(suffix=f".{exp_formato}")
+            os.close(fd)
+            try:
+                with st.spinner("Exportando..."):
+                    ok, res = exportacao.exportar_movimentacoes(
+                        caminho,
+                        exp_formato,
+                        ini=exp_ini,
+                        fim=exp_fim,
+                        id_pessoa=None if exp_pessoa == "(Todas)" else pessoas_map.get(exp_pessoa),
+                        ids_caixinha=[caixinhas_map[c] for c in exp_cx],
+                        status=exp_status,
+                    )
+                if ok:
+                    st.success(f"{res} movimentação(ões) exportada(s).")
+                    with open(caminho, "rb") as f:
+                        st.download_button(
+                            "Baixar",
+                            f,
+                            file_name=f"movimentacoes_{exp_ini}_{exp_fim}.{exp_formato}",
+                            mime="text/csv" if exp_formato == "csv" else "application/octet-stream",
+                        )
+                else:
+                    st.error(res)
+            finally:
+                os.remove(caminho)
+
+    # ==========================
+    # BUSCA (descrição / extrato)
+    # ==========================
+    st.divider()
+    termo_busca = st.text_input("🔎 Buscar movimentação", placeholder="Ex.: uber, farmácia, aluguel", key="busca_termo")
+    if termo_busca.strip():
+        b1, b2, b3 = st.columns(3)
+        busca_ini = b1.date_input("De", value=None, key="busca_ini")
+        busca_fim = b2.date_input("Até", value=None, key="busca_fim")
+        busca_cx = b3.multiselect("Caixinhas", list(caixinhas_map.keys()), key="busca_cx")
+
+        df_busca = buscar_movimentacoes(
+            termo_busca,
+            ini=busca_ini,
+            fim=busca_fim,
+            ids_caixinha=[caixinhas_map[c] for c in busca_cx],
+        )
+        if df_busca.empty:
+            st.info("Nada encontrado.")
+        else:
+            st.caption(f"{len(df_busca)} resultado(s), mais relevantes primeiro.")
+            st.dataframe(
+                df_busca[["id_mov", "dt_mov", "descricao_mov", "valor_mov", "nome_caixinha", "nome_pessoa", "status_mov"]],
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "id_mov": st.column_config.NumberColumn("ID"),
+                    "dt_mov": st.column_config.DateColumn("Data"),
+                    "descricao_mov": st.column_config.TextColumn("Descrição"),
+                    "valor_mov": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+                    "nome_caixinha": st.column_config.TextColumn("Caixinha"),
+                    "nome_pessoa": st.column_config.TextColumn("Pessoa"),
+                    "status_mov": st.column_config.TextColumn("Status"),
+                },
+            )
+
     # READ/UPDATE/DELETE
     st.divider()
     st.subheader("Extrato")
-    df = carregar_movimentacoes()
+
+    # filtros vão para o Supabase; o grid recebe só uma página (keyset em dt_mov, id_mov)
+    f1, f2, f3 = st.columns(3)
+    ext_ini = f1.date_input("De", value=None, key="ext_ini")
+    ext_fim = f2.date_input("Até", value=None, key="ext_fim")
+    ext_pessoa = f3.selectbox("Pessoa", ["(Todas)"] + list(pessoas_map.keys()), key="ext_pessoa")
+    f4, f5, f6 = st.columns(3)
+    ext_cx = f4.multiselect("Caixinhas", list(caixinhas_map.keys()), key="ext_cx")
+    ext_status = f5.multiselect("Status", STATUS_MOV_OPTIONS, key="ext_status")
+    ext_origem = f6.multiselect("Origem", ORIGEM_MOV_OPTIONS, key="ext_origem")
+
+    filtros_extrato = dict(
+        ini=ext_ini,
+        fim=ext_fim,
+        id_pessoa=None if ext_pessoa == "(Todas)" else pessoas_map.get(ext_pessoa),
+        ids_caixinha=[caixinhas_map[c] for c in ext_cx],
+        status=ext_status,
+        origem=ext_origem,
+    )
+
+    # pilha de cursores: [None, cursor da pág. 2, ...]; filtro novo volta para a 1ª página
+    assinatura = repr(filtros_extrato)
+    if st.session_state.get("ext_assinatura") != assinatura:
+        st.session_state["ext_assinatura"] = assinatura
+        st.session_state["ext_cursores"] = [None]
+    cursores = st.session_state["ext_cursores"]
+
+    df, proximo, total_estimado = carregar_extrato_pagina(cursores[-1], EXTRATO_POR_PAGINA, **filtros_extrato)
+
+    p1, p2, p3 = st.columns([1, 1, 3])
+    if p1.button("◀ Anterior", disabled=len(cursores) == 1):
+        cursores.pop()
+        st.rerun()
+    if p2.button("Próxima ▶", disabled=proximo is None):
+        cursores.append(proximo)
+        st.rerun()
+    total_txt = f" de ~{total_estimado:,}".replace(",", ".") if total_estimado is not None else ""
+    p3.caption(f"Página {len(cursores)} · {len(df)} movimentação(ões){total_txt}")
 
     if df is None or df.empty:
         st.info("Nenhuma movimentação encontrada.")
         st.stop()
 
-    if "dt_mov" in df.columns:
-        df["dt_mov"] = pd.to_datetime(df["dt_mov"]).dt.date
-
     df["selecionar"] = False
 
     colunas_grid = [
@@ -639,7 +955,19 @@ elif opcao == "📥 Movimentações":
         "nome_pessoa",
         "status_mov",
     ]
-    df_view = df[[c for c in colunas_grid if c in df.columns]].sort_values(by="dt_mov", ascending=False)
+    df_view = df[[c for c in colunas_grid if c in df.columns]]
+
+    # nomes vêm como category: o grid precisa aceitar qualquer caixinha/pessoa cadastrada
+    for col, opcoes in (("nome_caixinha", caixinhas_map), ("nome_pessoa", pessoas_map)):
+        if col in df_view.columns:
+            novas = [o for o in opcoes if o not in df_view[col].cat.categories]
+            df_view[col] = df_view[col].cat.add_categories(novas)
+
+    if startup_report_ativo():
+        with st.expander("🧠 Memória do extrato", expanded=False):
+            mem = relatorio_memoria(extrato=df, grid=df_view)
+            st.caption(f"Total: {mem['kb'].sum():,.1f} KB")
+            st.dataframe(mem, use_container_width=True)
 
     edited_df = st.data_editor(
         df_view,
@@ -660,48 +988,27 @@ elif opcao == "📥 Movimentações":
     col_btn1, col_btn2 = st.columns(2)
 
     if col_btn2.button("💾 Salvar Alterações"):
-        orig_records = df_view.to_dict("records")
-        new_records = edited_df.to_dict("records")
         atualizados, erros = 0, 0
 
-        for old, new in zip(orig_records, new_records):
-            changes = False
-            if str(old.get("dt_mov")) != str(new.get("dt_mov")):
-                changes = True
-            if (old.get("descricao_mov") or "") != (new.get("descricao_mov") or ""):
-                changes = True
-            try:
-                if float(old.get("valor_mov", 0)) != float(new.get("valor_mov", 0)):
-                    changes = True
-            except Exception:
-                changes = True
-            if (old.get("status_mov") or "") != (new.get("status_mov") or ""):
-                changes = True
-            if (old.get("nome_caixinha") or "") != (new.get("nome_caixinha") or ""):
-                changes = True
-            if (old.get("nome_pessoa") or "") != (new.get("nome_pessoa") or ""):
-                changes = True
-
-            if changes:
-                id_cx_novo = caixinhas_map.get(new["nome_caixinha"])
-                id_pes_novo = pessoas_map.get(new["nome_pessoa"])
-                if not id_cx_novo or not id_pes_novo:
+        # só as colunas alteradas de cada linha vão para o banco
+        for patch in diff_grid(df_view, edited_df, "id_mov", ignorar=("selecionar",)):
+            id_mov = patch.pop("id_mov")
+            if "nome_caixinha" in patch:
+                patch["fk_caixinha_id"] = caixinhas_map.get(patch.pop("nome_caixinha"))
+                if not patch["fk_caixinha_id"]:
                     erros += 1
                     continue
-
-                ok, _ = atualizar_movimentacao(
-                    id_mov=new["id_mov"],
-                    dt_mov=new["dt_mov"],
-                    descricao_mov=new.get("descricao_mov"),
-                    valor_mov=new.get("valor_mov"),
-                    fk_caixinha_id=id_cx_novo,
-                    fk_pessoa_id=id_pes_novo,
-                    status_mov=new.get("status_mov"),
-                )
-                if ok:
-                    atualizados += 1
-                else:
+            if "nome_pessoa" in patch:
+                patch["fk_pessoa_id"] = pessoas_map.get(patch.pop("nome_pessoa"))
+                if not patch["fk_pessoa_id"]:
                     erros += 1
+                    continue
+
+            ok, _ = atualizar_movimentacao_campos(id_mov, patch)
+            if ok:
+                atualizados += 1
+            else:
+                erros += 1
 
         if atualizados:
             st.success(f"{atualizados} registro(s) atualizado(s)!")
@@ -711,13 +1018,12 @@ elif opcao == "📥 Movimentações":
 
     if col_btn1.button("🗑️ Deletar Selecionados"):
         deletados, erros = 0, 0
-        for row in edited_df.to_dict("records"):
-            if row.get("selecionar"):
-                ok, _ = deletar_movimentacao(row["id_mov"])
-                if ok:
-                    deletados += 1
-                else:
-                    erros += 1
+        for id_mov in linhas_marcadas(edited_df, "selecionar", "id_mov"):
+            ok, _ = deletar_movimentacao(id_mov)
+            if ok:
+                deletados += 1
+            else:
+                erros += 1
 
         if deletados:
             st.success(f"{deletados} registro(s) apagado(s).")
@@ -779,15 +1085,11 @@ elif opcao == "🗓️ Planejamentos":
                         st.error(resp)
 
     st.divider()
-    plans = buscar_planejados()
-    if not plans:
+    df_plans = buscar_planejados()
+    if df_plans.empty:
         st.info("Nenhum planejamento cadastrado.")
         st.stop()
 
-    df_plans = pd.DataFrame(plans)
-    if "dt_inicio_plan" in df_plans.columns:
-        df_plans["dt_inicio_plan"] = pd.to_datetime(df_plans["dt_inicio_plan"]).dt.date
-
     colunas_pref = [
         "id_plan",
         "recorrencia_plan",
@@ -821,41 +1123,31 @@ elif opcao == "🗓️ Planejamentos":
     )
 
     if st.button("💾 Atualizar Planejamentos"):
-        original = df_show.to_dict("records")
-        modified = edited_plans.to_dict("records")
-        ok_count, err_count = 0, 0
-
-        for old, new in zip(original, modified):
-            changed = (str(old) != str(new))
-            if changed:
-                id_cx = caixinhas_map.get(new["nome_caixinha"])
-                id_pes = pessoas_map.get(new["nome_pessoa"])
-                if not id_cx or not id_pes:
+        patches, err_count = [], 0
+
+        for patch in diff_grid(df_show, edited_plans, "id_plan"):
+            if "nome_caixinha" in patch:
+                patch["fk_caixinha_id"] = caixinhas_map.get(patch.pop("nome_caixinha"))
+                if not patch["fk_caixinha_id"]:
                     err_count += 1
                     continue
-
-                ok, _ = atualizar_planejado(
-                    id_plan=new["id_plan"],
-                    recorrencia=new["recorrencia_plan"],
-                    dia=new["dia_plan"],
-                    valor=new["valor_plan"],
-                    descricao=new["descricao_plan"],
-                    fk_caixinha_id=id_cx,
-                    fk_pessoa_id=id_pes,
-                    dt_inicio=new.get("dt_inicio_plan"),
-                    repeticoes_plan=int(new.get("repeticoes_plan", -1)),
-                    ativo=bool(new.get("plan_ativo", True)),
-                )
-                if ok:
-                    ok_count += 1
-                else:
+            if "nome_pessoa" in patch:
+                patch["fk_pessoa_id"] = pessoas_map.get(patch.pop("nome_pessoa"))
+                if not patch["fk_pessoa_id"]:
                     err_count += 1
+                    continue
+            patches.append(patch)
 
-        if ok_count:
-            st.success(f"{ok_count} planejamento(s) salvo(s)!")
-            st.rerun()
         if err_count:
-            st.warning(f"{err_count} planejamento(s) não foram salvos (verifique dados/RLS).")
+            st.warning(f"{err_count} planejamento(s) com caixinha/pessoa inválida não foram salvos.")
+        if patches:
+            # uma chamada só para todos os planos alterados
+            ok, msg = atualizar_planejados_em_lote(patches)
+            if ok:
+                st.success(msg)
+                st.rerun()
+            else:
+                st.error(msg)
 
 # ======================================================================================
 # MÓDULO: CALENDÁRIO ANUAL
@@ -903,16 +1195,12 @@ elif opcao == "📅 Calendário Anual":
                         st.error(msg)
 
     # LOAD EVENTS
-    df_ev = carregar_eventos_calendario(ano)
+    eventos_por_mes = carregar_eventos_calendario_por_mes(ano)
 
-    if df_ev is None or df_ev.empty:
+    if not eventos_por_mes:
         st.info("Nenhum evento cadastrado para este ano.")
         st.stop()
 
-    df_ev["mes"] = pd.to_datetime(df_ev["data_evento"]).dt.month
-    df_ev["selecionar"] = False
-    df_ev["converter"] = False
-
     # Mostrar por mês
     meses = [
         (1, "Janeiro"), (2, "Fevereiro"), (3, "Março"), (4, "Abril"),
@@ -921,14 +1209,11 @@ elif opcao == "📅 Calendário Anual":
     ]
 
     for m_num, m_nome in meses:
-        df_mes = df_ev[df_ev["mes"] == m_num].copy()
-        if df_mes.empty:
+        df_mes = eventos_por_mes.get(m_num)
+        if df_mes is None:
             continue
 
         with st.expander(f"{m_nome} ({len(df_mes)})", expanded=(m_num == datetime.date.today().month and ano == datetime.date.today().year)):
-            # coluna útil
-            df_mes["vinculado"] = df_mes["fk_planejado_id"].apply(lambda x: "SIM" if pd.notna(x) and str(x) != "" else "NÃO")
-
             cols_show = [
                 "selecionar",
                 "converter",
@@ -971,76 +1256,63 @@ elif opcao == "📅 Calendário Anual":
 
             # SALVAR EDIÇÕES
             if cbtn2.button(f"💾 Salvar {m_nome}", key=f"save_{m_num}"):
-                orig = df_show.to_dict("records")
-                new = edited.to_dict("records")
-
-                ok_count, err_count = 0, 0
-                for o, n in zip(orig, new):
-                    # ignora colunas de controle
-                    o_cmp = {k: v for k, v in o.items() if k not in ("selecionar", "converter", "vinculado")}
-                    n_cmp = {k: v for k, v in n.items() if k not in ("selecionar", "converter", "vinculado")}
-                    if str(o_cmp) == str(n_cmp):
-                        continue
-
-                    id_evento = n["id_evento"]
-                    fk_cx = caixinhas_map.get(n["nome_caixinha"]) if n.get("nome_caixinha") else None
-
-                    ok, _ = atualizar_evento_calendario(
-                        id_evento=id_evento,
-                        data_evento=n["data_evento"],
-                        titulo=(n.get("titulo") or "").strip(),
-                        descricao=n.get("descricao"),
-                        tipo=n.get("tipo"),
-                        valor_previsto=n.get("valor_previsto"),
-                        fk_caixinha_id=fk_cx,
-                    )
+                # ignora colunas de controle
+                patches = diff_grid(
+                    df_show, edited, "id_evento", ignorar=("selecionar", "converter", "vinculado", "fk_planejado_id")
+                )
+                for patch in patches:
+                    if "nome_caixinha" in patch:
+                        nome = patch.pop("nome_caixinha")
+                        patch["fk_caixinha_id"] = caixinhas_map.get(nome) if nome else None
+                    if "titulo" in patch:
+                        patch["titulo"] = (patch["titulo"] or "").strip()
+
+                if patches:
+                    ok, msg = atualizar_em_lote("calendario_evento", "id_evento", patches)
                     if ok:
-                        ok_count += 1
+                        st.success(f"{len(patches)} evento(s) atualizado(s) em {m_nome}.")
+                        st.rerun()
                     else:
-                        err_count += 1
-
-                if ok_count:
-                    st.success(f"{ok_count} evento(s) atualizado(s) em {m_nome}.")
-                    st.rerun()
-                if err_count:
-                    st.warning(f"{err_count} evento(s) não foram atualizados (verifique dados/RLS).")
+                        st.warning(msg)
 
             # CONVERTER SELECIONADOS
             if cbtn3.button(f"🔁 Converter para Planejado ({m_nome})", key=f"conv_{m_num}"):
-                rows = edited.to_dict("records")
-                conv = [r for r in rows if r.get("converter")]
+                conv = linhas_marcadas(edited, "converter", "id_evento")
 
                 if not conv:
                     st.info("Marque a coluna 'Converter?' nos eventos que você quer converter.")
                 else:
-                    okc, errc = 0, 0
-                    msgs = []
-                    for r in conv:
-                        ok, msg = converter_evento_para_planejado(int(r["id_evento"]))
-                        msgs.append(msg)
-                        if ok:
-                            okc += 1
-                        else:
-                            errc += 1
+                    # uma transação: planejado + vínculo no evento, para todos os marcados
+                    ok, resultados = converter_eventos_para_planejado(conv)
+                    if not ok:
+                        st.error(resultados)
+                    else:
+                        # o grid precisa recarregar (vinculado/fk_planejado_id, "Converter?" desmarcado);
+                        # o resumo fica na sessão e aparece depois do rerun
+                        st.session_state[f"conv_resultado_{m_num}"] = resultados
+                        st.rerun()
 
-                    if okc:
-                        st.success(f"{okc} evento(s) convertidos em Planejado.")
-                    if errc:
-                        st.warning(f"{errc} evento(s) não convertidos.")
-                    for m in msgs[:10]:
-                        st.write("-", m)
-                    st.rerun()
+            resultados = st.session_state.pop(f"conv_resultado_{m_num}", None)
+            if resultados:
+                okc = sum(1 for r in resultados if r.get("ok"))
+                errc = len(resultados) - okc
+
+                if okc:
+                    st.success(f"{okc} evento(s) convertidos em Planejado.")
+                if errc:
+                    st.warning(f"{errc} evento(s) não convertidos.")
+                for r in resultados[:10]:
+                    st.write("-", f"#{r.get('id_evento')}: {r.get('mensagem')}")
 
             # DELETAR
             if cbtn1.button(f"🗑️ Deletar ({m_nome})", key=f"del_{m_num}"):
-                rows = edited.to_dict("records")
-                todel = [r for r in rows if r.get("selecionar")]
+                todel = linhas_marcadas(edited, "selecionar", "id_evento")
                 if not todel:
                     st.info("Marque a coluna 'Apagar?' para deletar.")
                 else:
                     okc, errc = 0, 0
-                    for r in todel:
-                        ok, _ = deletar_evento_calendario(int(r["id_evento"]))
+                    for id_evento in todel:
+                        ok, _ = deletar_evento_calendario(int(id_evento))
                         if ok:
                             okc += 1
                         else:
@@ -1065,7 +1337,16 @@ elif opcao == "🎯 Metas & Metinhas":
 
     st.caption("Metas 'mãe' aparecem primeiro. Metinhas são metas com meta_pai_id preenchido.")
 
-    df = carregar_metas_semestre(ano, semestre)
+    import db_crud_async as dba
+
+    # metas do semestre + árvore com progresso (realizado nas caixinhas) ao mesmo tempo
+    df, df_arvore = dba.rodar_em_paralelo(
+        dba.carregar_metas_semestre(ano, semestre),
+        dba.carregar_arvore_metas(ano, semestre),
+    )
+    progresso_map = {}
+    if df_arvore is not None and not df_arvore.empty:
+        progresso_map = df_arvore.set_index("id_meta")[["realizado_total", "alvo_total", "progresso_pct"]].to_dict("index")
 
     # -------------------------
     # CRIAR META MÃE
@@ -1121,9 +1402,10 @@ elif opcao == "🎯 Metas & Metinhas":
     maes = df[df["is_mae"]].copy()
 
     # Helper: dict de filhas por meta mãe
-    filhas_map = {}
-    for _, r in df[~df["is_mae"]].iterrows():
-        filhas_map.setdefault(int(r["meta_pai_id"]), []).append(r.to_dict())
+    filhas_map = {
+        int(id_pai): grupo.to_dict("records")
+        for id_pai, grupo in df[~df["is_mae"]].groupby("meta_pai_id")
+    }
 
     # -------------------------
     # Lista de metas mães
@@ -1141,8 +1423,17 @@ elif opcao == "🎯 Metas & Metinhas":
             header += f"  |  Caixinha: {cx}"
         if alvo is not None and str(alvo) != "":
             header += f"  |  Alvo: {float(alvo):.2f}"
+        prog = progresso_map.get(id_mae, {})
+        if pd.notna(prog.get("progresso_pct")):
+            header += f"  |  Progresso: {prog['progresso_pct']:.1f}%"
 
         with st.expander(header, expanded=False):
+            if pd.notna(prog.get("progresso_pct")):
+                st.progress(
+                    min(max(float(prog["progresso_pct"]) / 100, 0.0), 1.0),
+                    text=f"Realizado R$ {prog['realizado_total']:.2f} de R$ {prog['alvo_total']:.2f} (inclui metinhas)",
+                )
+
             # -------------------------
             # EDITAR META MÃE
             # -------------------------
@@ -1209,8 +1500,9 @@ elif opcao == "🎯 Metas & Metinhas":
                     df_f["dt_fim"] = pd.to_datetime(df_f["dt_fim"], errors="coerce").dt.date
 
                 df_f["selecionar"] = False
+                df_f["progresso_pct"] = df_f["id_meta"].map(lambda i: progresso_map.get(i, {}).get("progresso_pct"))
 
-                cols = ["selecionar", "id_meta", "meta", "status", "tipo", "valor_alvo", "dt_inicio", "dt_fim"]
+                cols = ["selecionar", "id_meta", "meta", "status", "tipo", "valor_alvo", "dt_inicio", "dt_fim", "progresso_pct"]
                 df_show = df_f[[c for c in cols if c in df_f.columns]].copy()
 
                 edited = st.data_editor(
@@ -1225,6 +1517,7 @@ elif opcao == "🎯 Metas & Metinhas":
                         "valor_alvo": st.column_config.NumberColumn("Valor alvo", format="R$ %.2f"),
                         "dt_inicio": st.column_config.DateColumn("Início"),
                         "dt_fim": st.column_config.DateColumn("Fim"),
+                        "progresso_pct": st.column_config.ProgressColumn("Progresso", format="%.1f%%", min_value=0, max_value=100),
                     },
                     num_rows="fixed",
                 )
@@ -1232,42 +1525,33 @@ elif opcao == "🎯 Metas & Metinhas":
                 bb1, bb2 = st.columns(2)
 
                 if bb2.button("💾 Salvar Metinhas", key=f"save_filhas_{id_mae}"):
-                    orig = df_show.to_dict("records")
-                    new = edited.to_dict("records")
                     okc, errc = 0, 0
 
-                    for o, n in zip(orig, new):
-                        # deletar marcado
-                        if n.get("selecionar"):
-                            ok, _ = deletar_meta(int(n["id_meta"]))
-                            if ok:
-                                okc += 1
-                            else:
-                                errc += 1
-                            continue
-
-                        # detectar mudança
-                        o_cmp = {k: v for k, v in o.items() if k != "selecionar"}
-                        n_cmp = {k: v for k, v in n.items() if k != "selecionar"}
-                        if str(o_cmp) == str(n_cmp):
-                            continue
-
-                        ok, _ = atualizar_meta(
-                            id_meta=int(n["id_meta"]),
-                            meta=(n.get("meta") or "").strip(),
-                            valor_alvo=float(n["valor_alvo"]) if n.get("valor_alvo") not in (None, "") else None,
-                            status=n.get("status"),
-                            horizonte="SEMESTRE",
-                            dt_inicio=n.get("dt_inicio"),
-                            dt_fim=n.get("dt_fim"),
-                            tipo=n.get("tipo"),
-                            fk_caixinha_id=None,
-                        )
+                    # deletar marcado
+                    marcadas = linhas_marcadas(edited, "selecionar", "id_meta")
+                    for id_meta in marcadas:
+                        ok, _ = deletar_meta(int(id_meta))
                         if ok:
                             okc += 1
                         else:
                             errc += 1
 
+                    patches = [
+                        p for p in diff_grid(df_show, edited, "id_meta", ignorar=("selecionar", "progresso_pct"))
+                        if p["id_meta"] not in marcadas
+                    ]
+                    for patch in patches:
+                        if "meta" in patch:
+                            patch["meta"] = (patch["meta"] or "").strip()
+
+                    if patches:
+                        ok, msg = atualizar_em_lote("metas", "id_meta", patches)
+                        if ok:
+                            okc += len(patches)
+                        else:
+                            errc += len(patches)
+                            st.error(msg)
+
                     if okc:
                         st.success(f"{okc} alterações aplicadas.")
                         st.rerun()
@@ -1275,14 +1559,13 @@ elif opcao == "🎯 Metas & Metinhas":
                         st.warning(f"{errc} alterações falharam (RLS/dados).")
 
                 if bb1.button("🧹 Apagar marcadas", key=f"del_filhas_{id_mae}"):
-                    rows = edited.to_dict("records")
-                    todel = [r for r in rows if r.get("selecionar")]
+                    todel = linhas_marcadas(edited, "selecionar", "id_meta")
                     if not todel:
                         st.info("Marque 'Apagar?' nas metinhas.")
                     else:
                         okc, errc = 0, 0
-                        for r in todel:
-                            ok, _ = deletar_meta(int(r["id_meta"]))
+                        for id_meta in todel:
+                            ok, _ = deletar_meta(int(id_meta))
                             if ok:
                                 okc += 1
                             else:
@@ -1418,49 +1701,33 @@ elif opcao == "⭐ Prioridades":
     b1, b2 = st.columns(2)
 
     if b2.button("💾 Salvar alterações"):
-        orig = df_show.to_dict("records")
-        new = edited.to_dict("records")
-        okc, errc = 0, 0
-
-        for o, n in zip(orig, new):
-            # deletar marcado
-            if n.get("selecionar"):
-                continue
-
-            o_cmp = {k: v for k, v in o.items() if k != "selecionar"}
-            n_cmp = {k: v for k, v in n.items() if k != "selecionar"}
-            if str(o_cmp) == str(n_cmp):
-                continue
-
-            ok, _ = atualizar_prioridade(
-                id_prioridade=int(n["id_prioridade"]),
-                titulo=(n.get("titulo") or "").strip(),
-                descricao=n.get("descricao"),
-                horizonte=n.get("horizonte"),
-                periodo_inicio=n.get("periodo_inicio"),
-                periodo_fim=n.get("periodo_fim"),
-                status=n.get("status"),
-            )
+        marcadas = linhas_marcadas(edited, "selecionar", "id_prioridade")
+
+        # linhas marcadas para apagar ficam de fora
+        patches = [
+            p for p in diff_grid(df_show, edited, "id_prioridade", ignorar=("selecionar",))
+            if p["id_prioridade"] not in marcadas
+        ]
+        for patch in patches:
+            if "titulo" in patch:
+                patch["titulo"] = (patch["titulo"] or "").strip()
+
+        if patches:
+            ok, msg = atualizar_em_lote("prioridade", "id_prioridade", patches)
             if ok:
-                okc += 1
+                st.success(f"{len(patches)} prioridade(s) atualizada(s).")
+                st.rerun()
             else:
-                errc += 1
-
-        if okc:
-            st.success(f"{okc} prioridade(s) atualizada(s).")
-            st.rerun()
-        if errc:
-            st.warning(f"{errc} falharam (RLS/dados).")
+                st.warning(msg)
 
     if b1.button("🗑️ Deletar selecionadas"):
-        rows = edited.to_dict("records")
-        todel = [r for r in rows if r.get("selecionar")]
+        todel = linhas_marcadas(edited, "selecionar", "id_prioridade")
         if not todel:
             st.info("Marque 'Apagar?' para deletar.")
         else:
             okc, errc = 0, 0
-            for r in todel:
-                ok, _ = deletar_prioridade(int(r["id_prioridade"]))
+            for id_prioridade in todel:
+                ok, _ = deletar_prioridade(int(id_prioridade))
                 if ok:
                     okc += 1
                 else:
@@ -1500,13 +1767,16 @@ elif opcao == "🧘 Círculo da Vida":
 
     mes_ref = datetime.date(ano, mes_num, 1)
 
-    areas = carregar_areas_vida()
+    import db_crud_async as dba
+
+    areas, df_mes = dba.rodar_em_paralelo(
+        dba.carregar_areas_vida(),
+        dba.carregar_checkin_mes(mes_ref),
+    )
     if not areas:
         st.warning("Nenhuma área ativa encontrada em area_vida. Cadastre ou ative pelo banco.")
         st.stop()
 
-    df_mes = carregar_checkin_mes(mes_ref)
-
     # mapa (area_nome -> dados)
     dados = {}
     if df_mes is not None and not df_mes.empty:
@@ -1537,38 +1807,42 @@ elif opcao == "🧘 Círculo da Vida":
         submitted = st.form_submit_button("💾 Salvar check-in do mês")
 
         if submitted:
-            okc, errc = 0, 0
-            msgs = []
-            for id_area, nota, comentario in inputs:
-                ok, msg = salvar_checkin_area(mes_ref=mes_ref, fk_area_id=id_area, nota=nota, comentario=comentario)
-                msgs.append((ok, msg))
-                if ok:
-                    okc += 1
-                else:
-                    errc += 1
-
-            if okc:
-                st.success(f"{okc} área(s) salvas para {mes_ref.strftime('%m/%Y')}.")
-            if errc:
-                st.error(f"{errc} área(s) não foram salvas. Veja detalhes abaixo:")
-                for ok, msg in msgs:
-                    if not ok:
-                        st.write("-", msg)
-            st.rerun()
+            ok, res = salvar_checkins_mes(
+                mes_ref,
+                [{"fk_area_id": id_area, "nota": nota, "comentario": comentario} for id_area, nota, comentario in inputs],
+            )
+            if ok:
+                st.success(
+                    f"Check-in de {mes_ref.strftime('%m/%Y')} salvo: "
+                    f"{res['criados']} área(s) nova(s), {res['atualizados']} atualizada(s)."
+                )
+                st.rerun()
+            else:
+                st.error(res)
 
     st.divider()
-    st.subheader("Histórico do ano")
+    st.subheader("Histórico")
 
-    df_hist = historico_checkins_ano(ano)
-    if df_hist is None or df_hist.empty:
-        st.info("Sem histórico para este ano ainda.")
+    h1, h2 = st.columns(2)
+    ano_ini_hist = h1.selectbox("Comparar desde", list(range(ano - 4, ano + 1)), index=4)
+    janela = h2.selectbox("Média móvel (meses)", [1, 3, 6, 12], index=1)
+
+    # matriz mês x área em cache por ano (só volta ao banco quando um check-in é salvo)
+    hist = historico_checkins_periodo(ano_ini_hist, ano, janela=janela)
+    matriz = hist["matriz"]
+
+    if matriz.empty:
+        st.info("Sem histórico para este período ainda.")
         st.stop()
 
-    # Pivot: linhas = mes_ref, colunas = area_nome, valores = nota
-    pivot = df_hist.pivot_table(index="mes_ref", columns="area_nome", values="nota", aggfunc="max").reset_index()
-    pivot = pivot.sort_values("mes_ref", ascending=True)
+    st.line_chart(hist["media_movel"])
+
+    st.markdown("**Tendência por área** (pontos por mês)")
+    st.dataframe(hist["tendencia"].sort_values("tendencia_mes"), use_container_width=True)
 
-    st.dataframe(pivot, use_container_width=True)
+    tabela = matriz.copy()
+    tabela.index = tabela.index.strftime("%m/%Y")
+    st.dataframe(tabela, use_container_width=True)
 # ======================================================================================
 # MÓDULO: DESAPEGO CONSCIENTE
 # ======================================================================================
@@ -1659,78 +1933,58 @@ elif opcao == "🧺 Desapego consciente":
 
     # SALVAR ALTERAÇÕES
     if b2.button("💾 Salvar alterações"):
-        orig = df_show.to_dict("records")
-        new = edited.to_dict("records")
-        okc, errc = 0, 0
-
-        for o, n in zip(orig, new):
-            if n.get("selecionar"):
-                continue
-
-            o_cmp = {k: v for k, v in o.items() if k not in ("selecionar", "criar_planejado")}
-            n_cmp = {k: v for k, v in n.items() if k not in ("selecionar", "criar_planejado")}
-            if str(o_cmp) == str(n_cmp):
-                continue
-
-            fk = caixinhas_map.get(n["nome_caixinha"]) if n.get("nome_caixinha") else None
-            ok, _ = atualizar_desapego_item(
-                id_item=int(n["id_item"]),
-                nome_item=(n.get("nome_item") or "").strip(),
-                fk_caixinha_id=fk,
-                valor_estimado=float(n["valor_estimado"]) if n.get("valor_estimado") not in (None, "") else None,
-                frequencia=n.get("frequencia"),
-                decisao=n.get("decisao"),
-                prazo_revisao=n.get("prazo_revisao"),
-                observacao=n.get("observacao"),
-                ativo=bool(n.get("ativo", True)),
-            )
+        marcados = linhas_marcadas(edited, "selecionar", "id_item")
+
+        patches = [
+            p for p in diff_grid(df_show, edited, "id_item", ignorar=("selecionar", "criar_planejado"))
+            if p["id_item"] not in marcados
+        ]
+        for patch in patches:
+            if "nome_caixinha" in patch:
+                nome = patch.pop("nome_caixinha")
+                patch["fk_caixinha_id"] = caixinhas_map.get(nome) if nome else None
+            if "nome_item" in patch:
+                patch["nome_item"] = (patch["nome_item"] or "").strip()
+
+        if patches:
+            ok, msg = atualizar_em_lote("desapego_item", "id_item", patches)
             if ok:
-                okc += 1
+                st.success(f"{len(patches)} item(ns) atualizado(s).")
+                st.rerun()
             else:
-                errc += 1
-
-        if okc:
-            st.success(f"{okc} item(ns) atualizado(s).")
-            st.rerun()
-        if errc:
-            st.warning(f"{errc} falharam (RLS/dados).")
+                st.warning(msg)
 
     # CRIAR PLANEJADO
     if b3.button("🔁 Criar Planejado a partir dos marcados"):
-        rows = edited.to_dict("records")
-        marcados = [r for r in rows if r.get("criar_planejado")]
+        marcados = linhas_marcadas(edited, "criar_planejado", "id_item")
 
         if not marcados:
             st.info("Marque 'Criar Planejado?' nos itens desejados.")
         else:
-            okc, errc = 0, 0
-            msgs = []
-            for r in marcados:
-                ok, msg = criar_planejado_de_desapego(int(r["id_item"]))
-                msgs.append(msg)
-                if ok:
-                    okc += 1
-                else:
-                    errc += 1
+            # todos os itens numa transação, com o resultado de cada um
+            ok, resultados = criar_planejados_de_desapego(marcados)
+            if not ok:
+                st.error(resultados)
+            else:
+                okc = sum(1 for r in resultados if r.get("ok"))
+                errc = len(resultados) - okc
 
-            if okc:
-                st.success(f"{okc} planejado(s) criado(s).")
-            if errc:
-                st.warning(f"{errc} item(ns) não geraram planejado.")
-            for m in msgs[:12]:
-                st.write("-", m)
-            st.rerun()
+                if okc:
+                    st.success(f"{okc} planejado(s) criado(s).")
+                if errc:
+                    st.warning(f"{errc} item(ns) não geraram planejado.")
+                for r in resultados[:12]:
+                    st.write("-", f"#{r.get('id_item')}: {r.get('mensagem')}")
 
     # DELETAR
     if b1.button("🗑️ Deletar selecionados"):
-        rows = edited.to_dict("records")
-        todel = [r for r in rows if r.get("selecionar")]
+        todel = linhas_marcadas(edited, "selecionar", "id_item")
         if not todel:
             st.info("Marque 'Apagar?' para deletar.")
         else:
             okc, errc = 0, 0
-            for r in todel:
-                ok, _ = deletar_desapego_item(int(r["id_item"]))
+            for id_item in todel:
+                ok, _ = deletar_desapego_item(int(id_item))
                 if ok:
                     okc += 1
                 else:
@@ -4,7 +4,9 @@
 
 import psycopg2
 import pandas as pd
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
+
+import dinheiro
 
 def get_connection():
     return psycopg2.connect(
@@ -432,15 +434,12 @@ def buscar_ultima_cotacao_por_conta(id_conta_compra, data_movimentacao):
 # ----- RECEBIDO PJ -----
 
 def inserir_recebido_pj(data, valor_total, id_conta_padrao, id_tipo):
-    # garante que é Decimal
-    valor = Decimal(valor_total)
-
-    # define quantizador para 2 casas
-    quant = Decimal('0.01')
-
-    parte_empresa = (valor * Decimal('0.15')).quantize(quant, rounding=ROUND_HALF_UP)
-    parte_pessoa  = (valor * Decimal('0.765')).quantize(quant, rounding=ROUND_HALF_UP)
-    parte_reserva = (valor * Decimal('0.085')).quantize(quant, rounding=ROUND_HALF_UP)
+    # centavos exatos: as três partes somam sempre o valor recebido
+    valor = dinheiro.para_decimal(dinheiro.centavos(valor_total))
+    partes = dinheiro.dividir_pj(valor)
+    parte_empresa = partes["empresa"]
+    parte_pessoa = partes["pessoa"]
+    parte_reserva = partes["reserva"]
 
     conn = get_connection()
     cur = conn.cursor()
@@ -576,12 +575,13 @@ def get_ultimo_saldo(id_conta):
 
 
 def atualizar_saldo_apos_movimentacao(id_conta, id_mov, valor, natureza):
-    saldo_anterior = get_ultimo_saldo(id_conta)
+    saldo_anterior = dinheiro.centavos(get_ultimo_saldo(id_conta))
 
     if natureza == "entrada":
-        saldo_novo = saldo_anterior + Decimal(valor)
+        saldo_novo = saldo_anterior + dinheiro.centavos(valor)
     else:
-        saldo_novo = saldo_anterior - Decimal(valor)
+        saldo_novo = saldo_anterior - dinheiro.centavos(valor)
+    saldo_novo = dinheiro.para_decimal(saldo_novo)
 
 
     conn = get_connection()
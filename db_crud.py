@@ -1,10 +1,20 @@
 # db_crud.py - Supabase CRUD (Financeiro + Rico Zen) - com Calendário Anual e conversão para Planejado
 
 import os
+import time
+import threading
 import datetime as dt
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+import numpy as np
 import pandas as pd
 import streamlit as st
-from supabase import create_client, Client
+
+import dinheiro
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # --- ENUMS (valores exatos do banco) ---
 STATUS_MOV_OPTIONS = ["PENDENTE", "CONFIRMADO", "CONCILIADO"]
@@ -14,8 +24,27 @@ RECORRENCIA_OPTIONS = ["MENSAL", "SEMANAL", "UNICO"]
 TIPO_EVENTO_CALENDARIO = ["PESSOAL", "FINANCEIRO", "SAUDE", "VIAGEM", "RAIZES", "OUTRO"]
 
 
+# --- RELATÓRIO DE STARTUP (opt-in) ---
+# etapa -> ms. Só a primeira medição de cada etapa vale (cold start do processo).
+_startup_tempos: dict[str, float] = {}
+
+
+def startup_report_ativo() -> bool:
+    """Liga o relatório com FINANCAS_STARTUP_REPORT=1 no ambiente."""
+    return os.getenv("FINANCAS_STARTUP_REPORT", "").strip().lower() in ("1", "true", "sim")
+
+
+def registrar_tempo_startup(etapa: str, inicio: float):
+    """Guarda o tempo decorrido desde `inicio` (time.perf_counter) para a etapa."""
+    _startup_tempos.setdefault(etapa, (time.perf_counter() - inicio) * 1000)
+
+
+def relatorio_startup() -> dict[str, float]:
+    return dict(_startup_tempos)
+
+
 # --- CONEXÃO ---
-def get_supabase_client() -> Client:
+def credenciais_supabase() -> tuple[str, str]:
     try:
         url = st.secrets["SUPABASE_URL"]
         key = st.secrets["SUPABASE_KEY"]
@@ -28,25 +57,160 @@ def get_supabase_client() -> Client:
 
     if not url or not key:
         raise ValueError("❌ Erro: Chaves do Supabase não encontradas (secrets/env).")
+    return url, key
+
+
+def get_supabase_client() -> "Client":
+    """Cria um cliente novo. Prefira get_client(), que reaproveita o do processo."""
+    url, key = credenciais_supabase()
+
+    # import pesado: só acontece quando alguém realmente precisa do banco
+    t0 = time.perf_counter()
+    from supabase import create_client
+    from db_transporte import get_http_client
+    registrar_tempo_startup("import supabase", t0)
+
+    t0 = time.perf_counter()
+    try:
+        # pool HTTP compartilhado (keep-alive/HTTP2), ver db_transporte.py
+        from supabase import ClientOptions
+        options = ClientOptions(httpx_client=get_http_client())
+    except (ImportError, TypeError):
+        # supabase-py antigo não aceita httpx_client: segue com o pool padrão do postgrest
+        print("Aviso: supabase-py sem suporte a httpx_client; usando pool HTTP padrão.")
+        options = None
+    client = create_client(url, key, options=options) if options else create_client(url, key)
+    registrar_tempo_startup("criar cliente", t0)
+    return client
+
+
+# Um único cliente por processo, criado na primeira chamada (todas as sessões compartilham).
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> "Client":
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = get_supabase_client()
+    return _client
+
+
+# --- LEITURAS: query + formatação ---
+# Cada leitura é dividida em _q_* (monta a query, recebe o client) e _fmt_* (formata
+# response.data). O cliente sync (aqui) e o async (db_crud_async.py) usam as mesmas
+# peças, então os formatos de retorno são sempre iguais.
+
+
+def _achatar(
+    data,
+    embeds: dict[str, tuple[str, str]] | None = None,
+    datas: tuple[str, ...] = (),
+    numeros: tuple[str, ...] = (),
+) -> pd.DataFrame:
+    """
+    response.data -> DataFrame plano, montado uma vez (sem copiar cada dict da resposta).
+
+    embeds:  {"caixinha": ("caixinha", "nome_caixinha")} troca a coluna do embed pela coluna
+             nome_caixinha com o campo "caixinha" do objeto aninhado ("" se o embed vier nulo)
+    datas:   colunas convertidas para date (inválidas -> None)
+    numeros: colunas convertidas para float (inválidas -> NaN)
+    Colunas ausentes na resposta são ignoradas.
+    """
+    if not data:
+        return pd.DataFrame()
+
+    df = pd.DataFrame.from_records(data)
+    for coluna, (campo, destino) in (embeds or {}).items():
+        if coluna not in df.columns:
+            df[destino] = ""
+            continue
+        df[destino] = [o.get(campo) if isinstance(o, dict) else "" for o in df.pop(coluna).to_numpy()]
+
+    for c in datas:
+        if c in df.columns:
+            d = pd.to_datetime(df[c], errors="coerce")
+            df[c] = d.dt.date.astype(object).where(d.notna(), None)
+    for c in numeros:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype(float)
+    return df
+
 
-    return create_client(url, key)
+_EMB_CAIXINHA = {"caixinha": ("caixinha", "nome_caixinha")}
+_EMB_PESSOA = {"pessoa": ("nome", "nome_pessoa")}
 
 
-try:
-    supabase = get_supabase_client()
-except Exception as e:
-    supabase = None
-    print(f"Erro init supabase: {e}")
+def _compactar(
+    df: pd.DataFrame,
+    categorias: dict[str, list | None] | None = None,
+    datas: tuple[str, ...] = (),
+    centavos: dict[str, str] | None = None,
+) -> pd.DataFrame:
+    """
+    Dtypes enxutos para DataFrames grandes (copiados várias vezes por página):
 
+    categorias: {"status_mov": STATUS_MOV_OPTIONS, "nome_pessoa": None} -> category; com lista,
+                todas as opções já são categorias (o grid pode trocar para qualquer uma)
+    datas:      colunas em datetime64 (em vez de objetos date)
+    centavos:   {"valor_mov": "valor_centavos"} -> coluna int64 em centavos ao lado do valor
+    """
+    if df.empty:
+        return df
+
+    for c, opcoes in (categorias or {}).items():
+        if c in df.columns:
+            extras = [] if opcoes is None else [v for v in df[c].dropna().unique() if v not in opcoes]
+            df[c] = pd.Categorical(df[c], categories=None if opcoes is None else [*opcoes, *extras])
+    for c in datas:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], errors="coerce")
+    for c, destino in (centavos or {}).items():
+        if c in df.columns:
+            df[destino] = dinheiro.centavos_array(pd.to_numeric(df[c], errors="coerce"))
+    return df
+
+
+def relatorio_memoria(**frames: pd.DataFrame) -> pd.DataFrame:
+    """
+    Memória (deep) de cada coluna dos DataFrames passados, maiores primeiro.
+    Ex.: relatorio_memoria(extrato=df_mov, planejados=df_plan)
+    Retorna DF: [frame, coluna, dtype, kb]
+    """
+    linhas = []
+    for nome, df in frames.items():
+        if df is None or df.empty:
+            continue
+        uso = df.memory_usage(deep=True, index=True)
+        for coluna, n_bytes in uso.items():
+            dtype = "index" if coluna == "Index" else str(df[coluna].dtype)
+            linhas.append({"frame": nome, "coluna": coluna, "dtype": dtype, "kb": round(n_bytes / 1024, 1)})
+    out = pd.DataFrame(linhas, columns=["frame", "coluna", "dtype", "kb"])
+    return out.sort_values("kb", ascending=False).reset_index(drop=True)
 
 # --- LOOKUPS ---
+def _q_caixinhas(client):
+    return client.table("caixinha").select("id_caixinha, caixinha")
+
+
+def _fmt_caixinhas(data) -> dict:
+    return {item["caixinha"]: item["id_caixinha"] for item in (data or [])}
+
+
+def _q_pessoas(client):
+    return client.table("pessoa").select("id_pessoa, nome").order("id_pessoa")
+
+
+def _fmt_pessoas(data) -> dict:
+    return {item["nome"]: item["id_pessoa"] for item in (data or [])}
+
+
 def buscar_caixinhas():
     """Retorna { 'NomeCaixinha': id_caixinha }"""
     try:
-        response = supabase.table("caixinha").select("id_caixinha, caixinha").execute()
-        if not response.data:
-            return {}
-        return {item["caixinha"]: item["id_caixinha"] for item in response.data}
+        return _fmt_caixinhas(_q_caixinhas(get_client()).execute().data)
     except Exception as e:
         print(f"Erro buscar caixinhas: {e}")
         return {}
@@ -55,10 +219,7 @@ def buscar_caixinhas():
 def buscar_pessoas():
     """Retorna { 'NomePessoa': id_pessoa }"""
     try:
-        response = supabase.table("pessoa").select("id_pessoa, nome").order("id_pessoa").execute()
-        if not response.data:
-            return {}
-        return {item["nome"]: item["id_pessoa"] for item in response.data}
+        return _fmt_pessoas(_q_pessoas(get_client()).execute().data)
     except Exception as e:
         print(f"Erro buscar pessoas: {e}")
         return {}
@@ -84,7 +245,7 @@ def inserir_movimentacao(
     payload = {
         "dt_mov": str(dt_mov),
         "descricao_mov": descricao_mov,
-        "valor_mov": valor_mov,
+        "valor_mov": dinheiro.arredondar(valor_mov),
         "fk_caixinha_id": fk_caixinha_id,
         "fk_pessoa_id": fk_pessoa_id,
         "status_mov": status_mov,
@@ -95,7 +256,7 @@ def inserir_movimentacao(
     payload = {k: v for k, v in payload.items() if v is not None}
 
     try:
-        supabase.table("movimentacao").insert(payload).execute()
+        get_client().table("movimentacao").insert(payload).execute()
         return True, "Movimentação inserida com sucesso!"
     except Exception as e:
         return False, f"Erro ao inserir movimentação: {e}"
@@ -108,13 +269,32 @@ def atualizar_movimentacao(id_mov, dt_mov, descricao_mov, valor_mov, fk_caixinha
     payload = {
         "dt_mov": str(dt_mov),
         "descricao_mov": descricao_mov,
-        "valor_mov": valor_mov,
+        "valor_mov": dinheiro.arredondar(valor_mov),
         "fk_caixinha_id": fk_caixinha_id,
         "fk_pessoa_id": fk_pessoa_id,
         "status_mov": status_mov,
     }
     try:
-        supabase.table("movimentacao").update(payload).eq("id_mov", id_mov).execute()
+        get_client().table("movimentacao").update(payload).eq("id_mov", id_mov).execute()
+        return True, "Movimentação atualizada com sucesso!"
+    except Exception as e:
+        return False, f"Erro ao atualizar movimentação: {e}"
+
+
+def atualizar_movimentacao_campos(id_mov, campos: dict):
+    """
+    Update parcial: grava só as colunas recebidas (ex.: patch do grid_diff).
+    """
+    if not campos:
+        return True, "Nada para atualizar."
+    if "status_mov" in campos and campos["status_mov"] not in STATUS_MOV_OPTIONS:
+        return False, f"Status inválido: {campos['status_mov']}"
+
+    payload = {k: (str(v) if isinstance(v, dt.date) else v) for k, v in campos.items()}
+    if payload.get("valor_mov") is not None:
+        payload["valor_mov"] = dinheiro.arredondar(payload["valor_mov"])
+    try:
+        get_client().table("movimentacao").update(payload).eq("id_mov", id_mov).execute()
         return True, "Movimentação atualizada com sucesso!"
     except Exception as e:
         return False, f"Erro ao atualizar movimentação: {e}"
@@ -122,47 +302,183 @@ def atualizar_movimentacao(id_mov, dt_mov, descricao_mov, valor_mov, fk_caixinha
 
 def deletar_movimentacao(id_mov):
     try:
-        supabase.table("movimentacao").delete().eq("id_mov", id_mov).execute()
+        get_client().table("movimentacao").delete().eq("id_mov", id_mov).execute()
         return True, "Movimentação deletada com sucesso!"
     except Exception as e:
         return False, f"Erro ao deletar movimentação: {e}"
 
 
-def carregar_movimentacoes():
-    try:
-        query = """
-            id_mov, dt_mov, descricao_mov, desc_extrato, valor_mov, status_mov, origem_mov,
-            fk_caixinha_id, fk_pessoa_id,
-            caixinha:fk_caixinha_id (caixinha),
-            pessoa:fk_pessoa_id (nome)
-        """
-        response = supabase.table("movimentacao").select(query).order("dt_mov", desc=True).execute()
-        data = response.data
+def _q_movimentacoes(client):
+    query = """
+        id_mov, dt_mov, descricao_mov, desc_extrato, valor_mov, status_mov, origem_mov,
+        fk_caixinha_id, fk_pessoa_id,
+        caixinha:fk_caixinha_id (caixinha),
+        pessoa:fk_pessoa_id (nome)
+    """
+    return client.table("movimentacao").select(query).order("dt_mov", desc=True)
 
-        if not data:
-            return pd.DataFrame()
 
-        flat_data = []
-        for row in data:
-            flat_row = row.copy()
-            cx = flat_row.pop("caixinha", None)
-            pes = flat_row.pop("pessoa", None)
+def _descricao_com_fallback(df: pd.DataFrame) -> None:
+    """descricao_mov vazia -> desc_extrato; sem nenhuma das duas, ""."""
+    if "descricao_mov" not in df.columns:
+        df["descricao_mov"] = ""
+    desc = df["descricao_mov"].astype(object)
+    if "desc_extrato" in df.columns:
+        desc = desc.where(desc.notna() & (desc != ""), df["desc_extrato"])
+    df["descricao_mov"] = desc.fillna("")
 
-            flat_row["nome_caixinha"] = cx["caixinha"] if cx else ""
-            flat_row["nome_pessoa"] = pes["nome"] if pes else ""
 
-            if not flat_row.get("descricao_mov") and flat_row.get("desc_extrato"):
-                flat_row["descricao_mov"] = flat_row["desc_extrato"]
+def _fmt_movimentacoes(data) -> pd.DataFrame:
+    df = _achatar(data, {**_EMB_CAIXINHA, **_EMB_PESSOA}, numeros=("valor_mov",))
+    if df.empty:
+        return df
 
-            flat_data.append(flat_row)
+    _descricao_com_fallback(df)
+    return _compactar(
+        df,
+        categorias={
+            "status_mov": STATUS_MOV_OPTIONS,
+            "origem_mov": ORIGEM_MOV_OPTIONS,
+            "nome_caixinha": None,
+            "nome_pessoa": None,
+        },
+        datas=("dt_mov",),
+        centavos={"valor_mov": "valor_centavos"},
+    )
 
-        return pd.DataFrame(flat_data)
 
+def carregar_movimentacoes():
+    try:
+        return _fmt_movimentacoes(_q_movimentacoes(get_client()).execute().data)
     except Exception as e:
         print(f"Erro carregar movimentacoes: {e}")
         return pd.DataFrame()
 
 
+# --- EXTRATO PAGINADO ---
+# Filtros no servidor + keyset em (dt_mov, id_mov) desc: cada página custa o mesmo, seja a
+# primeira ou a milésima (sem OFFSET). O cursor é (dt_mov, id_mov) da última linha da página.
+def _q_extrato_pagina(
+    client,
+    cursor: tuple[str, int] | None,
+    por_pagina: int,
+    ini=None,
+    fim=None,
+    id_pessoa: int | None = None,
+    ids_caixinha=None,
+    status=None,
+    origem=None,
+):
+    query = """
+        id_mov, dt_mov, descricao_mov, desc_extrato, valor_mov, status_mov, origem_mov,
+        fk_caixinha_id, fk_pessoa_id,
+        caixinha:fk_caixinha_id (caixinha),
+        pessoa:fk_pessoa_id (nome)
+    """
+    q = client.table("movimentacao").select(query, count="estimated")
+    if ini:
+        q = q.gte("dt_mov", str(ini))
+    if fim:
+        q = q.lte("dt_mov", str(fim))
+    if id_pessoa:
+        q = q.eq("fk_pessoa_id", id_pessoa)
+    if ids_caixinha:
+        q = q.in_("fk_caixinha_id", list(ids_caixinha))
+    if status:
+        q = q.in_("status_mov", list(status))
+    if origem:
+        q = q.in_("origem_mov", list(origem))
+    if cursor:
+        dt_cursor, id_cursor = cursor
+        q = q.or_(f"dt_mov.lt.{dt_cursor},and(dt_mov.eq.{dt_cursor},id_mov.lt.{int(id_cursor)})")
+    # uma linha a mais só para saber se existe próxima página
+    return q.order("dt_mov", desc=True).order("id_mov", desc=True).limit(por_pagina + 1)
+
+
+def _fmt_extrato_pagina(resp, por_pagina: int) -> tuple[pd.DataFrame, tuple[str, int] | None, int | None]:
+    data = resp.data or []
+    tem_proxima = len(data) > por_pagina
+    data = data[:por_pagina]
+    proximo = (str(data[-1]["dt_mov"])[:10], int(data[-1]["id_mov"])) if tem_proxima else None
+    return _fmt_movimentacoes(data), proximo, getattr(resp, "count", None)
+
+
+def carregar_extrato_pagina(
+    cursor: tuple[str, int] | None = None,
+    por_pagina: int = 100,
+    ini: dt.date | None = None,
+    fim: dt.date | None = None,
+    id_pessoa: int | None = None,
+    ids_caixinha=None,
+    status=None,
+    origem=None,
+) -> tuple[pd.DataFrame, tuple[str, int] | None, int | None]:
+    """
+    Uma página do extrato (mais recentes primeiro), filtrada no Supabase.
+    cursor: None para a primeira página, ou o `proximo` devolvido pela página anterior.
+    Retorna (DF no formato de carregar_movimentacoes, proximo cursor ou None, total estimado).
+    """
+    try:
+        resp = _q_extrato_pagina(
+            get_client(), cursor, por_pagina, ini, fim, id_pessoa, ids_caixinha, status, origem
+        ).execute()
+        return _fmt_extrato_pagina(resp, por_pagina)
+    except Exception as e:
+        print(f"Erro carregar extrato pagina: {e}")
+        return pd.DataFrame(), None, None
+
+
+# --- BUSCA TEXTUAL ---
+def _q_busca_movimentacoes(client, termo: str, ini, fim, ids_caixinha, id_pessoa, limite: int):
+    """RPC buscar_movimentacoes (SQL/DDL.SQL seção O, índice pg_trgm)."""
+    return client.rpc("buscar_movimentacoes", {
+        "p_termo": termo,
+        "p_ini": str(ini) if ini else None,
+        "p_fim": str(fim) if fim else None,
+        "p_ids_caixinha": list(ids_caixinha) if ids_caixinha else None,
+        "p_id_pessoa": id_pessoa,
+        "p_limite": limite,
+    })
+
+
+def _fmt_busca_movimentacoes(data) -> pd.DataFrame:
+    df = _achatar(data, numeros=("valor_mov", "relevancia"))
+    if df.empty:
+        return df
+
+    _descricao_com_fallback(df)
+    return _compactar(
+        df,
+        categorias={"status_mov": STATUS_MOV_OPTIONS, "origem_mov": ORIGEM_MOV_OPTIONS},
+        datas=("dt_mov",),
+        centavos={"valor_mov": "valor_centavos"},
+    )
+
+
+def buscar_movimentacoes(
+    termo: str,
+    ini: dt.date | None = None,
+    fim: dt.date | None = None,
+    ids_caixinha=None,
+    id_pessoa: int | None = None,
+    limite: int = 100,
+) -> pd.DataFrame:
+    """
+    Movimentações cuja descrição (descricao_mov ou desc_extrato) contém `termo` ou se parece
+    com ele (erros de digitação), mais relevantes primeiro. Termo vazio -> DF vazio.
+    Retorna DF: [id_mov, dt_mov, descricao_mov, valor_mov, status_mov, origem_mov,
+                 nome_caixinha, nome_pessoa, relevancia, ...]
+    """
+    if not (termo or "").strip():
+        return pd.DataFrame()
+    try:
+        data = _q_busca_movimentacoes(get_client(), termo.strip(), ini, fim, ids_caixinha, id_pessoa, limite).execute().data
+        return _fmt_busca_movimentacoes(data)
+    except Exception as e:
+        print(f"Erro buscar movimentacoes: {e}")
+        return pd.DataFrame()
+
+
 # --- PLANEJADO ---
 def inserir_planejado(recorrencia, dia, valor, descricao, fk_caixinha_id, fk_pessoa_id, dt_inicio, repeticoes_plan=-1, ativo=True):
     if recorrencia not in RECORRENCIA_OPTIONS:
@@ -171,7 +487,7 @@ def inserir_planejado(recorrencia, dia, valor, descricao, fk_caixinha_id, fk_pes
     payload = {
         "recorrencia_plan": recorrencia,
         "dia_plan": int(dia),
-        "valor_plan": float(valor),
+        "valor_plan": dinheiro.arredondar(valor),
         "descricao_plan": descricao,
         "fk_caixinha_id": fk_caixinha_id,
         "fk_pessoa_id": fk_pessoa_id,
@@ -181,7 +497,7 @@ def inserir_planejado(recorrencia, dia, valor, descricao, fk_caixinha_id, fk_pes
     }
 
     try:
-        resp = supabase.table("planejado").insert(payload).execute()
+        resp = get_client().table("planejado").insert(payload).execute()
         # resp.data geralmente retorna lista com a linha inserida
         return True, resp.data[0] if resp.data else "Planejamento inserido com sucesso!"
     except Exception as e:
@@ -195,7 +511,7 @@ def atualizar_planejado(id_plan, recorrencia, dia, valor, descricao, fk_caixinha
     payload = {
         "recorrencia_plan": recorrencia,
         "dia_plan": int(dia),
-        "valor_plan": float(valor),
+        "valor_plan": dinheiro.arredondar(valor),
         "descricao_plan": descricao,
         "fk_caixinha_id": fk_caixinha_id,
         "fk_pessoa_id": fk_pessoa_id,
@@ -205,81 +521,145 @@ def atualizar_planejado(id_plan, recorrencia, dia, valor, descricao, fk_caixinha
     }
 
     try:
-        supabase.table("planejado").update(payload).eq("id_plan", id_plan).execute()
+        get_client().table("planejado").update(payload).eq("id_plan", id_plan).execute()
         return True, "Planejamento atualizado com sucesso!"
     except Exception as e:
         return False, f"Erro ao atualizar planejado: {e}"
 
 
-def buscar_planejados():
+# colunas aceitas no update em lote -> conversão para o JSON do RPC
+_COLUNAS_PLANEJADO_LOTE = {
+    "recorrencia_plan": str,
+    "dia_plan": int,
+    "valor_plan": dinheiro.arredondar,
+    "descricao_plan": lambda v: v,
+    "fk_caixinha_id": int,
+    "fk_pessoa_id": int,
+    "dt_inicio_plan": lambda v: str(v) if v else None,
+    "repeticoes_plan": int,
+    "plan_ativo": bool,
+}
+
+
+def atualizar_planejados_em_lote(patches: list[dict]) -> tuple[bool, str]:
+    """
+    Grava vários updates parciais de planejado numa chamada só (RPC atualizar_planejados_lote,
+    ver SQL/DDL.SQL seção F). Tudo ou nada: roda numa transação.
+    patches: [{"id_plan": 12, "valor_plan": 150.0}, ...] (formato do grid_diff)
+    """
+    if not patches:
+        return True, "Nada para atualizar."
+
+    linhas = []
+    for patch in patches:
+        if patch.get("id_plan") is None:
+            return False, "Patch sem id_plan."
+        linha = {"id_plan": int(patch["id_plan"])}
+        for col, v in patch.items():
+            if col == "id_plan":
+                continue
+            if col not in _COLUNAS_PLANEJADO_LOTE:
+                return False, f"Coluna não editável em planejado: {col}"
+            if col == "recorrencia_plan" and v not in RECORRENCIA_OPTIONS:
+                return False, f"Recorrência inválida: {v} (plano {linha['id_plan']})"
+            try:
+                linha[col] = None if v is None else _COLUNAS_PLANEJADO_LOTE[col](v)
+            except (TypeError, ValueError):
+                return False, f"Valor inválido em {col}: {v} (plano {linha['id_plan']})"
+        linhas.append(linha)
+
+    try:
+        resp = get_client().rpc("atualizar_planejados_lote", {"p_linhas": linhas}).execute()
+        total = resp.data if isinstance(resp.data, int) else len(linhas)
+        return True, f"{total} planejamento(s) atualizado(s)."
+    except Exception as e:
+        return False, f"Erro ao atualizar planejados em lote: {e}"
+
+
+def _q_planejados(client):
+    query = """
+        id_plan, recorrencia_plan, dia_plan, valor_plan, descricao_plan, dt_inicio_plan,
+        repeticoes_plan, plan_ativo, fk_caixinha_id, fk_pessoa_id,
+        caixinha:fk_caixinha_id (caixinha),
+        pessoa:fk_pessoa_id (nome)
+    """
+    return client.table("planejado").select(query).order("id_plan")
+
+
+def _fmt_planejados(data) -> pd.DataFrame:
+    return _achatar(data, {**_EMB_CAIXINHA, **_EMB_PESSOA}, datas=("dt_inicio_plan",), numeros=("valor_plan",))
+
+
+def buscar_planejados() -> pd.DataFrame:
     try:
-        query = """
-            id_plan, recorrencia_plan, dia_plan, valor_plan, descricao_plan, dt_inicio_plan,
-            repeticoes_plan, plan_ativo, fk_caixinha_id, fk_pessoa_id,
-            caixinha:fk_caixinha_id (caixinha),
-            pessoa:fk_pessoa_id (nome)
-        """
-        response = supabase.table("planejado").select(query).order("id_plan").execute()
-        data = response.data or []
-
-        flat_data = []
-        for row in data:
-            flat_row = row.copy()
-            cx = flat_row.pop("caixinha", None)
-            pes = flat_row.pop("pessoa", None)
-            flat_row["nome_caixinha"] = cx["caixinha"] if cx else ""
-            flat_row["nome_pessoa"] = pes["nome"] if pes else ""
-            flat_data.append(flat_row)
-
-        return flat_data
+        return _fmt_planejados(_q_planejados(get_client()).execute().data)
     except Exception as e:
         print(f"Erro buscar planejados: {e}")
-        return []
+        return pd.DataFrame()
 
 
 # ======================================================================================
 # CALENDÁRIO ANUAL
 # ======================================================================================
+def _q_eventos_calendario(client, ano: int):
+    dt_ini = dt.date(ano, 1, 1)
+    dt_fim = dt.date(ano + 1, 1, 1)
+
+    query = """
+        id_evento, data_evento, titulo, descricao, tipo, valor_previsto,
+        fk_caixinha_id, fk_planejado_id,
+        caixinha:fk_caixinha_id (caixinha)
+    """
+    return (
+        client.table("calendario_evento")
+        .select(query)
+        .gte("data_evento", str(dt_ini))
+        .lt("data_evento", str(dt_fim))
+        .order("data_evento", desc=False)
+    )
+
+
+def _fmt_eventos_calendario(data) -> pd.DataFrame:
+    return _achatar(data, _EMB_CAIXINHA, datas=("data_evento",), numeros=("valor_previsto",))
+
+
 def carregar_eventos_calendario(ano: int) -> pd.DataFrame:
     """
     Retorna DataFrame dos eventos do ano com join em caixinha.
     """
     try:
-        dt_ini = dt.date(ano, 1, 1)
-        dt_fim = dt.date(ano + 1, 1, 1)
-
-        query = """
-            id_evento, data_evento, titulo, descricao, tipo, valor_previsto,
-            fk_caixinha_id, fk_planejado_id,
-            caixinha:fk_caixinha_id (caixinha)
-        """
-        resp = (
-            supabase.table("calendario_evento")
-            .select(query)
-            .gte("data_evento", str(dt_ini))
-            .lt("data_evento", str(dt_fim))
-            .order("data_evento", desc=False)
-            .execute()
-        )
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
-
-        rows = []
-        for r in data:
-            rr = r.copy()
-            cx = rr.pop("caixinha", None)
-            rr["nome_caixinha"] = cx["caixinha"] if cx else ""
-            rows.append(rr)
-
-        df = pd.DataFrame(rows)
-        df["data_evento"] = pd.to_datetime(df["data_evento"]).dt.date
-        return df
+        return _fmt_eventos_calendario(_q_eventos_calendario(get_client(), ano).execute().data)
     except Exception as e:
         print(f"Erro carregar_eventos_calendario: {e}")
         return pd.DataFrame()
 
 
+def _fmt_eventos_por_mes(data) -> dict[int, pd.DataFrame]:
+    """
+    Eventos do ano já separados por mês {1: df, ..., 12: df} (só meses com evento).
+    Colunas derivadas (mes, vinculado, selecionar, converter) calculadas uma vez para o ano.
+    """
+    df = _fmt_eventos_calendario(data)
+    if df.empty:
+        return {}
+
+    df["mes"] = pd.to_datetime(df["data_evento"]).dt.month
+    vinc = df["fk_planejado_id"].notna() & (df["fk_planejado_id"].astype(str) != "")
+    df["vinculado"] = vinc.map({True: "SIM", False: "NÃO"})
+    df["selecionar"] = False
+    df["converter"] = False
+
+    return {int(mes): grupo.reset_index(drop=True) for mes, grupo in df.groupby("mes", sort=True)}
+
+
+def carregar_eventos_calendario_por_mes(ano: int) -> dict[int, pd.DataFrame]:
+    try:
+        return _fmt_eventos_por_mes(_q_eventos_calendario(get_client(), ano).execute().data)
+    except Exception as e:
+        print(f"Erro carregar_eventos_calendario_por_mes: {e}")
+        return {}
+
+
 def inserir_evento_calendario(data_evento, titulo, descricao, tipo, valor_previsto, fk_caixinha_id):
     if tipo not in TIPO_EVENTO_CALENDARIO:
         tipo = "OUTRO"
@@ -294,7 +674,7 @@ def inserir_evento_calendario(data_evento, titulo, descricao, tipo, valor_previs
     payload = {k: v for k, v in payload.items() if v is not None}
 
     try:
-        supabase.table("calendario_evento").insert(payload).execute()
+        get_client().table("calendario_evento").insert(payload).execute()
         return True, "Evento criado com sucesso!"
     except Exception as e:
         return False, f"Erro ao criar evento: {e}"
@@ -313,7 +693,7 @@ def atualizar_evento_calendario(id_evento, data_evento, titulo, descricao, tipo,
         "fk_caixinha_id": fk_caixinha_id,
     }
     try:
-        supabase.table("calendario_evento").update(payload).eq("id_evento", id_evento).execute()
+        get_client().table("calendario_evento").update(payload).eq("id_evento", id_evento).execute()
         return True, "Evento atualizado com sucesso!"
     except Exception as e:
         return False, f"Erro ao atualizar evento: {e}"
@@ -321,97 +701,44 @@ def atualizar_evento_calendario(id_evento, data_evento, titulo, descricao, tipo,
 
 def deletar_evento_calendario(id_evento: int):
     try:
-        supabase.table("calendario_evento").delete().eq("id_evento", id_evento).execute()
+        get_client().table("calendario_evento").delete().eq("id_evento", id_evento).execute()
         return True, "Evento deletado com sucesso!"
     except Exception as e:
         return False, f"Erro ao deletar evento: {e}"
 
 
-def _get_id_pessoa_casal() -> int | None:
-    """
-    Retorna id da pessoa 'Casal' (obrigatório para conversão).
-    """
-    try:
-        resp = supabase.table("pessoa").select("id_pessoa").eq("nome", "Casal").limit(1).execute()
-        if resp.data:
-            return resp.data[0]["id_pessoa"]
-        return None
-    except Exception:
-        return None
-
-
-def converter_evento_para_planejado(id_evento: int) -> tuple[bool, str]:
+def converter_eventos_para_planejado(ids_evento: list[int]) -> tuple[bool, list[dict] | str]:
     """
-    Cria um PLANEJADO (UNICO, repeticoes=1) baseado no evento e salva fk_planejado_id no evento.
-    Regras:
+    Converte vários eventos em PLANEJADO (UNICO, repeticoes=1) numa transação só
+    (RPC converter_eventos_para_planejado, SQL/DDL.SQL seção L): cria o planejado e grava
+    fk_planejado_id no evento juntos. Regras:
       - evento precisa ter valor_previsto e fk_caixinha_id
       - evento não pode já ter fk_planejado_id
       - pessoa padrão: 'Casal'
+    Retorna (True, [{id_evento, ok, id_plan, mensagem}, ...]) ou (False, msg) se a chamada falhar.
     """
-    try:
-        resp = (
-            supabase.table("calendario_evento")
-            .select("id_evento, data_evento, titulo, descricao, tipo, valor_previsto, fk_caixinha_id, fk_planejado_id")
-            .eq("id_evento", id_evento)
-            .limit(1)
-            .execute()
-        )
-        if not resp.data:
-            return False, "Evento não encontrado."
-
-        ev = resp.data[0]
-
-        if ev.get("fk_planejado_id"):
-            return False, "Este evento já está vinculado a um Planejado."
-
-        if ev.get("valor_previsto") is None:
-            return False, "Evento sem valor_previsto. Preencha um valor para converter."
-
-        if ev.get("fk_caixinha_id") is None:
-            return False, "Evento sem caixinha. Selecione uma caixinha para converter."
-
-        id_pessoa_casal = _get_id_pessoa_casal()
-        if not id_pessoa_casal:
-            return False, "Não encontrei a pessoa 'Casal' na tabela pessoa."
-
-        data_evento = pd.to_datetime(ev["data_evento"]).date()
-        dia = data_evento.day
-
-        descricao = ev.get("descricao") or ""
-        titulo = ev.get("titulo") or "Evento"
-        desc_plan = f"[Calendário] {titulo}" if not descricao else f"[Calendário] {titulo} - {descricao}"
-
-        ok, inserted = inserir_planejado(
-            recorrencia="UNICO",
-            dia=dia,
-            valor=float(ev["valor_previsto"]),
-            descricao=desc_plan[:255],
-            fk_caixinha_id=ev["fk_caixinha_id"],
-            fk_pessoa_id=id_pessoa_casal,
-            dt_inicio=data_evento,
-            repeticoes_plan=1,
-            ativo=True,
-        )
-        if not ok:
-            return False, f"Falha ao criar Planejado: {inserted}"
-
-        # inserted pode ser dict do planejado
-        if isinstance(inserted, dict) and inserted.get("id_plan"):
-            id_plan = inserted["id_plan"]
-        else:
-            # fallback: buscar o último planejado parecido (último recurso)
-            # (normalmente não cai aqui)
-            id_plan = None
-
-        if not id_plan:
-            return False, "Planejado criado, mas não consegui capturar id_plan para vincular no evento."
-
-        supabase.table("calendario_evento").update({"fk_planejado_id": id_plan}).eq("id_evento", id_evento).execute()
-        return True, f"Convertido! Planejado #{id_plan} criado e vinculado ao evento."
+    ids = sorted({int(i) for i in ids_evento})
+    if not ids:
+        return True, []
 
+    try:
+        resp = get_client().rpc("converter_eventos_para_planejado", {"p_ids": ids}).execute()
+        return True, resp.data or []
     except Exception as e:
         return False, f"Erro ao converter: {e}"
 
+
+def converter_evento_para_planejado(id_evento: int) -> tuple[bool, str]:
+    """
+    Cria um PLANEJADO a partir de um evento (regras em converter_eventos_para_planejado).
+    """
+    ok, res = converter_eventos_para_planejado([id_evento])
+    if not ok:
+        return False, res
+    if not res:
+        return False, "Evento não encontrado."
+    return bool(res[0].get("ok")), res[0].get("mensagem") or ""
+
 # ==========================
 # METAS & METINHAS (SEMESTRE)
 # ==========================
@@ -432,67 +759,101 @@ def _periodo_semestre(ano: int, semestre: int):
     return ini, fim
 
 
+def _q_metas(client, ano: int, semestre: int):
+    ini, fim = _periodo_semestre(ano, semestre)
+
+    query = """
+        id_meta, meta, valor_alvo, status, fk_caixinha_id, created_at,
+        horizonte, dt_inicio, dt_fim, tipo, meta_pai_id,
+        caixinha:fk_caixinha_id (caixinha)
+    """
+    # Filtro do semestre no banco (índice idx_metas_periodo):
+    # - se dt_inicio/dt_fim nulos: assume que vale (não bloqueia)
+    # - se preenchidos: tem que intersectar o semestre (dt_inicio <= fim e dt_fim >= ini)
+    return (
+        client.table("metas")
+        .select(query)
+        .or_(f"dt_inicio.is.null,dt_inicio.lte.{fim.isoformat()}")
+        .or_(f"dt_fim.is.null,dt_fim.gte.{ini.isoformat()}")
+        .order("meta_pai_id", desc=False)  # mães primeiro (nulls first costuma vir)
+        .order("id_meta", desc=False)
+    )
+
+
+def _fmt_metas_semestre(data) -> pd.DataFrame:
+    return _achatar(data, _EMB_CAIXINHA, datas=("dt_inicio", "dt_fim"), numeros=("valor_alvo",))
+
+
 def carregar_metas_semestre(ano: int, semestre: int) -> pd.DataFrame:
     """
     Retorna metas do semestre (mães + metinhas).
     Critério: dt_inicio/dt_fim dentro do intervalo OU nulos (compatibilidade).
     """
     try:
-        ini, fim = _periodo_semestre(ano, semestre)
-
-        query = """
-            id_meta, meta, valor_alvo, status, fk_caixinha_id, created_at,
-            horizonte, dt_inicio, dt_fim, tipo, meta_pai_id,
-            caixinha:fk_caixinha_id (caixinha)
-        """
-        resp = (
-            supabase.table("metas")
-            .select(query)
-            .order("meta_pai_id", desc=False)  # mães primeiro (nulls first costuma vir)
-            .order("id_meta", desc=False)
-            .execute()
-        )
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
-
-        rows = []
-        for r in data:
-            rr = r.copy()
-            cx = rr.pop("caixinha", None)
-            rr["nome_caixinha"] = cx["caixinha"] if cx else ""
-            rows.append(rr)
-
-        df = pd.DataFrame(rows)
-
-        # Normalizar datas
-        if "dt_inicio" in df.columns:
-            df["dt_inicio"] = pd.to_datetime(df["dt_inicio"], errors="coerce").dt.date
-        if "dt_fim" in df.columns:
-            df["dt_fim"] = pd.to_datetime(df["dt_fim"], errors="coerce").dt.date
-
-        # Filtrar para o semestre:
-        # - se dt_inicio/dt_fim nulos: assume que vale (não bloqueia)
-        # - se preenchidos: tem que intersectar o semestre
-        def intersects(row):
-            di = row.get("dt_inicio")
-            dfim = row.get("dt_fim")
-            if di is None and dfim is None:
-                return True
-            if di is None:
-                di = ini
-            if dfim is None:
-                dfim = fim
-            return not (dfim < ini or di > fim)
-
-        df = df[df.apply(intersects, axis=1)].copy()
-        return df
-
+        return _fmt_metas_semestre(_q_metas(get_client(), ano, semestre).execute().data)
     except Exception as e:
         print(f"Erro carregar_metas_semestre: {e}")
         return pd.DataFrame()
 
 
+# --- ÁRVORE DE METAS + PROGRESSO ---
+def _q_arvore_metas(client, ano: int, semestre: int):
+    """RPC arvore_metas (SQL/DDL.SQL seção I): árvore inteira + realizado de cada meta."""
+    ini, fim = _periodo_semestre(ano, semestre)
+    return client.rpc("arvore_metas", {"p_ini": ini.isoformat(), "p_fim": fim.isoformat()})
+
+
+def _rollup_arvore_metas(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Soma filhas nas mães, do nível mais fundo para a raiz (um groupby por nível):
+      realizado_total = realizado próprio + realizado_total das filhas
+      alvo_total      = valor_alvo próprio; se a meta não tem alvo, soma dos alvos das filhas
+    """
+    df = df.copy()
+    df["realizado"] = pd.to_numeric(df["realizado"], errors="coerce").fillna(0.0).astype(float)
+    df["valor_alvo"] = pd.to_numeric(df["valor_alvo"], errors="coerce").astype(float)
+    df["realizado_total"] = df["realizado"]
+    df["alvo_total"] = df["valor_alvo"]
+
+    idx = pd.Index(df["id_meta"])
+    for nivel in range(int(df["nivel"].max()), 0, -1):
+        filhas = df[df["nivel"] == nivel]
+        soma = filhas.groupby("meta_pai_id")[["realizado_total", "alvo_total"]].sum(min_count=1)
+        pos = idx.get_indexer(soma.index)
+        ok = pos >= 0
+        pos, soma = pos[ok], soma[ok]
+
+        col_real = df.columns.get_loc("realizado_total")
+        col_alvo = df.columns.get_loc("alvo_total")
+        df.iloc[pos, col_real] = df.iloc[pos, col_real].to_numpy() + soma["realizado_total"].fillna(0.0).to_numpy()
+        sem_alvo = df.iloc[pos, col_alvo].isna().to_numpy()
+        df.iloc[pos[sem_alvo], col_alvo] = soma["alvo_total"].to_numpy()[sem_alvo]
+
+    alvo = df["alvo_total"].where(df["alvo_total"] > 0)
+    df["progresso_pct"] = (df["realizado_total"] / alvo * 100).round(1)
+    return df
+
+
+def _fmt_arvore_metas(data) -> pd.DataFrame:
+    if not data:
+        return pd.DataFrame()
+    return _rollup_arvore_metas(pd.DataFrame(data))
+
+
+def carregar_arvore_metas(ano: int, semestre: int) -> pd.DataFrame:
+    """
+    Metas do semestre em árvore (qualquer profundidade), com progresso medido:
+    id_meta, meta_pai_id, nivel, meta, valor_alvo, fk_caixinha_id, realizado,
+    realizado_total, alvo_total, progresso_pct (NaN quando não há alvo).
+    realizado = movimentações CONFIRMADO/CONCILIADO da caixinha da meta no período dela.
+    """
+    try:
+        return _fmt_arvore_metas(_q_arvore_metas(get_client(), ano, semestre).execute().data)
+    except Exception as e:
+        print(f"Erro carregar_arvore_metas: {e}")
+        return pd.DataFrame()
+
+
 def inserir_meta(
     meta: str,
     valor_alvo: float | None,
@@ -525,7 +886,7 @@ def inserir_meta(
     payload = {k: v for k, v in payload.items() if v is not None}
 
     try:
-        resp = supabase.table("metas").insert(payload).execute()
+        resp = get_client().table("metas").insert(payload).execute()
         return True, resp.data[0] if resp.data else "Meta inserida"
     except Exception as e:
         return False, f"Erro ao inserir meta: {e}"
@@ -561,7 +922,7 @@ def atualizar_meta(
     }
 
     try:
-        supabase.table("metas").update(payload).eq("id_meta", id_meta).execute()
+        get_client().table("metas").update(payload).eq("id_meta", id_meta).execute()
         return True, "Meta atualizada"
     except Exception as e:
         return False, f"Erro ao atualizar meta: {e}"
@@ -572,7 +933,7 @@ def deletar_meta(id_meta: int):
     Atenção: se for meta mãe, metinhas (filhas) serão apagadas por ON DELETE CASCADE.
     """
     try:
-        supabase.table("metas").delete().eq("id_meta", id_meta).execute()
+        get_client().table("metas").delete().eq("id_meta", id_meta).execute()
         return True, "Meta deletada"
     except Exception as e:
         return False, f"Erro ao deletar meta: {e}"
@@ -585,36 +946,40 @@ STATUS_PRIORIDADE_OPTIONS = ["ATIVA", "CONCLUIDA", "PAUSADA"]
 HORIZONTE_PRIORIDADE_OPTIONS = ["SEMESTRE", "ANO"]
 
 
+def _q_prioridades(client, ano: int, horizonte: str):
+    if horizonte not in HORIZONTE_PRIORIDADE_OPTIONS:
+        horizonte = "SEMESTRE"
+
+    dt_ini = dt.date(ano, 1, 1)
+    dt_fim = dt.date(ano + 1, 1, 1)
+
+    return (
+        client.table("prioridade")
+        .select("id_prioridade, titulo, descricao, horizonte, periodo_inicio, periodo_fim, status, created_at")
+        .eq("horizonte", horizonte)
+        .gte("periodo_inicio", str(dt_ini))
+        .lt("periodo_inicio", str(dt_fim))
+        .order("periodo_inicio", desc=False)
+        .order("id_prioridade", desc=False)
+    )
+
+
+def _fmt_prioridades(data) -> pd.DataFrame:
+    if not data:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(data)
+    df["periodo_inicio"] = pd.to_datetime(df["periodo_inicio"], errors="coerce").dt.date
+    df["periodo_fim"] = pd.to_datetime(df["periodo_fim"], errors="coerce").dt.date
+    return df
+
+
 def carregar_prioridades(ano: int, horizonte: str) -> pd.DataFrame:
     """
     Carrega prioridades filtrando por ano (periodo_inicio dentro do ano) e horizonte.
     """
     try:
-        if horizonte not in HORIZONTE_PRIORIDADE_OPTIONS:
-            horizonte = "SEMESTRE"
-
-        dt_ini = dt.date(ano, 1, 1)
-        dt_fim = dt.date(ano + 1, 1, 1)
-
-        resp = (
-            supabase.table("prioridade")
-            .select("id_prioridade, titulo, descricao, horizonte, periodo_inicio, periodo_fim, status, created_at")
-            .eq("horizonte", horizonte)
-            .gte("periodo_inicio", str(dt_ini))
-            .lt("periodo_inicio", str(dt_fim))
-            .order("periodo_inicio", desc=False)
-            .order("id_prioridade", desc=False)
-            .execute()
-        )
-
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(data)
-        df["periodo_inicio"] = pd.to_datetime(df["periodo_inicio"], errors="coerce").dt.date
-        df["periodo_fim"] = pd.to_datetime(df["periodo_fim"], errors="coerce").dt.date
-        return df
+        return _fmt_prioridades(_q_prioridades(get_client(), ano, horizonte).execute().data)
     except Exception as e:
         print(f"Erro carregar_prioridades: {e}")
         return pd.DataFrame()
@@ -637,7 +1002,7 @@ def inserir_prioridade(titulo: str, descricao: str | None, horizonte: str, perio
     payload = {k: v for k, v in payload.items() if v is not None}
 
     try:
-        supabase.table("prioridade").insert(payload).execute()
+        get_client().table("prioridade").insert(payload).execute()
         return True, "Prioridade criada!"
     except Exception as e:
         return False, f"Erro ao criar prioridade: {e}"
@@ -658,7 +1023,7 @@ def atualizar_prioridade(id_prioridade: int, titulo: str, descricao: str | None,
         "status": status,
     }
     try:
-        supabase.table("prioridade").update(payload).eq("id_prioridade", id_prioridade).execute()
+        get_client().table("prioridade").update(payload).eq("id_prioridade", id_prioridade).execute()
         return True, "Prioridade atualizada!"
     except Exception as e:
         return False, f"Erro ao atualizar prioridade: {e}"
@@ -666,7 +1031,7 @@ def atualizar_prioridade(id_prioridade: int, titulo: str, descricao: str | None,
 
 def deletar_prioridade(id_prioridade: int):
     try:
-        supabase.table("prioridade").delete().eq("id_prioridade", id_prioridade).execute()
+        get_client().table("prioridade").delete().eq("id_prioridade", id_prioridade).execute()
         return True, "Prioridade apagada!"
     except Exception as e:
         return False, f"Erro ao apagar prioridade: {e}"
@@ -679,91 +1044,117 @@ def _primeiro_dia_mes(data: dt.date) -> dt.date:
     return dt.date(data.year, data.month, 1)
 
 
+def _q_areas_vida(client):
+    return (
+        client.table("area_vida")
+        .select("id_area, nome, ativa")
+        .eq("ativa", True)
+        .order("id_area", desc=False)
+    )
+
+
 def carregar_areas_vida() -> list[dict]:
     try:
-        resp = (
-            supabase.table("area_vida")
-            .select("id_area, nome, ativa")
-            .eq("ativa", True)
-            .order("id_area", desc=False)
-            .execute()
-        )
-        return resp.data or []
+        return _q_areas_vida(get_client()).execute().data or []
     except Exception as e:
         print(f"Erro carregar_areas_vida: {e}")
         return []
 
 
+def _q_checkin_mes(client, mes_ref: dt.date):
+    mes_ref = _primeiro_dia_mes(mes_ref)
+    query = """
+        id_checkin, mes_ref, fk_area_id, nota, comentario, created_at,
+        area:fk_area_id (nome)
+    """
+    return (
+        client.table("checkin_area_vida")
+        .select(query)
+        .eq("mes_ref", str(mes_ref))
+        .order("fk_area_id", desc=False)
+    )
+
+
+def _fmt_checkins(data) -> pd.DataFrame:
+    return _achatar(data, {"area": ("nome", "area_nome")}, datas=("mes_ref",))
+
+
 def carregar_checkin_mes(mes_ref: dt.date) -> pd.DataFrame:
     """
     Retorna checkins do mês (um por área).
     """
     try:
-        mes_ref = _primeiro_dia_mes(mes_ref)
-        query = """
-            id_checkin, mes_ref, fk_area_id, nota, comentario, created_at,
-            area:fk_area_id (nome)
-        """
-        resp = (
-            supabase.table("checkin_area_vida")
-            .select(query)
-            .eq("mes_ref", str(mes_ref))
-            .order("fk_area_id", desc=False)
-            .execute()
-        )
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
-
-        rows = []
-        for r in data:
-            rr = r.copy()
-            area = rr.pop("area", None)
-            rr["area_nome"] = area["nome"] if area else ""
-            rows.append(rr)
-
-        df = pd.DataFrame(rows)
-        df["mes_ref"] = pd.to_datetime(df["mes_ref"]).dt.date
-        return df
+        return _fmt_checkins(_q_checkin_mes(get_client(), mes_ref).execute().data)
     except Exception as e:
         print(f"Erro carregar_checkin_mes: {e}")
         return pd.DataFrame()
 
 
-def salvar_checkin_area(mes_ref: dt.date, fk_area_id: int, nota: int, comentario: str | None):
+def salvar_checkins_mes(mes_ref: dt.date, itens: list[dict]) -> tuple[bool, dict | str]:
     """
-    Upsert do check-in por (mes_ref, fk_area_id).
-    Requer UNIQUE(mes_ref, fk_area_id) no banco (recomendado).
+    Upsert de todas as áreas do mês numa chamada só (RPC salvar_checkins_lote, SQL/DDL.SQL seção J,
+    ON CONFLICT (mes_ref, fk_area_id)).
+    itens: [{"fk_area_id": 1, "nota": 7, "comentario": "..."}, ...]
+    Comentário vazio mantém o que já estava salvo.
+    Retorna (True, {"criados": n, "atualizados": m}) ou (False, msg).
     """
+    if not itens:
+        return True, {"criados": 0, "atualizados": 0}
+
     try:
         mes_ref = _primeiro_dia_mes(mes_ref)
-        payload = {
-            "mes_ref": str(mes_ref),
-            "fk_area_id": int(fk_area_id),
-            "nota": int(nota),
-            "comentario": comentario if comentario else None,
+        # uma linha por área (o ON CONFLICT não aceita a mesma área duas vezes no mesmo comando)
+        por_area = {}
+        for item in itens:
+            por_area[int(item["fk_area_id"])] = {
+                "fk_area_id": int(item["fk_area_id"]),
+                "nota": int(item["nota"]),
+                "comentario": item.get("comentario") or None,
+            }
+
+        resp = get_client().rpc(
+            "salvar_checkins_lote", {"p_mes_ref": str(mes_ref), "p_itens": list(por_area.values())}
+        ).execute()
+        invalidar_historico_checkins([mes_ref.year])
+        contagem = (resp.data or [{}])[0]
+        return True, {
+            "criados": int(contagem.get("criados") or 0),
+            "atualizados": int(contagem.get("atualizados") or 0),
         }
-        payload = {k: v for k, v in payload.items() if v is not None}
-
-        # Tenta update primeiro
-        existing = (
-            supabase.table("checkin_area_vida")
-            .select("id_checkin")
-            .eq("mes_ref", str(mes_ref))
-            .eq("fk_area_id", int(fk_area_id))
-            .limit(1)
-            .execute()
-        )
-        if existing.data:
-            id_checkin = existing.data[0]["id_checkin"]
-            supabase.table("checkin_area_vida").update(payload).eq("id_checkin", id_checkin).execute()
-            return True, "Atualizado"
-        else:
-            supabase.table("checkin_area_vida").insert(payload).execute()
-            return True, "Criado"
-
     except Exception as e:
-        return False, f"Erro ao salvar check-in: {e}"
+        return False, f"Erro ao salvar check-ins: {e}"
+
+
+def salvar_checkin_area(mes_ref: dt.date, fk_area_id: int, nota: int, comentario: str | None):
+    """
+    Upsert do check-in por (mes_ref, fk_area_id). Para o mês inteiro use salvar_checkins_mes().
+    """
+    ok, res = salvar_checkins_mes(mes_ref, [{"fk_area_id": fk_area_id, "nota": nota, "comentario": comentario}])
+    if not ok:
+        return False, res
+    return True, "Criado" if res["criados"] else "Atualizado"
+
+
+def _q_historico_checkins(client, ano: int):
+    return _q_historico_checkins_periodo(client, ano, ano)
+
+
+def _q_historico_checkins_periodo(client, ano_ini: int, ano_fim: int):
+    dt_ini = dt.date(ano_ini, 1, 1)
+    dt_fim = dt.date(ano_fim + 1, 1, 1)
+
+    query = """
+        id_checkin, mes_ref, fk_area_id, nota,
+        area:fk_area_id (nome)
+    """
+    return (
+        client.table("checkin_area_vida")
+        .select(query)
+        .gte("mes_ref", str(dt_ini))
+        .lt("mes_ref", str(dt_fim))
+        .order("mes_ref", desc=False)
+        .order("fk_area_id", desc=False)
+    )
 
 
 def historico_checkins_ano(ano: int) -> pd.DataFrame:
@@ -771,40 +1162,135 @@ def historico_checkins_ano(ano: int) -> pd.DataFrame:
     Retorna histórico do ano: mes_ref x area_nome x nota
     """
     try:
-        dt_ini = dt.date(ano, 1, 1)
-        dt_fim = dt.date(ano + 1, 1, 1)
-
-        query = """
-            id_checkin, mes_ref, fk_area_id, nota,
-            area:fk_area_id (nome)
-        """
-        resp = (
-            supabase.table("checkin_area_vida")
-            .select(query)
-            .gte("mes_ref", str(dt_ini))
-            .lt("mes_ref", str(dt_fim))
-            .order("mes_ref", desc=False)
-            .order("fk_area_id", desc=False)
-            .execute()
-        )
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
-
-        rows = []
-        for r in data:
-            rr = r.copy()
-            area = rr.pop("area", None)
-            rr["area_nome"] = area["nome"] if area else ""
-            rows.append(rr)
-
-        df = pd.DataFrame(rows)
-        df["mes_ref"] = pd.to_datetime(df["mes_ref"]).dt.date
-        return df
+        return _fmt_checkins(_q_historico_checkins(get_client(), ano).execute().data)
     except Exception as e:
         print(f"Erro historico_checkins_ano: {e}")
         return pd.DataFrame()
 
+
+# --- HISTÓRICO MULTI-ANO (matriz mês x área) ---
+# ano -> (momento do cache, matriz). Compartilhado entre sessões; salvar check-in invalida o ano.
+# O TTL cobre gravações feitas fora deste processo.
+_CACHE_MATRIZ_CHECKIN: dict[int, tuple[float, pd.DataFrame]] = {}
+_CACHE_HIST_RESULTADO: dict[tuple, tuple[float, dict]] = {}
+_CACHE_CHECKIN_TTL = 600
+_cache_checkin_lock = threading.Lock()
+
+
+def invalidar_historico_checkins(anos=None) -> None:
+    """Descarta as matrizes dos anos informados (todas se None)."""
+    with _cache_checkin_lock:
+        if anos is None:
+            _CACHE_MATRIZ_CHECKIN.clear()
+        else:
+            for ano in anos:
+                _CACHE_MATRIZ_CHECKIN.pop(int(ano), None)
+        _CACHE_HIST_RESULTADO.clear()
+
+
+def _matriz_checkins(df: pd.DataFrame) -> pd.DataFrame:
+    """Linhas = mes_ref (1º dia do mês), colunas = área, valores = nota."""
+    if df is None or df.empty:
+        return pd.DataFrame()
+    m = df.pivot_table(index="mes_ref", columns="area_nome", values="nota", aggfunc="max")
+    m.index = pd.to_datetime(m.index)
+    m.columns.name = None
+    return m.sort_index().astype("float32")
+
+
+def _matrizes_por_ano(ano_ini: int, ano_fim: int) -> dict[int, pd.DataFrame]:
+    """Matrizes do intervalo; os anos fora do cache vêm numa query só."""
+    agora = time.monotonic()
+    anos = range(ano_ini, ano_fim + 1)
+    with _cache_checkin_lock:
+        em_cache = {
+            a: v[1] for a, v in _CACHE_MATRIZ_CHECKIN.items()
+            if a in anos and agora - v[0] < _CACHE_CHECKIN_TTL
+        }
+    faltando = [a for a in anos if a not in em_cache]
+    if not faltando:
+        return em_cache
+
+    data = _q_historico_checkins_periodo(get_client(), min(faltando), max(faltando)).execute().data
+    df = _fmt_checkins(data)
+    if not df.empty:
+        df["ano"] = pd.to_datetime(df["mes_ref"]).dt.year
+    novos = {
+        a: _matriz_checkins(df[df["ano"] == a]) if not df.empty else pd.DataFrame()
+        for a in faltando
+    }
+    with _cache_checkin_lock:
+        for a, m in novos.items():
+            _CACHE_MATRIZ_CHECKIN[a] = (agora, m)
+    return {**em_cache, **novos}
+
+
+def _tendencia_areas(matriz: pd.DataFrame) -> pd.DataFrame:
+    """
+    Por área: média, última nota, nº de meses e inclinação (pontos por mês, mínimos
+    quadrados sobre os meses com nota). Tudo em numpy, coluna a coluna de uma vez.
+    """
+    y = matriz.to_numpy(dtype="float64")
+    idx = matriz.index
+    x = ((idx.year - idx[0].year) * 12 + (idx.month - idx[0].month)).to_numpy(dtype="float64")
+    tem = ~np.isnan(y)
+    xs = np.where(tem, x[:, None], np.nan)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dx = xs - np.nanmean(xs, axis=0)
+        dy = y - np.nanmean(y, axis=0)
+        inclinacao = np.nansum(dx * dy, axis=0) / np.nansum(dx * dx, axis=0)
+
+    ultima = matriz.ffill().iloc[-1].to_numpy()
+    return pd.DataFrame(
+        {
+            "media": np.nanmean(y, axis=0).round(2),
+            "ultima": ultima,
+            "meses": tem.sum(axis=0),
+            "tendencia_mes": np.where(tem.sum(axis=0) >= 2, inclinacao, np.nan).round(3),
+        },
+        index=matriz.columns,
+    )
+
+
+def historico_checkins_periodo(ano_ini: int, ano_fim: int, janela: int = 3) -> dict:
+    """
+    Histórico do Círculo da Vida de ano_ini a ano_fim:
+      "matriz"      -> mês x área (nota)
+      "media_movel" -> média móvel de `janela` meses por área
+      "tendencia"   -> por área: media, ultima, meses, tendencia_mes
+    Matrizes ficam em cache por ano e o resultado por (ano_ini, ano_fim, janela);
+    o chamador sempre recebe cópias, nunca os DataFrames do cache.
+    """
+    vazio = {"matriz": pd.DataFrame(), "media_movel": pd.DataFrame(), "tendencia": pd.DataFrame()}
+    chave = (int(ano_ini), int(ano_fim), int(janela))
+    with _cache_checkin_lock:
+        hit = _CACHE_HIST_RESULTADO.get(chave)
+    if hit and time.monotonic() - hit[0] < _CACHE_CHECKIN_TTL:
+        return {k: v.copy() for k, v in hit[1].items()}
+
+    try:
+        matrizes = _matrizes_por_ano(*chave[:2])
+        partes = [m for _, m in sorted(matrizes.items()) if not m.empty]
+        if not partes:
+            return vazio
+
+        matriz = pd.concat(partes).sort_index()
+        # janela em meses do calendário: meses sem check-in entram como NaN antes do rolling
+        meses = pd.date_range(matriz.index.min(), matriz.index.max(), freq="MS")
+        media_movel = matriz.reindex(meses).rolling(janela, min_periods=1).mean().reindex(matriz.index)
+        resultado = {
+            "matriz": matriz,
+            "media_movel": media_movel.round(2),
+            "tendencia": _tendencia_areas(matriz),
+        }
+        with _cache_checkin_lock:
+            _CACHE_HIST_RESULTADO[chave] = (time.monotonic(), resultado)
+        return {k: v.copy() for k, v in resultado.items()}
+    except Exception as e:
+        print(f"Erro historico_checkins_periodo: {e}")
+        return vazio
+
 # ==========================
 # DESAPEGO CONSCIENTE
 # ==========================
@@ -812,36 +1298,28 @@ def historico_checkins_ano(ano: int) -> pd.DataFrame:
 DECISAO_DESAPEGO_OPTIONS = ["MANTER", "CORTAR", "TESTAR", "RENEGOCIAR"]
 
 
+def _q_desapego(client):
+    query = """
+        id_item, nome_item, fk_caixinha_id, valor_estimado, frequencia, decisao, prazo_revisao,
+        observacao, ativo, created_at,
+        caixinha:fk_caixinha_id (caixinha)
+    """
+    return (
+        client.table("desapego_item")
+        .select(query)
+        .order("ativo", desc=True)
+        .order("prazo_revisao", desc=False)
+        .order("id_item", desc=False)
+    )
+
+
+def _fmt_desapego(data) -> pd.DataFrame:
+    return _achatar(data, _EMB_CAIXINHA, datas=("prazo_revisao",), numeros=("valor_estimado",))
+
+
 def carregar_desapego() -> pd.DataFrame:
     try:
-        query = """
-            id_item, nome_item, fk_caixinha_id, valor_estimado, frequencia, decisao, prazo_revisao,
-            observacao, ativo, created_at,
-            caixinha:fk_caixinha_id (caixinha)
-        """
-        resp = (
-            supabase.table("desapego_item")
-            .select(query)
-            .order("ativo", desc=True)
-            .order("prazo_revisao", desc=False)
-            .order("id_item", desc=False)
-            .execute()
-        )
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
-
-        rows = []
-        for r in data:
-            rr = r.copy()
-            cx = rr.pop("caixinha", None)
-            rr["nome_caixinha"] = cx["caixinha"] if cx else ""
-            rows.append(rr)
-
-        df = pd.DataFrame(rows)
-        if "prazo_revisao" in df.columns:
-            df["prazo_revisao"] = pd.to_datetime(df["prazo_revisao"], errors="coerce").dt.date
-        return df
+        return _fmt_desapego(_q_desapego(get_client()).execute().data)
     except Exception as e:
         print(f"Erro carregar_desapego: {e}")
         return pd.DataFrame()
@@ -868,7 +1346,7 @@ def inserir_desapego_item(nome_item: str, fk_caixinha_id: int | None, valor_esti
     payload = {k: v for k, v in payload.items() if v is not None}
 
     try:
-        supabase.table("desapego_item").insert(payload).execute()
+        get_client().table("desapego_item").insert(payload).execute()
         return True, "Item criado!"
     except Exception as e:
         return False, f"Erro ao criar item: {e}"
@@ -893,7 +1371,7 @@ def atualizar_desapego_item(id_item: int, nome_item: str, fk_caixinha_id: int |
         "ativo": bool(ativo),
     }
     try:
-        supabase.table("desapego_item").update(payload).eq("id_item", id_item).execute()
+        get_client().table("desapego_item").update(payload).eq("id_item", id_item).execute()
         return True, "Item atualizado!"
     except Exception as e:
         return False, f"Erro ao atualizar item: {e}"
@@ -901,76 +1379,127 @@ def atualizar_desapego_item(id_item: int, nome_item: str, fk_caixinha_id: int |
 
 def deletar_desapego_item(id_item: int):
     try:
-        supabase.table("desapego_item").delete().eq("id_item", id_item).execute()
+        get_client().table("desapego_item").delete().eq("id_item", id_item).execute()
         return True, "Item apagado!"
     except Exception as e:
         return False, f"Erro ao apagar item: {e}"
 
 
-def criar_planejado_de_desapego(id_item: int) -> tuple[bool, str]:
+def criar_planejados_de_desapego(ids_item: list[int]) -> tuple[bool, list[dict] | str]:
     """
-    Cria um planejado a partir do item do desapego:
+    Cria os planejados de vários itens do desapego numa chamada só
+    (RPC criar_planejados_de_desapego, SQL/DDL.SQL seção K). Regras por item:
       - pessoa: Casal
       - recorrência: item.frequencia (MENSAL/SEMANAL/UNICO)
       - dia_plan: dia do prazo_revisao se existir; senão dia de hoje
       - dt_inicio_plan: hoje
       - repeticoes_plan: -1 (sempre), exceto UNICO => 1
+    Retorna (True, [{id_item, ok, id_plan, mensagem}, ...]) ou (False, msg) se a chamada falhar.
     """
+    ids = sorted({int(i) for i in ids_item})
+    if not ids:
+        return True, []
+
     try:
-        resp = (
-            supabase.table("desapego_item")
-            .select("id_item, nome_item, fk_caixinha_id, valor_estimado, frequencia, decisao, prazo_revisao, ativo")
-            .eq("id_item", id_item)
-            .limit(1)
-            .execute()
-        )
-        if not resp.data:
-            return False, "Item não encontrado."
+        resp = get_client().rpc(
+            "criar_planejados_de_desapego", {"p_ids": ids, "p_hoje": str(dt.date.today())}
+        ).execute()
+        return True, resp.data or []
+    except Exception as e:
+        return False, f"Erro ao criar planejados: {e}"
 
-        it = resp.data[0]
 
-        if not it.get("fk_caixinha_id"):
-            return False, "O item não tem caixinha. Selecione uma caixinha antes de criar o Planejado."
+def criar_planejado_de_desapego(id_item: int) -> tuple[bool, str]:
+    """
+    Cria um planejado a partir do item do desapego (regras em criar_planejados_de_desapego).
+    """
+    ok, res = criar_planejados_de_desapego([id_item])
+    if not ok:
+        return False, res
+    if not res:
+        return False, "Item não encontrado."
+    return bool(res[0].get("ok")), res[0].get("mensagem") or ""
 
-        if it.get("valor_estimado") is None:
-            return False, "O item não tem valor_estimado. Preencha um valor para criar o Planejado."
 
-        id_pessoa_casal = _get_id_pessoa_casal()
-        if not id_pessoa_casal:
-            return False, "Não encontrei a pessoa 'Casal' na tabela pessoa."
+# ==========================
+# UPDATE EM LOTE (GRIDS)
+# ==========================
+# tabela -> chave primária, colunas enum (opções válidas) e limites de texto.
+# O RPC atualizar_lote (SQL/DDL.SQL seção G) só aceita estas tabelas.
+_TABELAS_LOTE = {
+    "metas": {
+        "chave": "id_meta",
+        "enums": {"status": STATUS_META_OPTIONS, "horizonte": HORIZONTE_OPTIONS, "tipo": TIPO_META_OPTIONS},
+        "texto": {"meta": 255},
+    },
+    "prioridade": {
+        "chave": "id_prioridade",
+        "enums": {"status": STATUS_PRIORIDADE_OPTIONS, "horizonte": HORIZONTE_PRIORIDADE_OPTIONS},
+        "texto": {"titulo": 120},
+    },
+    "desapego_item": {
+        "chave": "id_item",
+        "enums": {"decisao": DECISAO_DESAPEGO_OPTIONS, "frequencia": RECORRENCIA_OPTIONS},
+        "texto": {"nome_item": 120},
+    },
+    "calendario_evento": {
+        "chave": "id_evento",
+        "enums": {"tipo": TIPO_EVENTO_CALENDARIO},
+        "texto": {},
+    },
+}
+
+
+def atualizar_em_lote(tabela: str, chave: str, linhas: list[dict]) -> tuple[bool, str]:
+    """
+    Update parcial de várias linhas numa chamada só (uma transação).
+    linhas: [{chave: 1, "status": "ATINGIDA"}, {chave: 7, "meta": "..."}] (formato do grid_diff)
+    As colunas enum são validadas todas de uma vez antes de qualquer escrita.
+    """
+    cfg = _TABELAS_LOTE.get(tabela)
+    if cfg is None:
+        return False, f"Tabela sem update em lote: {tabela}"
+    if chave != cfg["chave"]:
+        return False, f"Chave inválida para {tabela}: {chave}"
+    if not linhas:
+        return True, "Nada para atualizar."
+
+    df = pd.DataFrame(linhas)
+    if chave not in df.columns or df[chave].isna().any():
+        return False, f"Linha sem {chave}."
+
+    erros = []
+    for col, opcoes in cfg["enums"].items():
+        if col not in df.columns:
+            continue
+        invalidas = df[col].notna() & ~df[col].isin(opcoes)
+        for k, v in zip(df.loc[invalidas, chave], df.loc[invalidas, col]):
+            erros.append(f"{col} inválido: {v} ({chave}={k})")
+    if erros:
+        return False, "; ".join(erros)
+
+    payload = []
+    for linha in linhas:
+        item = {}
+        for col, v in linha.items():
+            if isinstance(v, dt.date):
+                v = str(v)
+            elif isinstance(v, str) and col in cfg["texto"]:
+                v = v[: cfg["texto"][col]]
+            item[col] = v
+        item[chave] = int(item[chave])
+        payload.append(item)
 
-        hoje = dt.date.today()
-        prazo = it.get("prazo_revisao")
-        if prazo:
-            prazo = pd.to_datetime(prazo).date()
-            dia = prazo.day
-        else:
-            dia = hoje.day
-
-        freq = it.get("frequencia") or "MENSAL"
-        repet = 1 if freq == "UNICO" else -1
-
-        descricao = f"[Desapego] {it.get('nome_item','Item')}"
-        ok, inserted = inserir_planejado(
-            recorrencia=freq,
-            dia=dia,
-            valor=float(it["valor_estimado"]),
-            descricao=descricao[:255],
-            fk_caixinha_id=int(it["fk_caixinha_id"]),
-            fk_pessoa_id=int(id_pessoa_casal),
-            dt_inicio=hoje,
-            repeticoes_plan=repet,
-            ativo=True,
-        )
-        if not ok:
-            return False, f"Falha ao criar Planejado: {inserted}"
+    try:
+        resp = get_client().rpc(
+            "atualizar_lote", {"p_tabela": tabela, "p_chave": chave, "p_linhas": payload}
+        ).execute()
+        total = resp.data if isinstance(resp.data, int) else len(payload)
+        return True, f"{total} linha(s) atualizada(s)."
+    except Exception as e:
+        return False, f"Erro no update em lote ({tabela}): {e}"
 
-        if isinstance(inserted, dict) and inserted.get("id_plan"):
-            return True, f"Planejado #{inserted['id_plan']} criado a partir do item."
-        return True, "Planejado criado a partir do item."
 
-    except Exception as e:
-        return False, f"Erro ao criar planejado: {e}"
 # ==========================
 # DASHBOARD (REAL x PLANEJADO)
 # ==========================
@@ -984,61 +1513,130 @@ def _range_mes(ano: int, mes: int):
     return ini, fim
 
 
-def carregar_mov_mes_agregado(ano: int, mes: int, id_pessoa: int | None = None, somente_confirmado: bool = True) -> pd.DataFrame:
-    """
-    Soma movimentações no mês por (categoria, tipo_caixinha).
-    """
-    try:
-        ini, fim = _range_mes(ano, mes)
+def _agregar_centavos(df: pd.DataFrame, chaves: list[str]) -> pd.DataFrame:
+    """Soma a coluna 'centavos' (int64) por chaves e devolve 'valor' em reais."""
+    df = df.groupby(chaves, as_index=False)["centavos"].sum()
+    df["valor"] = dinheiro.em_reais(df.pop("centavos").to_numpy())
+    return df
 
-        query = """
-            id_mov, dt_mov, valor_mov, status_mov,
-            fk_caixinha_id, fk_pessoa_id,
-            caixinha:fk_caixinha_id (tipo_caixinha, fk_categoria_id,
-                categoria:fk_categoria_id (categoria)
-            )
-        """
 
-        q = (
-            supabase.table("movimentacao")
-            .select(query)
-            .gte("dt_mov", str(ini))
-            .lt("dt_mov", str(fim))
+def _q_mov_mes_agregado(client, ano: int, mes: int, id_pessoa: int | None, somente_confirmado: bool):
+    ini, fim = _range_mes(ano, mes)
+
+    query = """
+        id_mov, dt_mov, valor_mov, status_mov,
+        fk_caixinha_id, fk_pessoa_id,
+        caixinha:fk_caixinha_id (tipo_caixinha, fk_categoria_id,
+            categoria:fk_categoria_id (categoria)
         )
+    """
 
-        if somente_confirmado:
-            q = q.in_("status_mov", ["CONFIRMADO", "CONCILIADO"])
+    q = (
+        client.table("movimentacao")
+        .select(query)
+        .gte("dt_mov", str(ini))
+        .lt("dt_mov", str(fim))
+    )
 
-        if id_pessoa:
-            q = q.eq("fk_pessoa_id", id_pessoa)
+    if somente_confirmado:
+        q = q.in_("status_mov", ["CONFIRMADO", "CONCILIADO"])
 
-        resp = q.execute()
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
+    if id_pessoa:
+        q = q.eq("fk_pessoa_id", id_pessoa)
+    return q
 
-        rows = []
-        for r in data:
-            cx = r.get("caixinha") or {}
-            tipo = cx.get("tipo_caixinha") or ""
-            cat_obj = cx.get("categoria") or {}
-            categoria = cat_obj.get("categoria") or ""
 
-            rows.append({
-                "categoria": categoria,
-                "tipo": tipo,
-                "valor": float(r.get("valor_mov") or 0),
-            })
+def _fmt_mov_mes_agregado(data) -> pd.DataFrame:
+    if not data:
+        return pd.DataFrame()
 
-        df = pd.DataFrame(rows)
-        df = df.groupby(["categoria", "tipo"], as_index=False)["valor"].sum()
-        return df
+    rows = []
+    for r in data:
+        cx = r.get("caixinha") or {}
+        tipo = cx.get("tipo_caixinha") or ""
+        cat_obj = cx.get("categoria") or {}
+        categoria = cat_obj.get("categoria") or ""
+
+        rows.append({
+            "categoria": categoria,
+            "tipo": tipo,
+            "centavos": dinheiro.centavos(r.get("valor_mov")),
+        })
+
+    return _agregar_centavos(pd.DataFrame(rows), ["categoria", "tipo"])
 
+
+def carregar_mov_mes_agregado(
+    ano: int,
+    mes: int,
+    id_pessoa: int | None = None,
+    somente_confirmado: bool = True,
+    usar_espelho: bool = False,
+) -> pd.DataFrame:
+    """
+    Soma movimentações no mês por (categoria, tipo_caixinha).
+    usar_espelho=True lê do espelho local (espelho_local.py) em vez do Supabase.
+    """
+    try:
+        if usar_espelho:
+            import espelho_local
+            ini, fim = _range_mes(ano, mes)
+            return _fmt_mov_mes_agregado(espelho_local.movimentacoes_periodo(ini, fim, id_pessoa, somente_confirmado))
+        q = _q_mov_mes_agregado(get_client(), ano, mes, id_pessoa, somente_confirmado)
+        return _fmt_mov_mes_agregado(q.execute().data)
     except Exception as e:
         print(f"Erro carregar_mov_mes_agregado: {e}")
         return pd.DataFrame()
 
 
+# --- CACHE DE PROJEÇÕES DE PLANEJADO ---
+# (gerador, id_plan, ano, mes) -> (assinatura do plano, linhas projetadas)
+# A assinatura (campos que entram na projeção) faz parte da validação: plano alterado,
+# pelo app ou fora dele, nunca devolve projeção velha, sem precisar invalidar nada.
+# Tendência e simulação projetam os mesmos planos para dezenas de meses a cada rerun;
+# LRU limitado: ao encher, sai a projeção usada há mais tempo.
+_CACHE_PROJECAO: OrderedDict[tuple, tuple] = OrderedDict()
+_CACHE_PROJECAO_MAX = 20000
+_cache_projecao_lock = threading.Lock()
+
+
+def _assinatura_plano(p: dict) -> tuple:
+    return (
+        p.get("recorrencia_plan"), p.get("dia_plan"), p.get("valor_plan"),
+        str(p.get("dt_inicio_plan")), p.get("repeticoes_plan"), p.get("plan_ativo"),
+        repr(p.get("caixinha")),
+    )
+
+
+def _projetar_com_cache(gerador, rows_plan: list[dict], ano: int, mes: int) -> list[dict]:
+    """Roda gerador(rows_plan, ano, mes) reaproveitando a projeção de cada plano já calculada."""
+    out = []
+    for p in (rows_plan or []):
+        id_plan = p.get("id_plan")
+        if id_plan is None:
+            out.extend(gerador([p], ano, mes))
+            continue
+
+        chave = (gerador.__name__, int(id_plan), ano, mes)
+        assinatura = _assinatura_plano(p)
+        with _cache_projecao_lock:
+            hit = _CACHE_PROJECAO.get(chave)
+            if hit:
+                _CACHE_PROJECAO.move_to_end(chave)
+        if hit and hit[0] == assinatura:
+            out.extend(hit[1])
+            continue
+
+        linhas = gerador([p], ano, mes)
+        with _cache_projecao_lock:
+            _CACHE_PROJECAO[chave] = (assinatura, linhas)
+            _CACHE_PROJECAO.move_to_end(chave)
+            while len(_CACHE_PROJECAO) > _CACHE_PROJECAO_MAX:
+                _CACHE_PROJECAO.popitem(last=False)
+        out.extend(linhas)
+    return out
+
+
 def _gera_valores_planejados_para_mes(rows_plan: list[dict], ano: int, mes: int) -> list[dict]:
     """
     Projeta valor do planejado para o mês:
@@ -1051,7 +1649,7 @@ def _gera_valores_planejados_para_mes(rows_plan: list[dict], ano: int, mes: int)
           - MENSAL => 1 ocorrência por mês
           - SEMANAL => nº de semanas no mês em que a data cai
           - UNICO => 1 se data estiver no mês
-    Retorna lista [{categoria, tipo, valor}]
+    Retorna lista [{categoria, tipo, centavos}]
     """
     ini, fim = _range_mes(ano, mes)
     fim_m = fim - dt.timedelta(days=1)
@@ -1085,7 +1683,7 @@ def _gera_valores_planejados_para_mes(rows_plan: list[dict], ano: int, mes: int)
 
         recorr = p.get("recorrencia_plan")
         dia = int(p.get("dia_plan") or 1)
-        valor = float(p.get("valor_plan") or 0.0)
+        valor = dinheiro.centavos(p.get("valor_plan"))
         repet = int(p.get("repeticoes_plan") if p.get("repeticoes_plan") is not None else -1)
 
         cx = p.get("caixinha") or {}
@@ -1127,39 +1725,47 @@ def _gera_valores_planejados_para_mes(rows_plan: list[dict], ano: int, mes: int)
                 occ = min(occ, repet)
 
         if occ > 0 and valor:
-            out.append({"categoria": categoria, "tipo": tipo, "valor": valor * occ})
+            out.append({"categoria": categoria, "tipo": tipo, "centavos": valor * occ})
 
     return out
 
 
-def carregar_planejado_mes_agregado(ano: int, mes: int, id_pessoa: int | None = None) -> pd.DataFrame:
+def _q_planejado_agregado(client, id_pessoa: int | None):
+    query = """
+        id_plan, recorrencia_plan, dia_plan, valor_plan, dt_inicio_plan, repeticoes_plan, plan_ativo,
+        fk_caixinha_id, fk_pessoa_id,
+        caixinha:fk_caixinha_id (tipo_caixinha, fk_categoria_id,
+            categoria:fk_categoria_id (categoria)
+        )
+    """
+    q = client.table("planejado").select(query).eq("plan_ativo", True)
+    if id_pessoa:
+        q = q.eq("fk_pessoa_id", id_pessoa)
+    return q
+
+
+def _fmt_planejado_mes_agregado(data, ano: int, mes: int) -> pd.DataFrame:
+    if not data:
+        return pd.DataFrame()
+
+    rows = _projetar_com_cache(_gera_valores_planejados_para_mes, data, ano, mes)
+    if not rows:
+        return pd.DataFrame()
+
+    return _agregar_centavos(pd.DataFrame(rows), ["categoria", "tipo"])
+
+
+def carregar_planejado_mes_agregado(ano: int, mes: int, id_pessoa: int | None = None, usar_espelho: bool = False) -> pd.DataFrame:
     """
     Projeta planejados no mês e agrega por (categoria, tipo_caixinha).
     """
     try:
-        query = """
-            id_plan, recorrencia_plan, dia_plan, valor_plan, dt_inicio_plan, repeticoes_plan, plan_ativo,
-            fk_caixinha_id, fk_pessoa_id,
-            caixinha:fk_caixinha_id (tipo_caixinha, fk_categoria_id,
-                categoria:fk_categoria_id (categoria)
-            )
-        """
-        q = supabase.table("planejado").select(query).eq("plan_ativo", True)
-        if id_pessoa:
-            q = q.eq("fk_pessoa_id", id_pessoa)
-
-        resp = q.execute()
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
-
-        rows = _gera_valores_planejados_para_mes(data, ano, mes)
-        if not rows:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(rows)
-        df = df.groupby(["categoria", "tipo"], as_index=False)["valor"].sum()
-        return df
+        if usar_espelho:
+            import espelho_local
+            data = espelho_local.planejados_ativos(id_pessoa)
+        else:
+            data = _q_planejado_agregado(get_client(), id_pessoa).execute().data
+        return _fmt_planejado_mes_agregado(data, ano, mes)
     except Exception as e:
         print(f"Erro carregar_planejado_mes_agregado: {e}")
         return pd.DataFrame()
@@ -1187,7 +1793,7 @@ def inserir_movimentacoes_em_lote(payloads: list[dict]):
 
     # 1) tenta direto
     try:
-        supabase.table("movimentacao").insert(cleaned).execute()
+        get_client().table("movimentacao").insert(cleaned).execute()
         return True, f"Importação concluída: {len(cleaned)} linha(s)."
     except Exception as e1:
         err1 = str(e1)
@@ -1203,7 +1809,7 @@ def inserir_movimentacoes_em_lote(payloads: list[dict]):
                 pp["origem_mov"] = _normalize_enum_case(pp["origem_mov"], "upper")
             up.append(pp)
 
-        supabase.table("movimentacao").insert(up).execute()
+        get_client().table("movimentacao").insert(up).execute()
         return True, f"Importação concluída: {len(up)} linha(s). (normalizado para MAIÚSCULO)"
     except Exception as e2:
         err2 = str(e2)
@@ -1219,7 +1825,7 @@ def inserir_movimentacoes_em_lote(payloads: list[dict]):
                 pp["origem_mov"] = _normalize_enum_case(pp["origem_mov"], "lower")
             low.append(pp)
 
-        supabase.table("movimentacao").insert(low).execute()
+        get_client().table("movimentacao").insert(low).execute()
         return True, f"Importação concluída: {len(low)} linha(s). (normalizado para minúsculo)"
     except Exception as e3:
         err3 = str(e3)
@@ -1229,7 +1835,7 @@ def inserir_movimentacoes_em_lote(payloads: list[dict]):
 def _gera_valores_planejados_para_mes_caixinha(rows_plan: list[dict], ano: int, mes: int) -> list[dict]:
     """
     Igual ao _gera_valores_planejados_para_mes(), porém retorna lista:
-      [{caixinha, tipo, valor}]
+      [{caixinha, tipo, centavos}]
     """
     ini, fim = _range_mes(ano, mes)
     fim_m = fim - dt.timedelta(days=1)
@@ -1307,105 +1913,467 @@ def _gera_valores_planejados_para_mes_caixinha(rows_plan: list[dict], ano: int,
             # regra simples: limita pela contagem total prevista
             occ = min(occ, max(repet, 0))
 
-        valor = float(p.get("valor_plan") or 0.0) * occ
+        valor = dinheiro.centavos(p.get("valor_plan")) * occ
         if valor == 0:
             continue
 
-        out.append({"caixinha": caixinha, "tipo": tipo, "valor": float(valor)})
+        out.append({"caixinha": caixinha, "tipo": tipo, "centavos": valor})
 
     return out
 
 
+def _q_mov_mes_agregado_caixinha(client, ano: int, mes: int, id_pessoa: int | None, somente_confirmado: bool):
+    ini, fim = _range_mes(ano, mes)
+
+    query = """
+        id_mov, dt_mov, valor_mov, status_mov,
+        fk_caixinha_id, fk_pessoa_id,
+        caixinha:fk_caixinha_id (caixinha, tipo_caixinha)
+    """
+
+    q = (
+        client.table("movimentacao")
+        .select(query)
+        .gte("dt_mov", ini.isoformat())
+        .lt("dt_mov", fim.isoformat())
+    )
+
+    if somente_confirmado:
+        q = q.eq("status_mov", "confirmado")
+
+    if id_pessoa:
+        q = q.eq("fk_pessoa_id", id_pessoa)
+    return q
+
+
+def _fmt_mov_mes_agregado_caixinha(data) -> pd.DataFrame:
+    if not data:
+        return pd.DataFrame()
+
+    rows = []
+    for r in data:
+        cx = r.get("caixinha") or {}
+        caixinha = cx.get("caixinha") or "SEM CAIXINHA"
+        tipo = (cx.get("tipo_caixinha") or "").upper()
+
+        rows.append({
+            "caixinha": caixinha,
+            "tipo": tipo,
+            "centavos": dinheiro.centavos(r.get("valor_mov")),
+        })
+
+    return _agregar_centavos(pd.DataFrame(rows), ["caixinha", "tipo"])
+
+
 def carregar_mov_mes_agregado_caixinha(
     ano: int,
     mes: int,
     id_pessoa: int | None = None,
-    somente_confirmado: bool = True
+    somente_confirmado: bool = True,
+    usar_espelho: bool = False,
 ) -> pd.DataFrame:
     """
     Soma movimentações no mês por (caixinha, tipo_caixinha).
     Retorna DF: [caixinha, tipo, valor]
     """
     try:
-        ini, fim = _range_mes(ano, mes)
-
-        query = """
-            id_mov, dt_mov, valor_mov, status_mov,
-            fk_caixinha_id, fk_pessoa_id,
-            caixinha:fk_caixinha_id (caixinha, tipo_caixinha)
-        """
-
-        q = (
-            supabase.table("movimentacao")
-            .select(query)
-            .gte("dt_mov", ini.isoformat())
-            .lt("dt_mov", fim.isoformat())
-        )
-
-        if somente_confirmado:
-            q = q.eq("status_mov", "confirmado")
-
-        if id_pessoa:
-            q = q.eq("fk_pessoa_id", id_pessoa)
+        if usar_espelho:
+            import espelho_local
+            ini, fim = _range_mes(ano, mes)
+            return _fmt_mov_mes_agregado_caixinha(
+                espelho_local.movimentacoes_periodo(ini, fim, id_pessoa, somente_confirmado)
+            )
+        q = _q_mov_mes_agregado_caixinha(get_client(), ano, mes, id_pessoa, somente_confirmado)
+        return _fmt_mov_mes_agregado_caixinha(q.execute().data)
+    except Exception as e:
+        print(f"Erro carregar_mov_mes_agregado_caixinha: {e}")
+        return pd.DataFrame()
 
-        resp = q.execute()
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
 
-        rows = []
-        for r in data:
-            cx = r.get("caixinha") or {}
-            caixinha = cx.get("caixinha") or "SEM CAIXINHA"
-            tipo = (cx.get("tipo_caixinha") or "").upper()
+def _q_planejado_agregado_caixinha(client, id_pessoa: int | None):
+    query = """
+        id_plan, recorrencia_plan, dia_plan, valor_plan, dt_inicio_plan, repeticoes_plan, plan_ativo,
+        fk_caixinha_id, fk_pessoa_id,
+        caixinha:fk_caixinha_id (caixinha, tipo_caixinha)
+    """
+    q = client.table("planejado").select(query).eq("plan_ativo", True)
+    if id_pessoa:
+        q = q.eq("fk_pessoa_id", id_pessoa)
+    return q
 
-            rows.append({
-                "caixinha": caixinha,
-                "tipo": tipo,
-                "valor": float(r.get("valor_mov") or 0),
-            })
 
-        df = pd.DataFrame(rows)
-        df = df.groupby(["caixinha", "tipo"], as_index=False)["valor"].sum()
-        return df
+def _fmt_planejado_mes_agregado_caixinha(data, ano: int, mes: int) -> pd.DataFrame:
+    if not data:
+        return pd.DataFrame()
 
-    except Exception as e:
-        print(f"Erro carregar_mov_mes_agregado_caixinha: {e}")
+    rows = _projetar_com_cache(_gera_valores_planejados_para_mes_caixinha, data, ano, mes)
+    if not rows:
         return pd.DataFrame()
 
+    return _agregar_centavos(pd.DataFrame(rows), ["caixinha", "tipo"])
+
 
 def carregar_planejado_mes_agregado_caixinha(
     ano: int,
     mes: int,
-    id_pessoa: int | None = None
+    id_pessoa: int | None = None,
+    usar_espelho: bool = False,
 ) -> pd.DataFrame:
     """
     Projeta planejados no mês e agrega por (caixinha, tipo_caixinha).
     Retorna DF: [caixinha, tipo, valor]
     """
     try:
-        query = """
-            id_plan, recorrencia_plan, dia_plan, valor_plan, dt_inicio_plan, repeticoes_plan, plan_ativo,
-            fk_caixinha_id, fk_pessoa_id,
-            caixinha:fk_caixinha_id (caixinha, tipo_caixinha)
-        """
-        q = supabase.table("planejado").select(query).eq("plan_ativo", True)
-        if id_pessoa:
-            q = q.eq("fk_pessoa_id", id_pessoa)
-
-        resp = q.execute()
-        data = resp.data or []
-        if not data:
-            return pd.DataFrame()
-
-        rows = _gera_valores_planejados_para_mes_caixinha(data, ano, mes)
-        if not rows:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(rows)
-        df = df.groupby(["caixinha", "tipo"], as_index=False)["valor"].sum()
-        return df
-
+        if usar_espelho:
+            import espelho_local
+            data = espelho_local.planejados_ativos(id_pessoa)
+        else:
+            data = _q_planejado_agregado_caixinha(get_client(), id_pessoa).execute().data
+        return _fmt_planejado_mes_agregado_caixinha(data, ano, mes)
     except Exception as e:
         print(f"Erro carregar_planejado_mes_agregado_caixinha: {e}")
         return pd.DataFrame()
+
+
+# ==========================
+# TENDÊNCIA (VÁRIOS MESES) + PANORAMA DO ANO
+# ==========================
+_PAGINA = 1000
+
+
+def _paginado(montar_query) -> list[dict]:
+    """Busca todas as páginas de uma query ordenada (PostgREST devolve no máximo ~1000 por vez)."""
+    linhas = []
+    inicio = 0
+    while True:
+        lote = montar_query().range(inicio, inicio + _PAGINA - 1).execute().data or []
+        linhas.extend(lote)
+        if len(lote) < _PAGINA:
+            return linhas
+        inicio += _PAGINA
+
+
+def _meses_periodo(ini: dt.date, n_meses: int) -> list[tuple[int, int]]:
+    ano, mes = ini.year, ini.month
+    meses = []
+    for _ in range(n_meses):
+        meses.append((ano, mes))
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+
+def _q_mov_periodo_agregado(client, ini: dt.date, fim: dt.date, id_pessoa: int | None, somente_confirmado: bool):
+    """
+    RPC mov_periodo_agregado (SQL/DDL.SQL seção Q): total em centavos por mês x caixinha de
+    ini (inclusive) a fim (exclusive), já com tipo e categoria, numa ida só.
+    """
+    return client.rpc("mov_periodo_agregado", {
+        "p_ini": str(ini),
+        "p_fim": str(fim),
+        "p_id_pessoa": id_pessoa,
+        "p_somente_confirmado": bool(somente_confirmado),
+    })
+
+
+def _q_planejado_periodo(client, id_pessoa: int | None):
+    query = """
+        id_plan, recorrencia_plan, dia_plan, valor_plan, dt_inicio_plan, repeticoes_plan, plan_ativo,
+        fk_caixinha_id, fk_pessoa_id,
+        caixinha:fk_caixinha_id (caixinha, tipo_caixinha, fk_categoria_id,
+            categoria:fk_categoria_id (categoria)
+        )
+    """
+    q = client.table("planejado").select(query).eq("plan_ativo", True)
+    if id_pessoa:
+        q = q.eq("fk_pessoa_id", id_pessoa)
+    return q.order("id_plan")
+
+
+# nível -> (gerador da projeção, chave do real a partir do embed caixinha, tipo do real)
+_NIVEIS_TENDENCIA = {
+    "categoria": (
+        _gera_valores_planejados_para_mes,
+        lambda r: r.get("categoria") or "",
+        lambda r: r.get("tipo_caixinha") or "",
+    ),
+    "caixinha": (
+        _gera_valores_planejados_para_mes_caixinha,
+        lambda r: r.get("caixinha") or "SEM CAIXINHA",
+        lambda r: (r.get("tipo_caixinha") or "").upper(),
+    ),
+}
+
+
+def _fmt_real_x_planejado_periodo(real_data, plan_data, meses: list[tuple[int, int]], nivel: str) -> pd.DataFrame:
+    """
+    Junta o real (totais por mês x caixinha do RPC mov_periodo_agregado) com a projeção de cada mês.
+    Retorna DF: [mes, <nivel>, tipo, planejado, real, gap] (mes = 1º dia do mês)
+    """
+    gerador, chave_real, tipo_real = _NIVEIS_TENDENCIA[nivel]
+    colunas = ["mes", nivel, "tipo", "planejado", "real", "gap"]
+
+    # real: já somado no banco por mês x caixinha; aqui só reagrupa no nível pedido
+    real_data = real_data or []
+    real = pd.DataFrame({
+        "mes": pd.to_datetime([r["mes"] for r in real_data]),
+        nivel: [chave_real(r) for r in real_data],
+        "tipo": [tipo_real(r) for r in real_data],
+        "real": np.array([int(r.get("centavos") or 0) for r in real_data], dtype="int64"),
+    })
+
+    # planejado: projeção por mês (cada plano x mês vem do cache quando não mudou)
+    plan_rows = []
+    for ano, mes in meses:
+        for linha in _projetar_com_cache(gerador, plan_data, ano, mes):
+            plan_rows.append({"mes": pd.Timestamp(ano, mes, 1), nivel: linha[nivel], "tipo": linha["tipo"],
+                              "planejado": linha["centavos"]})
+    plan = pd.DataFrame(plan_rows, columns=["mes", nivel, "tipo", "planejado"])
+    if real.empty and plan.empty:
+        return pd.DataFrame(columns=colunas)
+
+    chaves = ["mes", nivel, "tipo"]
+    base = pd.merge(
+        plan.groupby(chaves, as_index=False)["planejado"].sum(),
+        real.groupby(chaves, as_index=False)["real"].sum(),
+        on=chaves,
+        how="outer",
+    )
+    if base.empty:
+        return pd.DataFrame(columns=colunas)
+
+    # com um dos lados vazio a coluna dele vem object: to_numeric antes do fillna
+    c_plan = pd.to_numeric(base["planejado"], errors="coerce").fillna(0).astype("int64").to_numpy()
+    c_real = pd.to_numeric(base["real"], errors="coerce").fillna(0).astype("int64").to_numpy()
+    base["planejado"] = dinheiro.em_reais(c_plan)
+    base["real"] = dinheiro.em_reais(c_real)
+    base["gap"] = dinheiro.em_reais(c_plan - c_real)
+    base["mes"] = base["mes"].dt.date
+    return base[colunas].sort_values(["mes", "tipo", nivel]).reset_index(drop=True)
+
+
+def carregar_real_x_planejado_periodo(
+    ini: dt.date,
+    n_meses: int = 12,
+    id_pessoa: int | None = None,
+    somente_confirmado: bool = True,
+    nivel: str = "categoria",
+) -> pd.DataFrame:
+    """
+    Real x Planejado de n_meses a partir do mês de `ini`, por categoria ou caixinha.
+    Um RPC com o real já agregado no banco para o período inteiro + uma consulta de planejados.
+    Retorna DF: [mes, <nivel>, tipo, planejado, real, gap]
+    """
+    if nivel not in _NIVEIS_TENDENCIA:
+        return pd.DataFrame()
+    try:
+        meses = _meses_periodo(ini, n_meses)
+        dt_ini = dt.date(*meses[0], 1)
+        dt_fim = _range_mes(*meses[-1])[1]
+        client = get_client()
+        real = _q_mov_periodo_agregado(client, dt_ini, dt_fim, id_pessoa, somente_confirmado).execute().data
+        plan = _paginado(lambda: _q_planejado_periodo(client, id_pessoa))
+        return _fmt_real_x_planejado_periodo(real, plan, meses, nivel)
+    except Exception as e:
+        print(f"Erro carregar_real_x_planejado_periodo: {e}")
+        return pd.DataFrame()
+
+
+def panorama_ano(df_periodo: pd.DataFrame, ano: int, hoje: dt.date | None = None) -> pd.DataFrame:
+    """
+    Previsão de fechamento do ano a partir do DF de carregar_real_x_planejado_periodo
+    (que precisa cobrir jan-dez do ano). Por tipo (ENTRADA/SAIDA):
+      - meses passados: real
+      - mês atual: o maior entre real e planejado (o que já saiu ou o que ainda deve sair)
+      - meses seguintes: planejado
+    Retorna DF: [tipo, planejado_ano, real_ate_hoje, projetado_restante, previsao_fechamento]
+    """
+    colunas = ["tipo", "planejado_ano", "real_ate_hoje", "projetado_restante", "previsao_fechamento"]
+    if df_periodo is None or df_periodo.empty:
+        return pd.DataFrame(columns=colunas)
+
+    hoje = hoje or dt.date.today()
+    mes_atual = dt.date(hoje.year, hoje.month, 1)
+    df = df_periodo[pd.to_datetime(df_periodo["mes"]).dt.year == ano].copy()
+    if df.empty:
+        return pd.DataFrame(columns=colunas)
+
+    df["c_plan"] = dinheiro.centavos_array(df["planejado"])
+    df["c_real"] = dinheiro.centavos_array(df["real"])
+    passado = (df["mes"] < mes_atual).to_numpy()
+    atual = (df["mes"] == mes_atual).to_numpy()
+    futuro = (df["mes"] > mes_atual).to_numpy()
+
+    c_plan, c_real = df["c_plan"].to_numpy(), df["c_real"].to_numpy()
+    df["c_ate_hoje"] = np.where(passado | atual, c_real, 0)
+    df["c_restante"] = np.where(futuro, c_plan, 0) + np.where(atual, np.maximum(c_plan - c_real, 0), 0)
+
+    t = df.groupby("tipo", as_index=False)[["c_plan", "c_ate_hoje", "c_restante"]].sum()
+    return pd.DataFrame({
+        "tipo": t["tipo"],
+        "planejado_ano": dinheiro.em_reais(t["c_plan"].to_numpy()),
+        "real_ate_hoje": dinheiro.em_reais(t["c_ate_hoje"].to_numpy()),
+        "projetado_restante": dinheiro.em_reais(t["c_restante"].to_numpy()),
+        "previsao_fechamento": dinheiro.em_reais((t["c_ate_hoje"] + t["c_restante"]).to_numpy()),
+    })[colunas]
+
+
+# ==========================
+# PREVISÃO DE CAIXA (SALDO DIÁRIO)
+# ==========================
+def _q_planejado_previsao(client, id_pessoa: int | None):
+    query = """
+        id_plan, recorrencia_plan, dia_plan, valor_plan, dt_inicio_plan, repeticoes_plan, fk_pessoa_id,
+        caixinha:fk_caixinha_id (tipo_caixinha)
+    """
+    q = client.table("planejado").select(query).eq("plan_ativo", True)
+    if id_pessoa:
+        q = q.eq("fk_pessoa_id", id_pessoa)
+    return q.order("id_plan")
+
+
+def _q_mov_previsao(client, ini_mes: dt.date, fim: dt.date, id_pessoa: int | None):
+    """PENDENTE até fim (inclusive as vencidas) + lançadas de planejado desde o início do mês."""
+    query = """
+        id_mov, dt_mov, valor_mov, status_mov, fk_pessoa_id, fk_planejado_id,
+        caixinha:fk_caixinha_id (tipo_caixinha)
+    """
+    q = (
+        client.table("movimentacao")
+        .select(query)
+        .lte("dt_mov", str(fim))
+        .or_(f"status_mov.eq.PENDENTE,and(fk_planejado_id.not.is.null,dt_mov.gte.{ini_mes.isoformat()})")
+    )
+    if id_pessoa:
+        q = q.eq("fk_pessoa_id", id_pessoa)
+    return q.order("id_mov")
+
+
+def _q_saldo_por_pessoa(client, ate: dt.date):
+    """RPC saldo_por_pessoa (SQL/DDL.SQL seção N)."""
+    return client.rpc("saldo_por_pessoa", {"p_ate": ate.isoformat()})
+
+
+def _fmt_previsao_caixa(plan_data, mov_data, saldo_data, ini: dt.date, fim: dt.date, id_pessoa: int | None) -> pd.DataFrame:
+    import previsao_caixa as pc
+
+    planos = _achatar(plan_data, {"caixinha": ("tipo_caixinha", "tipo_caixinha")})
+    movs = _achatar(mov_data, {"caixinha": ("tipo_caixinha", "tipo_caixinha")})
+
+    # ocorrências desde o 1º dia do mês: as que já viraram movimentação saem na ordem certa
+    ocorr = pc.expandir_planejados(planos, ini.replace(day=1), fim)
+    if not movs.empty:
+        ocorr = pc.descontar_lancados(ocorr, movs[movs["fk_planejado_id"].notna()])
+    ocorr = ocorr[pd.to_datetime(ocorr["data"]) >= pd.Timestamp(ini)]
+
+    pend = movs[movs["status_mov"].astype(str).str.upper() == "PENDENTE"] if not movs.empty else movs
+    partes = [ocorr[["data", "fk_pessoa_id", "centavos"]], pc.eventos_pendentes(pend, ini)]
+    partes = [p for p in partes if not p.empty]  # concat com DF vazio vira object (lento)
+    eventos = pd.concat(partes, ignore_index=True) if partes else pc.eventos_pendentes(None, ini)
+
+    saldo_inicial = {
+        int(r["fk_pessoa_id"]): dinheiro.centavos(r["saldo"])
+        for r in (saldo_data or [])
+        if r.get("fk_pessoa_id") is not None and (not id_pessoa or int(r["fk_pessoa_id"]) == int(id_pessoa))
+    }
+    return pc.saldo_diario(eventos, ini, fim, saldo_inicial)
+
+
+def carregar_previsao_caixa(dias: int = 90, id_pessoa: int | None = None, hoje: dt.date | None = None) -> pd.DataFrame:
+    """
+    Saldo previsto dia a dia, por pessoa, de hoje até hoje + dias.
+    Parte do saldo confirmado até hoje e soma as movimentações PENDENTE (vencidas entram hoje)
+    e as ocorrências futuras dos planejados ativos (ver previsao_caixa.py).
+    Retorna DF: [data, fk_pessoa_id, movimento, saldo]
+    """
+    hoje = hoje or dt.date.today()
+    fim = hoje + dt.timedelta(days=dias)
+    try:
+        client = get_client()
+        plan = _paginado(lambda: _q_planejado_previsao(client, id_pessoa))
+        movs = _paginado(lambda: _q_mov_previsao(client, hoje.replace(day=1), fim, id_pessoa))
+        saldos = _q_saldo_por_pessoa(client, hoje).execute().data
+        return _fmt_previsao_caixa(plan, movs, saldos, hoje, fim, id_pessoa)
+    except Exception as e:
+        print(f"Erro carregar_previsao_caixa: {e}")
+        return pd.DataFrame()
+
+
+# ==========================
+# SIMULAÇÃO MONTE CARLO DO SALDO
+# ==========================
+def carregar_simulacao_saldo(
+    meses: int = 24,
+    n_caminhos: int = 10_000,
+    id_pessoa: int | None = None,
+    meses_historico: int = 12,
+    processos: int = 1,
+    semente: int | None = None,
+    hoje: dt.date | None = None,
+) -> dict:
+    """
+    Simula o saldo de fim de mês nos próximos `meses`, a partir do mês que vem (ver simulacao_mc.py).
+    Distribuições por caixinha vêm dos últimos `meses_historico` meses fechados (confirmadas);
+    cada caixinha é simulada em torno da média histórica (o planejado só entra quando não há
+    histórico). O estouro compara as despesas simuladas das caixinhas com planejado no mês
+    com o total planejado delas.
+    Retorna {"faixas": DF, "estouro": DF, "caixinhas": DF} ou {} em erro.
+    """
+    import simulacao_mc as mc
+
+    hoje = hoje or dt.date.today()
+    mes_atual = hoje.replace(day=1)
+    ini_hist = (pd.Timestamp(mes_atual) - pd.DateOffset(months=meses_historico)).date()
+    # começa no mês seguinte: o saldo de partida já inclui o que foi confirmado neste mês
+    futuros = _meses_periodo(mes_atual, meses + 1)[1:]
+    try:
+        client = get_client()
+        real = _q_mov_periodo_agregado(client, ini_hist, mes_atual, id_pessoa, True).execute().data
+        plan = _paginado(lambda: _q_planejado_periodo(client, id_pessoa))
+        saldos = _q_saldo_por_pessoa(client, hoje).execute().data or []
+    except Exception as e:
+        print(f"Erro carregar_simulacao_saldo: {e}")
+        return {}
+
+    # histórico: total por (mês, caixinha)
+    hist = _fmt_real_x_planejado_periodo(real, [], _meses_periodo(ini_hist, meses_historico), "caixinha")
+    dist = mc.ajustar_distribuicoes(hist.rename(columns={"real": "valor"}), meses_historico)
+
+    # planejado por (mês futuro, caixinha)
+    proj = _fmt_real_x_planejado_periodo([], plan, futuros, "caixinha")
+    tipos = pd.concat([hist[["caixinha", "tipo"]], proj[["caixinha", "tipo"]]]).drop_duplicates("caixinha")
+    if tipos.empty:
+        return {}
+
+    caixinhas = tipos["caixinha"].tolist()
+    datas = [dt.date(a, m, 1) for a, m in futuros]
+    plan_m = (
+        proj.pivot_table(index="mes", columns="caixinha", values="planejado", aggfunc="sum", fill_value=0.0)
+        .reindex(index=datas, columns=caixinhas, fill_value=0.0)
+        .to_numpy()
+    )
+    dist = dist.set_index("caixinha").reindex(caixinhas).fillna(0.0)
+    media = dist["media"].to_numpy()
+    base = np.where(media[None, :] > 0, media[None, :], plan_m)
+    sinais = np.where(tipos["tipo"].str.upper().to_numpy() == "ENTRADA", 1.0, -1.0)
+    despesa_planejada = (sinais < 0)[None, :] & (plan_m > 0)
+
+    saldo_inicial = dinheiro.em_reais(sum(
+        dinheiro.centavos(r["saldo"]) for r in saldos
+        if not id_pessoa or (r.get("fk_pessoa_id") is not None and int(r["fk_pessoa_id"]) == int(id_pessoa))
+    ))
+    sim_saldos, sim_despesas = mc.simular(
+        base, sinais, dist["cv"].to_numpy(), saldo_inicial, n_caminhos, semente, processos,
+        mascara_despesa=despesa_planejada,
+    )
+    # limiar = planejado; as despesas simuladas acima cobrem só essas mesmas caixinhas
+    despesas_planejadas = (plan_m * despesa_planejada).sum(axis=1)
+
+    out = mc.resumir(sim_saldos, sim_despesas, despesas_planejadas, datas)
+    out["caixinhas"] = pd.DataFrame({
+        "caixinha": caixinhas,
+        "tipo": tipos["tipo"].to_numpy(),
+        "media_historica": media.round(2),
+        "cv": dist["cv"].to_numpy().round(3),
+        "planejado_medio": plan_m.mean(axis=0).round(2),
+    })
+    return out
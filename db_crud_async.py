@@ -0,0 +1,332 @@
+# db_crud_async.py - Leituras do db_crud em versão async (cliente async do Supabase)
+#
+# Mesmas funções de leitura do db_crud, com os mesmos argumentos e formatos de retorno,
+# mas como corrotinas. Servem para páginas que precisam de vários datasets independentes:
+#
+#   df_real, df_plan = rodar_em_paralelo(
+#       carregar_mov_mes_agregado(ano, mes),
+#       carregar_planejado_mes_agregado(ano, mes),
+#   )
+#
+# As queries rodam juntas (asyncio.gather) e a página espera só a mais lenta.
+# O event loop fica numa thread de fundo única do processo, junto com o cliente async
+# (e o pool de conexões dele), que assim é reaproveitado entre reruns e sessões.
+
+import asyncio
+import threading
+import datetime as dt
+
+import pandas as pd
+
+from db_crud import (
+    credenciais_supabase,
+    _q_caixinhas, _fmt_caixinhas,
+    _q_pessoas, _fmt_pessoas,
+    _q_movimentacoes, _fmt_movimentacoes,
+    _q_extrato_pagina, _fmt_extrato_pagina,
+    _q_busca_movimentacoes, _fmt_busca_movimentacoes,
+    _q_planejados, _fmt_planejados,
+    _q_eventos_calendario, _fmt_eventos_calendario, _fmt_eventos_por_mes,
+    _q_metas, _fmt_metas_semestre,
+    _q_arvore_metas, _fmt_arvore_metas,
+    _q_prioridades, _fmt_prioridades,
+    _q_areas_vida,
+    _q_checkin_mes, _q_historico_checkins, _fmt_checkins,
+    _q_desapego, _fmt_desapego,
+    _q_mov_mes_agregado, _fmt_mov_mes_agregado,
+    _q_planejado_agregado, _fmt_planejado_mes_agregado,
+    _q_mov_mes_agregado_caixinha, _fmt_mov_mes_agregado_caixinha,
+    _q_planejado_agregado_caixinha, _fmt_planejado_mes_agregado_caixinha,
+    _PAGINA, _meses_periodo, _range_mes, _NIVEIS_TENDENCIA,
+    _q_mov_periodo_agregado, _q_planejado_periodo, _fmt_real_x_planejado_periodo,
+)
+
+# --- LOOP DE FUNDO + CLIENTE ASYNC ---
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+_async_client = None
+_async_client_lock: asyncio.Lock | None = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="db-crud-async", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+async def get_async_client():
+    """Cliente async do processo (só existe dentro do loop de fundo)."""
+    global _async_client, _async_client_lock
+    if _async_client is None:
+        if _async_client_lock is None:
+            _async_client_lock = asyncio.Lock()
+        async with _async_client_lock:
+            if _async_client is None:
+                url, key = credenciais_supabase()
+                from supabase import acreate_client
+                from db_transporte import criar_async_http_client
+                try:
+                    from supabase import AsyncClientOptions
+                    options = AsyncClientOptions(httpx_client=criar_async_http_client())
+                except (ImportError, TypeError):
+                    # supabase-py sem AsyncClientOptions/httpx_client: pool HTTP padrão
+                    options = None
+                if options:
+                    _async_client = await acreate_client(url, key, options=options)
+                else:
+                    _async_client = await acreate_client(url, key)
+    return _async_client
+
+
+def rodar_em_paralelo(*corrotinas, timeout: float | None = None) -> list:
+    """
+    Executa as corrotinas ao mesmo tempo e devolve os resultados na mesma ordem.
+    Pode ser chamada de qualquer thread (inclusive do script do Streamlit).
+    Estourando o timeout, as corrotinas são canceladas no loop de fundo antes do TimeoutError.
+    """
+    async def _todas():
+        return await asyncio.gather(*corrotinas)
+
+    futuro = asyncio.run_coroutine_threadsafe(_todas(), _get_loop())
+    try:
+        return futuro.result(timeout)
+    except TimeoutError:
+        futuro.cancel()
+        raise
+
+
+async def _dados(q_builder, *args) -> list:
+    client = await get_async_client()
+    resp = await q_builder(client, *args).execute()
+    return resp.data
+
+
+async def _dados_paginados(q_builder, *args) -> list:
+    """Como _dados, mas busca todas as páginas (query precisa ser ordenada)."""
+    client = await get_async_client()
+    linhas = []
+    inicio = 0
+    while True:
+        resp = await q_builder(client, *args).range(inicio, inicio + _PAGINA - 1).execute()
+        lote = resp.data or []
+        linhas.extend(lote)
+        if len(lote) < _PAGINA:
+            return linhas
+        inicio += _PAGINA
+
+
+# --- LOOKUPS ---
+async def buscar_caixinhas():
+    """Retorna { 'NomeCaixinha': id_caixinha }"""
+    try:
+        return _fmt_caixinhas(await _dados(_q_caixinhas))
+    except Exception as e:
+        print(f"Erro buscar caixinhas (async): {e}")
+        return {}
+
+
+async def buscar_pessoas():
+    """Retorna { 'NomePessoa': id_pessoa }"""
+    try:
+        return _fmt_pessoas(await _dados(_q_pessoas))
+    except Exception as e:
+        print(f"Erro buscar pessoas (async): {e}")
+        return {}
+
+
+# --- MOVIMENTACAO / PLANEJADO ---
+async def carregar_movimentacoes():
+    try:
+        return _fmt_movimentacoes(await _dados(_q_movimentacoes))
+    except Exception as e:
+        print(f"Erro carregar movimentacoes (async): {e}")
+        return pd.DataFrame()
+
+
+async def carregar_extrato_pagina(
+    cursor: tuple[str, int] | None = None,
+    por_pagina: int = 100,
+    ini: dt.date | None = None,
+    fim: dt.date | None = None,
+    id_pessoa: int | None = None,
+    ids_caixinha=None,
+    status=None,
+    origem=None,
+):
+    try:
+        client = await get_async_client()
+        resp = await _q_extrato_pagina(
+            client, cursor, por_pagina, ini, fim, id_pessoa, ids_caixinha, status, origem
+        ).execute()
+        return _fmt_extrato_pagina(resp, por_pagina)
+    except Exception as e:
+        print(f"Erro carregar extrato pagina (async): {e}")
+        return pd.DataFrame(), None, None
+
+
+async def buscar_movimentacoes(
+    termo: str,
+    ini: dt.date | None = None,
+    fim: dt.date | None = None,
+    ids_caixinha=None,
+    id_pessoa: int | None = None,
+    limite: int = 100,
+) -> pd.DataFrame:
+    if not (termo or "").strip():
+        return pd.DataFrame()
+    try:
+        return _fmt_busca_movimentacoes(
+            await _dados(_q_busca_movimentacoes, termo.strip(), ini, fim, ids_caixinha, id_pessoa, limite)
+        )
+    except Exception as e:
+        print(f"Erro buscar movimentacoes (async): {e}")
+        return pd.DataFrame()
+
+
+async def buscar_planejados():
+    try:
+        return _fmt_planejados(await _dados(_q_planejados))
+    except Exception as e:
+        print(f"Erro buscar planejados (async): {e}")
+        return pd.DataFrame()
+
+
+# --- CALENDÁRIO / METAS / PRIORIDADES ---
+async def carregar_eventos_calendario(ano: int) -> pd.DataFrame:
+    try:
+        return _fmt_eventos_calendario(await _dados(_q_eventos_calendario, ano))
+    except Exception as e:
+        print(f"Erro carregar_eventos_calendario (async): {e}")
+        return pd.DataFrame()
+
+
+async def carregar_eventos_calendario_por_mes(ano: int) -> dict[int, pd.DataFrame]:
+    try:
+        return _fmt_eventos_por_mes(await _dados(_q_eventos_calendario, ano))
+    except Exception as e:
+        print(f"Erro carregar_eventos_calendario_por_mes (async): {e}")
+        return {}
+
+
+async def carregar_metas_semestre(ano: int, semestre: int) -> pd.DataFrame:
+    try:
+        return _fmt_metas_semestre(await _dados(_q_metas, ano, semestre))
+    except Exception as e:
+        print(f"Erro carregar_metas_semestre (async): {e}")
+        return pd.DataFrame()
+
+
+async def carregar_arvore_metas(ano: int, semestre: int) -> pd.DataFrame:
+    try:
+        return _fmt_arvore_metas(await _dados(_q_arvore_metas, ano, semestre))
+    except Exception as e:
+        print(f"Erro carregar_arvore_metas (async): {e}")
+        return pd.DataFrame()
+
+
+async def carregar_prioridades(ano: int, horizonte: str) -> pd.DataFrame:
+    try:
+        return _fmt_prioridades(await _dados(_q_prioridades, ano, horizonte))
+    except Exception as e:
+        print(f"Erro carregar_prioridades (async): {e}")
+        return pd.DataFrame()
+
+
+# --- CÍRCULO DA VIDA / DESAPEGO ---
+async def carregar_areas_vida() -> list[dict]:
+    try:
+        return await _dados(_q_areas_vida) or []
+    except Exception as e:
+        print(f"Erro carregar_areas_vida (async): {e}")
+        return []
+
+
+async def carregar_checkin_mes(mes_ref: dt.date) -> pd.DataFrame:
+    try:
+        return _fmt_checkins(await _dados(_q_checkin_mes, mes_ref))
+    except Exception as e:
+        print(f"Erro carregar_checkin_mes (async): {e}")
+        return pd.DataFrame()
+
+
+async def historico_checkins_ano(ano: int) -> pd.DataFrame:
+    try:
+        return _fmt_checkins(await _dados(_q_historico_checkins, ano))
+    except Exception as e:
+        print(f"Erro historico_checkins_ano (async): {e}")
+        return pd.DataFrame()
+
+
+async def carregar_desapego() -> pd.DataFrame:
+    try:
+        return _fmt_desapego(await _dados(_q_desapego))
+    except Exception as e:
+        print(f"Erro carregar_desapego (async): {e}")
+        return pd.DataFrame()
+
+
+# --- DASHBOARD ---
+async def carregar_mov_mes_agregado(ano: int, mes: int, id_pessoa: int | None = None, somente_confirmado: bool = True) -> pd.DataFrame:
+    try:
+        data = await _dados(_q_mov_mes_agregado, ano, mes, id_pessoa, somente_confirmado)
+        return _fmt_mov_mes_agregado(data)
+    except Exception as e:
+        print(f"Erro carregar_mov_mes_agregado (async): {e}")
+        return pd.DataFrame()
+
+
+async def carregar_planejado_mes_agregado(ano: int, mes: int, id_pessoa: int | None = None) -> pd.DataFrame:
+    try:
+        data = await _dados(_q_planejado_agregado, id_pessoa)
+        return _fmt_planejado_mes_agregado(data, ano, mes)
+    except Exception as e:
+        print(f"Erro carregar_planejado_mes_agregado (async): {e}")
+        return pd.DataFrame()
+
+
+async def carregar_mov_mes_agregado_caixinha(ano: int, mes: int, id_pessoa: int | None = None, somente_confirmado: bool = True) -> pd.DataFrame:
+    try:
+        data = await _dados(_q_mov_mes_agregado_caixinha, ano, mes, id_pessoa, somente_confirmado)
+        return _fmt_mov_mes_agregado_caixinha(data)
+    except Exception as e:
+        print(f"Erro carregar_mov_mes_agregado_caixinha (async): {e}")
+        return pd.DataFrame()
+
+
+async def carregar_planejado_mes_agregado_caixinha(ano: int, mes: int, id_pessoa: int | None = None) -> pd.DataFrame:
+    try:
+        data = await _dados(_q_planejado_agregado_caixinha, id_pessoa)
+        return _fmt_planejado_mes_agregado_caixinha(data, ano, mes)
+    except Exception as e:
+        print(f"Erro carregar_planejado_mes_agregado_caixinha (async): {e}")
+        return pd.DataFrame()
+
+
+async def carregar_real_x_planejado_periodo(
+    ini: dt.date,
+    n_meses: int = 12,
+    id_pessoa: int | None = None,
+    somente_confirmado: bool = True,
+    nivel: str = "categoria",
+) -> pd.DataFrame:
+    if nivel not in _NIVEIS_TENDENCIA:
+        return pd.DataFrame()
+    try:
+        meses = _meses_periodo(ini, n_meses)
+        dt_ini = dt.date(*meses[0], 1)
+        dt_fim = _range_mes(*meses[-1])[1]
+        # real e planejado em paralelo
+        real, plan = await asyncio.gather(
+            _dados(_q_mov_periodo_agregado, dt_ini, dt_fim, id_pessoa, somente_confirmado),
+            _dados_paginados(_q_planejado_periodo, id_pessoa),
+        )
+        return _fmt_real_x_planejado_periodo(real, plan, meses, nivel)
+    except Exception as e:
+        print(f"Erro carregar_real_x_planejado_periodo (async): {e}")
+        return pd.DataFrame()
@@ -0,0 +1,175 @@
+# db_transporte.py - Pool HTTP compartilhado (httpx) para o cliente Supabase
+#
+# O cliente do db_crud é um só por processo e todas as sessões do Streamlit (uma thread
+# cada) fazem requisições por ele. Aqui fica o pool de conexões desse cliente:
+# tamanho configurável, keep-alive (sem refazer TLS a cada query) e HTTP/2 quando o
+# pacote `h2` estiver instalado. httpx.Client é thread-safe, então basta um.
+#
+# Configuração (env):
+#   SUPABASE_MAX_CONEXOES        máximo de conexões abertas (padrão 20)
+#   SUPABASE_MAX_KEEPALIVE       conexões ociosas mantidas abertas (padrão 10)
+#   SUPABASE_KEEPALIVE_SEGUNDOS  tempo que uma conexão ociosa fica no pool (padrão 60)
+#   SUPABASE_TIMEOUT_SEGUNDOS    timeout das requisições (padrão 30)
+
+import os
+import threading
+
+import httpx
+
+
+def _env_int(nome: str, padrao: int) -> int:
+    try:
+        return int(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+def _env_float(nome: str, padrao: float) -> float:
+    try:
+        return float(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+MAX_CONEXOES = _env_int("SUPABASE_MAX_CONEXOES", 20)
+MAX_KEEPALIVE = _env_int("SUPABASE_MAX_KEEPALIVE", 10)
+KEEPALIVE_SEGUNDOS = _env_float("SUPABASE_KEEPALIVE_SEGUNDOS", 60.0)
+TIMEOUT_SEGUNDOS = _env_float("SUPABASE_TIMEOUT_SEGUNDOS", 30.0)
+
+
+def http2_disponivel() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _limites() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONEXOES,
+        max_keepalive_connections=min(MAX_KEEPALIVE, MAX_CONEXOES),
+        keepalive_expiry=KEEPALIVE_SEGUNDOS,
+    )
+
+
+class _MedidorPool:
+    """
+    Conta requisições em voo. Uma requisição ocupa a conexão até o corpo da resposta
+    ser lido/fechado, então a liberação acontece no close() do stream.
+    `saturadas` = requisições que chegaram com todas as conexões ocupadas (ficaram na fila).
+    """
+
+    def __init__(self, max_conexoes: int):
+        self.max_conexoes = max_conexoes
+        self._lock = threading.Lock()
+        self.em_voo = 0
+        self.pico = 0
+        self.total = 0
+        self.saturadas = 0
+
+    def entrar(self):
+        with self._lock:
+            if self.em_voo >= self.max_conexoes:
+                self.saturadas += 1
+            self.em_voo += 1
+            self.total += 1
+            self.pico = max(self.pico, self.em_voo)
+
+    def sair(self):
+        with self._lock:
+            self.em_voo = max(self.em_voo - 1, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_conexoes": self.max_conexoes,
+                "em_voo": self.em_voo,
+                "pico": self.pico,
+                "requisicoes": self.total,
+                "saturadas": self.saturadas,
+                "pct_saturadas": (self.saturadas / self.total * 100) if self.total else 0.0,
+            }
+
+
+class _StreamMedido(httpx.SyncByteStream):
+    def __init__(self, stream, ao_fechar):
+        self._stream = stream
+        self._ao_fechar = ao_fechar
+        self._fechado = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._fechado:
+                self._fechado = True
+                self._ao_fechar()
+
+
+class TransporteMedido(httpx.HTTPTransport):
+    """HTTPTransport do httpx com contagem de uso do pool."""
+
+    def __init__(self, medidor: _MedidorPool, **kwargs):
+        super().__init__(**kwargs)
+        self.medidor = medidor
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.medidor.entrar()
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            self.medidor.sair()
+            raise
+        response.stream = _StreamMedido(response.stream, self.medidor.sair)
+        return response
+
+    def conexoes_abertas(self) -> tuple[int, int]:
+        """(abertas, ociosas) segundo o pool do httpcore (melhor esforço)."""
+        try:
+            conns = list(self._pool.connections)
+            return len(conns), sum(1 for c in conns if c.is_idle())
+        except Exception:
+            return -1, -1
+
+
+# --- pool do processo ---
+_http_client: httpx.Client | None = None
+_transporte: TransporteMedido | None = None
+_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """httpx.Client compartilhado pelo processo (criado na primeira chamada)."""
+    global _http_client, _transporte
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _transporte = TransporteMedido(
+                    _MedidorPool(MAX_CONEXOES),
+                    limits=_limites(),
+                    http2=http2_disponivel(),
+                )
+                _http_client = httpx.Client(transport=_transporte, timeout=TIMEOUT_SEGUNDOS)
+    return _http_client
+
+
+def estatisticas_pool() -> dict:
+    """Uso do pool desde o início do processo (vazio se o pool ainda não foi criado)."""
+    if _transporte is None:
+        return {}
+    stats = _transporte.medidor.snapshot()
+    stats["abertas"], stats["ociosas"] = _transporte.conexoes_abertas()
+    stats["http2"] = http2_disponivel()
+    return stats
+
+
+def criar_async_http_client() -> httpx.AsyncClient:
+    """
+    Versão async (db_crud_async.py). Mesmos limites do pool sync, mas precisa ser criado
+    dentro do event loop que vai usá-lo, por isso não é singleton aqui.
+    """
+    return httpx.AsyncClient(limits=_limites(), http2=http2_disponivel(), timeout=TIMEOUT_SEGUNDOS)
@@ -0,0 +1,97 @@
+# dinheiro.py - Valores em centavos (int) com arredondamento exato
+#
+# Toda conta de dinheiro passa por aqui: o valor vira centavos inteiros (ROUND_HALF_UP,
+# como no banco), soma/agrega em int64 e só volta a reais na saída. Assim totais de
+# milhares de linhas não "andam" centavos por erro de float.
+#
+#   centavos("10.005")            -> 1001
+#   centavos_array([0.1, 0.2])    -> array([10, 20])
+#   somar([0.1, 0.2, 0.3])        -> 0.6 (exato, não 0.6000000000000001)
+#   dividir_pj("0.10")            -> {"empresa": Decimal("0.02"), "pessoa": Decimal("0.07"), "reserva": Decimal("0.01")}
+
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+import numpy as np
+import pandas as pd
+
+_CENTAVO = Decimal("0.01")
+
+# Recebido PJ: empresa 15% / pessoa 76,5% / reserva de emergência 8,5%
+DIVISAO_PJ = {
+    "empresa": Decimal("0.15"),
+    "pessoa": Decimal("0.765"),
+    "reserva": Decimal("0.085"),
+}
+
+
+def centavos(valor) -> int:
+    """Reais (float, str, Decimal, int) -> centavos inteiros, ROUND_HALF_UP. Vazio -> 0."""
+    # pd.NA não tem valor de verdade (valor == "" levantaria TypeError): isna antes
+    if valor is None or (not isinstance(valor, (str, Decimal)) and pd.isna(valor)) or valor == "":
+        return 0
+    try:
+        # str(): 0.1 vira Decimal("0.1"), não a expansão binária do float
+        d = valor if isinstance(valor, Decimal) else Decimal(str(valor))
+    except InvalidOperation:
+        raise ValueError(f"Valor monetário inválido: {valor!r}")
+    return int((d * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def centavos_array(valores) -> np.ndarray:
+    """
+    Versão vetorizada de centavos() (int64). Floats arredondam meio-para-cima longe do zero,
+    como o Decimal; o round(…, 6) antes absorve o ruído binário (1.005 * 100 = 100.4999…).
+    """
+    s = pd.Series(valores, copy=False)
+    if pd.api.types.is_integer_dtype(s):
+        # Int64 (nullable) pode trazer <NA>: vazio -> 0, como em centavos()
+        return s.fillna(0).to_numpy(dtype="int64") * 100
+    if pd.api.types.is_float_dtype(s):
+        x = np.round(s.fillna(0).to_numpy(dtype=float) * 100, 6)
+        return (np.sign(x) * np.floor(np.abs(x) + 0.5)).astype("int64")
+    # objetos (Decimal, str, None): um a um, com a regra exata
+    return np.fromiter((centavos(v) for v in s), dtype="int64", count=len(s))
+
+
+def em_reais(c) -> float | np.ndarray:
+    """Centavos -> reais (float com 2 casas exatas na representação)."""
+    if isinstance(c, (np.ndarray, pd.Series)):
+        return np.asarray(c, dtype="int64") / 100
+    return int(c) / 100
+
+
+def para_decimal(c: int) -> Decimal:
+    """Centavos -> Decimal com 2 casas (para gravar via psycopg2)."""
+    return (Decimal(int(c)) / 100).quantize(_CENTAVO)
+
+
+def arredondar(valor) -> float:
+    """Valor em reais já arredondado ao centavo (ROUND_HALF_UP), pronto para o JSON da API."""
+    return em_reais(centavos(valor))
+
+
+def somar(valores) -> float:
+    """Soma exata (em centavos) de uma coluna/lista de valores em reais."""
+    return em_reais(int(centavos_array(valores).sum()))
+
+
+def dividir(total_centavos: int, proporcoes: dict) -> dict[str, int]:
+    """
+    Reparte total_centavos pelas proporções (que somam 1), cada parte com ROUND_HALF_UP.
+    A diferença de arredondamento (±1 centavo por parte) vai para a maior proporção,
+    então as partes sempre somam exatamente o total.
+    """
+    partes = {
+        nome: int((Decimal(total_centavos) * Decimal(str(p))).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        for nome, p in proporcoes.items()
+    }
+    sobra = total_centavos - sum(partes.values())
+    if sobra:
+        maior = max(proporcoes, key=lambda n: Decimal(str(proporcoes[n])))
+        partes[maior] += sobra
+    return partes
+
+
+def dividir_pj(valor_total) -> dict[str, Decimal]:
+    """Divisão do Recebido PJ (DIVISAO_PJ) em Decimal de 2 casas; soma == valor_total."""
+    return {nome: para_decimal(c) for nome, c in dividir(centavos(valor_total), DIVISAO_PJ).items()}
@@ -0,0 +1,270 @@
+# espelho_local.py - Cópia local (Parquet) de movimentacao e planejado, com sync incremental
+#
+# As páginas analíticas (dashboard, tendências) leem movimentações de vários meses. Em vez de
+# baixar tudo do Supabase a cada refresh, mantemos um espelho em disco e só trazemos o delta:
+#
+#   - linhas com updated_at >= marca d'água da última sync (inserções e alterações)
+#   - exclusões registradas na tabela registro_excluido (tombstones, via trigger)
+#
+# As duas consultas começam _JANELA antes da marca: updated_at/excluido_em são o início da
+# transação, e uma transação que confirma depois da sync pode ter um instante anterior à
+# marca. Reler a janela é idempotente (as linhas são trocadas pela chave).
+#
+# Depende das colunas/trigger/tabela da seção M do SQL/DDL.SQL e do pyarrow (Parquet).
+# Caixinhas/categorias são poucas: vêm inteiras a cada sync, só para montar os joins.
+#
+# Configuração (env):
+#   FINANCAS_ESPELHO_DIR   pasta do espelho (padrão .espelho ao lado deste arquivo)
+#
+# Uso:
+#   ok, stats = sincronizar()            # {"movimentacao": {"alteradas": 3, "excluidas": 0, "total": 5120}, ...}
+#   df = ler_tabela("movimentacao")
+#   carregar_mov_mes_agregado(ano, mes, usar_espelho=True)   # db_crud lendo do espelho
+
+import os
+import json
+import threading
+import datetime as dt
+
+import pandas as pd
+
+from db_crud import get_client, _paginado
+
+PASTA = os.getenv("FINANCAS_ESPELHO_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".espelho")
+_ARQ_ESTADO = "estado.json"
+
+# tabela -> chave primária
+TABELAS = {
+    "movimentacao": "id_mov",
+    "planejado": "id_plan",
+}
+
+_lock = threading.Lock()
+
+# releitura antes da marca d'água: cobre transações de até esse tempo
+_JANELA = dt.timedelta(minutes=10)
+
+
+def _caminho(nome: str) -> str:
+    return os.path.join(PASTA, nome)
+
+
+def _ler_estado() -> dict:
+    try:
+        with open(_caminho(_ARQ_ESTADO), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _gravar_atomico(caminho: str, escrever):
+    tmp = caminho + ".tmp"
+    escrever(tmp)
+    os.replace(tmp, caminho)
+
+
+def _gravar_estado(estado: dict):
+    def escrever(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(estado, f, indent=2)
+    _gravar_atomico(_caminho(_ARQ_ESTADO), escrever)
+
+
+def _ler_parquet(tabela: str) -> pd.DataFrame:
+    caminho = _caminho(f"{tabela}.parquet")
+    if not os.path.exists(caminho):
+        return pd.DataFrame()
+    return pd.read_parquet(caminho)
+
+
+def _gravar_parquet(tabela: str, df: pd.DataFrame):
+    _gravar_atomico(_caminho(f"{tabela}.parquet"), lambda tmp: df.to_parquet(tmp, index=False))
+
+
+def _recuar(marca: str | None) -> str | None:
+    """Marca d'água (ISO) menos a _JANELA de releitura."""
+    if not marca:
+        return None
+    return (pd.Timestamp(marca) - _JANELA).isoformat()
+
+
+def _mais_recente(marca: str | None, coluna: str, df: pd.DataFrame) -> str | None:
+    """Maior instante entre a marca atual e df[coluna] (compara datas, não texto); a marca nunca volta."""
+    valores = pd.Series([marca], dtype=object)
+    if not df.empty:
+        valores = pd.concat([valores, df[coluna].astype(object)], ignore_index=True)
+    ts = pd.to_datetime(valores, utc=True, errors="coerce", format="ISO8601").max()
+    return None if pd.isna(ts) else ts.isoformat()
+
+
+def _agora_servidor(client) -> str:
+    """now() do Postgres (RPC agora_servidor, seção M): não depende do relógio local."""
+    return str(client.rpc("agora_servidor", {}).execute().data)
+
+
+def _sincronizar_tabela(client, tabela: str, chave: str, estado: dict) -> dict:
+    marca = estado.get(tabela, {})
+    desde_alt = marca.get("updated_at")
+    desde_exc = marca.get("excluido_em")
+    # primeira sync: exclusões a partir de agora (no relógio do servidor), antes de baixar as linhas
+    inicio_exc = None if desde_exc else _agora_servidor(client)
+
+    def q_alteradas():
+        q = client.table(tabela).select("*")
+        if desde_alt:
+            q = q.gte("updated_at", _recuar(desde_alt))
+        return q.order("updated_at").order(chave)
+
+    def q_excluidas():
+        q = client.table("registro_excluido").select("id_registro, excluido_em").eq("tabela", tabela)
+        if desde_exc:
+            q = q.gte("excluido_em", _recuar(desde_exc))
+        return q.order("excluido_em").order("id_registro")
+
+    alteradas = pd.DataFrame(_paginado(q_alteradas))
+    excluidas = pd.DataFrame(_paginado(q_excluidas)) if desde_alt else pd.DataFrame()
+
+    atual = _ler_parquet(tabela) if desde_alt else pd.DataFrame()
+
+    sair = set()
+    if not alteradas.empty:
+        sair.update(alteradas[chave].tolist())
+    if not excluidas.empty:
+        sair.update(excluidas["id_registro"].tolist())
+
+    if not atual.empty and sair:
+        atual = atual[~atual[chave].isin(sair)]
+
+    partes = [p for p in (atual, alteradas) if not p.empty]
+    novo = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    if not novo.empty and not excluidas.empty:
+        # alteração antiga de uma linha que depois foi excluída
+        novo = novo[~novo[chave].isin(excluidas["id_registro"])]
+    if not novo.empty:
+        novo = novo.sort_values(chave).reset_index(drop=True)
+
+    _gravar_parquet(tabela, novo)
+
+    estado[tabela] = {
+        "updated_at": _mais_recente(desde_alt, "updated_at", alteradas),
+        # primeira sync: nada excluído antes dela interessa
+        "excluido_em": _mais_recente(desde_exc or inicio_exc, "excluido_em", excluidas),
+    }
+    return {"alteradas": len(alteradas), "excluidas": len(excluidas), "total": len(novo)}
+
+
+def _sincronizar_caixinhas(client):
+    data = (
+        client.table("caixinha")
+        .select("id_caixinha, caixinha, tipo_caixinha, fk_categoria_id, categoria:fk_categoria_id (categoria)")
+        .execute()
+        .data
+        or []
+    )
+    df = pd.DataFrame(
+        [
+            {
+                "id_caixinha": r["id_caixinha"],
+                "caixinha": r.get("caixinha"),
+                "tipo_caixinha": r.get("tipo_caixinha"),
+                "fk_categoria_id": r.get("fk_categoria_id"),
+                "categoria": (r.get("categoria") or {}).get("categoria"),
+            }
+            for r in data
+        ]
+    )
+    _gravar_parquet("caixinha", df)
+
+
+def sincronizar(tabelas=None) -> tuple[bool, dict | str]:
+    """
+    Traz para o espelho só o que mudou desde a última sync (a primeira baixa tudo).
+    Retorna (True, {tabela: {"alteradas", "excluidas", "total"}}) ou (False, msg).
+    """
+    tabelas = list(tabelas or TABELAS)
+    try:
+        os.makedirs(PASTA, exist_ok=True)
+        client = get_client()
+        with _lock:
+            estado = _ler_estado()
+            stats = {}
+            for tabela in tabelas:
+                stats[tabela] = _sincronizar_tabela(client, tabela, TABELAS[tabela], estado)
+            _sincronizar_caixinhas(client)
+            estado["sincronizado_em"] = dt.datetime.now(dt.timezone.utc).isoformat()
+            _gravar_estado(estado)
+        return True, stats
+    except ImportError:
+        return False, "Espelho local precisa do pyarrow (pip install pyarrow)."
+    except Exception as e:
+        return False, f"Erro ao sincronizar espelho: {e}"
+
+
+def ultima_sincronizacao() -> str | None:
+    return _ler_estado().get("sincronizado_em")
+
+
+def ler_tabela(tabela: str) -> pd.DataFrame:
+    """Conteúdo atual do espelho (vazio se nunca sincronizou)."""
+    try:
+        return _ler_parquet(tabela)
+    except Exception as e:
+        print(f"Erro ler espelho {tabela}: {e}")
+        return pd.DataFrame()
+
+
+# --- leituras no formato da API (para reaproveitar os _fmt_* do db_crud) ---
+def _caixinhas_aninhadas() -> dict[int, dict]:
+    cx = ler_tabela("caixinha")
+    if cx.empty:
+        return {}
+    return {
+        int(r["id_caixinha"]): {
+            "caixinha": r["caixinha"],
+            "tipo_caixinha": r["tipo_caixinha"],
+            "fk_categoria_id": r["fk_categoria_id"],
+            "categoria": {"categoria": r["categoria"]},
+        }
+        for r in cx.to_dict("records")
+    }
+
+
+def _com_caixinha(df: pd.DataFrame) -> list[dict]:
+    cx = _caixinhas_aninhadas()
+    # NaN do Parquet -> None, como viria da API
+    registros = df.astype(object).where(df.notna(), None).to_dict("records")
+    for r in registros:
+        r["caixinha"] = cx.get(int(r["fk_caixinha_id"])) if pd.notna(r.get("fk_caixinha_id")) else None
+    return registros
+
+
+def movimentacoes_periodo(
+    ini: dt.date,
+    fim: dt.date,
+    id_pessoa: int | None = None,
+    somente_confirmado: bool = True,
+) -> list[dict]:
+    """Movimentações com ini <= dt_mov < fim, com o join de caixinha/categoria aninhado."""
+    df = ler_tabela("movimentacao")
+    if df.empty:
+        return []
+
+    datas = pd.to_datetime(df["dt_mov"]).dt.date
+    filtro = (datas >= ini) & (datas < fim)
+    if somente_confirmado:
+        filtro &= df["status_mov"].astype(str).str.upper().isin(["CONFIRMADO", "CONCILIADO"])
+    if id_pessoa:
+        filtro &= df["fk_pessoa_id"] == id_pessoa
+    return _com_caixinha(df[filtro])
+
+
+def planejados_ativos(id_pessoa: int | None = None) -> list[dict]:
+    """Planejados ativos com o join de caixinha/categoria aninhado."""
+    df = ler_tabela("planejado")
+    if df.empty:
+        return []
+
+    filtro = df["plan_ativo"].fillna(True).astype(bool)
+    if id_pessoa:
+        filtro &= df["fk_pessoa_id"] == id_pessoa
+    return _com_caixinha(df[filtro])
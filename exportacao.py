@@ -0,0 +1,143 @@
+# exportacao.py - Exportação de movimentações (CSV/Parquet) em streaming
+#
+# As páginas vêm do Supabase por keyset (id_mov > último id, em ordem) e vão direto para o
+# arquivo: só uma página fica em memória, seja um mês ou cinco anos de extrato.
+#
+#   ok, n = exportar_movimentacoes("extrato.csv", "csv", ini=date(2021, 1, 1), status=["CONFIRMADO"])
+#
+# Parquet precisa do pyarrow (opcional); CSV usa só a biblioteca padrão.
+
+import csv
+import datetime as dt
+
+import dinheiro
+from db_crud import get_client, STATUS_MOV_OPTIONS
+
+FORMATOS = ("csv", "parquet")
+_PAGINA = 1000
+
+COLUNAS = [
+    "id_mov", "dt_mov", "descricao_mov", "desc_extrato", "valor_mov", "status_mov", "origem_mov",
+    "caixinha", "pessoa", "fk_caixinha_id", "fk_pessoa_id", "fk_planejado_id",
+]
+
+
+def _q_exportacao(client, ultimo_id: int, ini, fim, id_pessoa, ids_caixinha, status):
+    query = """
+        id_mov, dt_mov, descricao_mov, desc_extrato, valor_mov, status_mov, origem_mov,
+        fk_caixinha_id, fk_pessoa_id, fk_planejado_id,
+        caixinha:fk_caixinha_id (caixinha),
+        pessoa:fk_pessoa_id (nome)
+    """
+    q = client.table("movimentacao").select(query).gt("id_mov", ultimo_id)
+    if ini:
+        q = q.gte("dt_mov", str(ini))
+    if fim:
+        q = q.lte("dt_mov", str(fim))
+    if id_pessoa:
+        q = q.eq("fk_pessoa_id", id_pessoa)
+    if ids_caixinha:
+        q = q.in_("fk_caixinha_id", list(ids_caixinha))
+    if status:
+        q = q.in_("status_mov", list(status))
+    return q.order("id_mov").limit(_PAGINA)
+
+
+def _linha(r: dict) -> dict:
+    cx = r.get("caixinha") or {}
+    pes = r.get("pessoa") or {}
+    return {
+        **{c: r.get(c) for c in COLUNAS if c not in ("caixinha", "pessoa")},
+        "caixinha": cx.get("caixinha") or "",
+        "pessoa": pes.get("nome") or "",
+    }
+
+
+def paginas_movimentacoes(
+    ini: dt.date | None = None,
+    fim: dt.date | None = None,
+    id_pessoa: int | None = None,
+    ids_caixinha=None,
+    status=None,
+):
+    """Gera listas de linhas planas (COLUNAS), uma página por vez, em ordem de id_mov."""
+    client = get_client()
+    ultimo_id = 0
+    while True:
+        lote = _q_exportacao(client, ultimo_id, ini, fim, id_pessoa, ids_caixinha, status).execute().data or []
+        if not lote:
+            return
+        yield [_linha(r) for r in lote]
+        if len(lote) < _PAGINA:
+            return
+        ultimo_id = lote[-1]["id_mov"]
+
+
+def _escrever_csv(destino, paginas) -> int:
+    n = 0
+    with open(destino, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=COLUNAS, delimiter=";")
+        w.writeheader()
+        for pagina in paginas:
+            w.writerows(pagina)
+            n += len(pagina)
+    return n
+
+
+def _escrever_parquet(destino, paginas) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id_mov", pa.int64()),
+        ("dt_mov", pa.date32()),
+        ("descricao_mov", pa.string()),
+        ("desc_extrato", pa.string()),
+        ("valor_mov", pa.decimal128(12, 2)),
+        ("status_mov", pa.string()),
+        ("origem_mov", pa.string()),
+        ("caixinha", pa.string()),
+        ("pessoa", pa.string()),
+        ("fk_caixinha_id", pa.int64()),
+        ("fk_pessoa_id", pa.int64()),
+        ("fk_planejado_id", pa.int64()),
+    ])
+
+    n = 0
+    with pq.ParquetWriter(destino, schema) as w:
+        for pagina in paginas:
+            for r in pagina:
+                r["dt_mov"] = dt.date.fromisoformat(str(r["dt_mov"])[:10]) if r["dt_mov"] else None
+                r["valor_mov"] = dinheiro.para_decimal(dinheiro.centavos(r["valor_mov"]))
+            w.write_table(pa.Table.from_pylist(pagina, schema=schema))
+            n += len(pagina)
+    return n
+
+
+def exportar_movimentacoes(
+    destino: str,
+    formato: str = "csv",
+    ini: dt.date | None = None,
+    fim: dt.date | None = None,
+    id_pessoa: int | None = None,
+    ids_caixinha=None,
+    status=None,
+) -> tuple[bool, int | str]:
+    """
+    Grava as movimentações filtradas em `destino` (caminho) sem montar DataFrame.
+    Retorna (True, nº de linhas) ou (False, msg).
+    """
+    if formato not in FORMATOS:
+        return False, f"Formato inválido: {formato}"
+    if status and any(s not in STATUS_MOV_OPTIONS for s in status):
+        return False, f"Status inválido: {status}"
+
+    paginas = paginas_movimentacoes(ini, fim, id_pessoa, ids_caixinha, status)
+    try:
+        if formato == "csv":
+            return True, _escrever_csv(destino, paginas)
+        return True, _escrever_parquet(destino, paginas)
+    except ImportError:
+        return False, "Exportar Parquet precisa do pyarrow (pip install pyarrow)."
+    except Exception as e:
+        return False, f"Erro ao exportar movimentações: {e}"
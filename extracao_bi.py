@@ -0,0 +1,309 @@
+# extracao_bi.py - Extração incremental em estrela (Parquet) para o modelo do Power BI
+#
+# O .pbix lia as views dim_mov / dim_planejamento / dim_caixinhas_e_categorias com refresh
+# completo. Aqui gravamos um esquema estrela em pastas particionadas por ano/mês:
+#
+#   BI/extracao/
+#     fact_movimentacao/ano=2025/mes=03/parte.parquet
+#     fact_planejado_projetado/ano=2025/mes=03/parte.parquet
+#     dim_caixinha.parquet  dim_categoria.parquet  dim_pessoa.parquet  dim_data.parquet
+#
+# Incremental em duas pontas:
+#   - do Supabase só vem o delta: espelho_local.sincronizar() (marca d'água em updated_at +
+#     registro_excluido, seção M do SQL/DDL.SQL)
+#   - no disco só são regravadas as partições tocadas: comparamos o espelho com o índice
+#     (id, updated_at, ano, mes) da última extração; uma linha que mudou de mês regrava o mês
+#     antigo e o novo, uma exclusão regrava o mês onde a linha estava
+#   fact_planejado_projetado é refeito (é barato, vetorizado em previsao_caixa) só quando algum
+#   planejado muda ou o horizonte (jan do 1º ano com movimentação .. dez do ano seguinte) muda.
+#
+# No Power BI: fonte "Pasta" apontando para cada fact_* (as colunas ano/mes vêm do caminho).
+#
+# Configuração (env):
+#   FINANCAS_BI_DIR   pasta da extração (padrão BI/extracao ao lado deste arquivo)
+#
+# Uso:
+#   ok, stats = extrair()                 # {"fact_movimentacao": {"particoes": 2, "linhas": 5120}, ...}
+#   ok, stats = extrair(completo=True)    # regrava tudo
+#   python extracao_bi.py [--completo]
+
+import os
+import sys
+import json
+import shutil
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+import dinheiro
+import espelho_local
+from db_crud import get_client, _q_pessoas
+from previsao_caixa import expandir_planejados
+
+PASTA = os.getenv("FINANCAS_BI_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "BI", "extracao")
+_PASTA_ESTADO = "_estado"
+_ARQ_ESTADO = "estado.json"
+
+_NOMES_MES = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+_DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+
+def _caminho(*partes) -> str:
+    return os.path.join(PASTA, *partes)
+
+
+def _ler_estado() -> dict:
+    try:
+        with open(_caminho(_PASTA_ESTADO, _ARQ_ESTADO), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _gravar_estado(estado: dict):
+    def escrever(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(estado, f, indent=2)
+    espelho_local._gravar_atomico(_caminho(_PASTA_ESTADO, _ARQ_ESTADO), escrever)
+
+
+def _gravar_parquet(caminho: str, df: pd.DataFrame):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    espelho_local._gravar_atomico(caminho, lambda tmp: df.to_parquet(tmp, index=False))
+
+
+def _ler_indice(fato: str) -> pd.DataFrame:
+    caminho = _caminho(_PASTA_ESTADO, f"indice_{fato}.parquet")
+    if not os.path.exists(caminho):
+        return pd.DataFrame()
+    return pd.read_parquet(caminho)
+
+
+def _chave_data(datas: pd.Series) -> np.ndarray:
+    """datetime -> inteiro AAAAMMDD (chave de dim_data)."""
+    return (datas.dt.year * 10000 + datas.dt.month * 100 + datas.dt.day).to_numpy(dtype="int64")
+
+
+# --- fatos ---
+def _fato_movimentacao(mov: pd.DataFrame) -> pd.DataFrame:
+    """Espelho de movimentacao -> linhas de fact_movimentacao (com ano/mes da partição)."""
+    datas = pd.to_datetime(mov["dt_mov"], errors="coerce")
+    c = dinheiro.centavos_array(mov["valor_mov"])
+    descricao = mov["descricao_mov"].where(mov["descricao_mov"].notna() & (mov["descricao_mov"] != ""), mov["desc_extrato"])
+    return pd.DataFrame({
+        "id_mov": mov["id_mov"].astype("int64").to_numpy(),
+        "data_key": _chave_data(datas.fillna(pd.Timestamp(1900, 1, 1))),
+        "data": datas.dt.date.to_numpy(),
+        "id_caixinha": mov["fk_caixinha_id"].astype("Int64").to_numpy(),
+        "id_pessoa": mov["fk_pessoa_id"].astype("Int64").to_numpy(),
+        "id_planejado": mov["fk_planejado_id"].astype("Int64").to_numpy(),
+        "descricao": descricao.to_numpy(),
+        "valor": dinheiro.em_reais(c),
+        "valor_centavos": c,
+        "status": mov["status_mov"].to_numpy(),
+        "origem": mov["origem_mov"].to_numpy(),
+        "ano": datas.dt.year.to_numpy(),
+        "mes": datas.dt.month.to_numpy(),
+    }).dropna(subset=["ano"])
+
+
+def _indice(df: pd.DataFrame, chave: str, fato: pd.DataFrame) -> pd.DataFrame:
+    """[chave, updated_at, ano, mes]: o que está gravado em cada partição nesta extração."""
+    return pd.DataFrame({
+        chave: df[chave].astype("int64").to_numpy(),
+        "updated_at": df["updated_at"].astype(str).to_numpy(),
+    }).merge(fato[[chave, "ano", "mes"]], on=chave, how="left")
+
+
+def _particoes_tocadas(antes: pd.DataFrame, depois: pd.DataFrame, chave: str) -> set[tuple[int, int]]:
+    """Partições (ano, mes) com alguma linha nova, alterada, excluída ou que trocou de mês."""
+    if antes.empty:
+        return {(int(a), int(m)) for a, m in depois[["ano", "mes"]].dropna().drop_duplicates().itertuples(index=False)}
+
+    m = antes.merge(depois, on=chave, how="outer", suffixes=("_antes", ""), indicator=True)
+    mudou = (m["_merge"] != "both") | (m["updated_at_antes"] != m["updated_at"])
+    tocadas = set()
+    for sufixo in ("_antes", ""):
+        pares = m.loc[mudou, [f"ano{sufixo}", f"mes{sufixo}"]].dropna().drop_duplicates()
+        tocadas.update((int(a), int(mes)) for a, mes in pares.itertuples(index=False))
+    return tocadas
+
+
+def _mudou(antes: pd.DataFrame, depois: pd.DataFrame, chave: str) -> bool:
+    """Algum registro entrou, saiu ou tem outro updated_at?"""
+    if antes.empty or depois.empty:
+        return antes.empty != depois.empty
+    a = dict(zip(antes[chave].astype("int64"), antes["updated_at"].astype(str)))
+    d = dict(zip(depois[chave].astype("int64"), depois["updated_at"].astype(str)))
+    return a != d
+
+
+def _gravar_particoes(nome: str, fato: pd.DataFrame, particoes) -> int:
+    """Regrava (ou apaga, se ficou vazia) cada partição (ano, mes) de fact_<nome>."""
+    grupos = {
+        (int(a), int(m)): g
+        for (a, m), g in fato[fato.set_index(["ano", "mes"]).index.isin(list(particoes))].groupby(["ano", "mes"])
+    } if particoes and not fato.empty else {}
+
+    for ano, mes in particoes:
+        pasta = _caminho(nome, f"ano={ano}", f"mes={mes:02d}")
+        g = grupos.get((ano, mes))
+        if g is None or g.empty:
+            shutil.rmtree(pasta, ignore_errors=True)
+            if os.path.isdir(os.path.dirname(pasta)) and not os.listdir(os.path.dirname(pasta)):
+                os.rmdir(os.path.dirname(pasta))
+            continue
+        _gravar_parquet(os.path.join(pasta, "parte.parquet"), g.drop(columns=["ano", "mes"]).reset_index(drop=True))
+    return len(particoes)
+
+
+def _particoes_gravadas(nome: str) -> set[tuple[int, int]]:
+    pasta = _caminho(nome)
+    if not os.path.isdir(pasta):
+        return set()
+    return {
+        (int(a.split("=")[1]), int(m.split("=")[1]))
+        for a in os.listdir(pasta) if a.startswith("ano=")
+        for m in os.listdir(os.path.join(pasta, a)) if m.startswith("mes=")
+    }
+
+
+def _fato_planejado_projetado(plan: pd.DataFrame, caixinhas: pd.DataFrame, ini: dt.date, fim: dt.date) -> pd.DataFrame:
+    """Ocorrências datadas dos planejados ativos no horizonte (valor positivo; o tipo vem da dim_caixinha)."""
+    colunas = ["id_plan", "data_key", "data", "id_caixinha", "id_pessoa", "valor", "valor_centavos", "ano", "mes"]
+    if plan.empty:
+        return pd.DataFrame(columns=colunas)
+
+    ativos = plan[plan["plan_ativo"].fillna(True).astype(bool)]
+    planos = ativos.merge(
+        caixinhas[["id_caixinha", "tipo_caixinha"]], left_on="fk_caixinha_id", right_on="id_caixinha", how="left"
+    )
+    oc = expandir_planejados(planos, ini, fim)
+    if oc.empty:
+        return pd.DataFrame(columns=colunas)
+
+    caixinha_plano = planos.set_index("id_plan")["fk_caixinha_id"]
+    datas = pd.to_datetime(oc["data"])
+    c = np.abs(oc["centavos"].to_numpy(dtype="int64"))
+    return pd.DataFrame({
+        "id_plan": oc["id_plan"].astype("int64").to_numpy(),
+        "data_key": _chave_data(datas),
+        "data": datas.dt.date.to_numpy(),
+        "id_caixinha": caixinha_plano.reindex(oc["id_plan"]).astype("Int64").to_numpy(),
+        "id_pessoa": oc["fk_pessoa_id"].astype("Int64").to_numpy(),
+        "valor": dinheiro.em_reais(c),
+        "valor_centavos": c,
+        "ano": datas.dt.year.to_numpy(),
+        "mes": datas.dt.month.to_numpy(),
+    })[colunas]
+
+
+# --- dimensões (pequenas: regravadas a cada extração) ---
+def _dim_data(ini: dt.date, fim: dt.date) -> pd.DataFrame:
+    datas = pd.Series(pd.date_range(ini, fim, freq="D"))
+    return pd.DataFrame({
+        "data_key": _chave_data(datas),
+        "data": datas.dt.date.to_numpy(),
+        "ano": datas.dt.year.to_numpy(),
+        "mes": datas.dt.month.to_numpy(),
+        "dia": datas.dt.day.to_numpy(),
+        "trimestre": datas.dt.quarter.to_numpy(),
+        "semestre": np.where(datas.dt.month <= 6, 1, 2),
+        "nome_mes": [_NOMES_MES[m - 1] for m in datas.dt.month],
+        "ano_mes": datas.dt.strftime("%Y-%m").to_numpy(),
+        "dia_semana": [_DIAS_SEMANA[d] for d in datas.dt.weekday],
+    })
+
+
+def _gravar_dimensoes(caixinhas: pd.DataFrame, ini: dt.date, fim: dt.date):
+    dim_caixinha = caixinhas.rename(columns={"fk_categoria_id": "id_categoria"})[
+        ["id_caixinha", "caixinha", "tipo_caixinha", "id_categoria"]
+    ]
+    dim_categoria = (
+        caixinhas.rename(columns={"fk_categoria_id": "id_categoria"})[["id_categoria", "categoria"]]
+        .dropna(subset=["id_categoria"]).drop_duplicates("id_categoria").sort_values("id_categoria")
+    )
+    dim_pessoa = pd.DataFrame(_q_pessoas(get_client()).execute().data or [], columns=["id_pessoa", "nome"])
+
+    _gravar_parquet(_caminho("dim_caixinha.parquet"), dim_caixinha.reset_index(drop=True))
+    _gravar_parquet(_caminho("dim_categoria.parquet"), dim_categoria.reset_index(drop=True))
+    _gravar_parquet(_caminho("dim_pessoa.parquet"), dim_pessoa)
+    _gravar_parquet(_caminho("dim_data.parquet"), _dim_data(ini, fim))
+
+
+def _horizonte(fato_mov: pd.DataFrame, hoje: dt.date) -> tuple[dt.date, dt.date]:
+    ano_ini = min(int(fato_mov["ano"].min()), hoje.year) if not fato_mov.empty else hoje.year
+    ano_fim = max(int(fato_mov["ano"].max()), hoje.year + 1) if not fato_mov.empty else hoje.year + 1
+    return dt.date(ano_ini, 1, 1), dt.date(ano_fim, 12, 31)
+
+
+def extrair(completo: bool = False, hoje: dt.date | None = None) -> tuple[bool, dict | str]:
+    """
+    Sincroniza o espelho (só o delta) e regrava apenas as partições/fatos afetados.
+    completo=True ignora o índice anterior e regrava todas as partições.
+    Retorna (True, {fato: {"particoes", "linhas"}, "horizonte": [ini, fim]}) ou (False, msg).
+    """
+    hoje = hoje or dt.date.today()
+    ok, sync = espelho_local.sincronizar()
+    if not ok:
+        return False, sync
+
+    try:
+        estado = {} if completo else _ler_estado()
+        mov = espelho_local.ler_tabela("movimentacao")
+        plan = espelho_local.ler_tabela("planejado")
+        caixinhas = espelho_local.ler_tabela("caixinha")
+
+        # fact_movimentacao: só as partições que mudaram desde a última extração
+        fato_mov = _fato_movimentacao(mov) if not mov.empty else pd.DataFrame(columns=["id_mov", "ano", "mes"])
+        indice_mov = _indice(mov, "id_mov", fato_mov) if not mov.empty else pd.DataFrame(columns=["id_mov", "updated_at", "ano", "mes"])
+        antes = pd.DataFrame() if completo else _ler_indice("movimentacao")
+        tocadas = _particoes_tocadas(antes, indice_mov, "id_mov")
+        if completo:
+            tocadas |= _particoes_gravadas("fact_movimentacao")
+        n_mov = _gravar_particoes("fact_movimentacao", fato_mov, tocadas)
+
+        # fact_planejado_projetado: tudo ou nada (muda com qualquer planejado ou com o horizonte)
+        ini, fim = _horizonte(fato_mov, hoje)
+        horizonte = [ini.isoformat(), fim.isoformat()]
+        indice_plan = (
+            pd.DataFrame({"id_plan": plan["id_plan"].astype("int64"), "updated_at": plan["updated_at"].astype(str)})
+            if not plan.empty else pd.DataFrame(columns=["id_plan", "updated_at"])
+        )
+        antes_plan = pd.DataFrame() if completo else _ler_indice("planejado")
+        plan_mudou = completo or estado.get("horizonte") != horizonte or _mudou(antes_plan, indice_plan, "id_plan")
+        n_plan = 0
+        fato_plan = pd.DataFrame()
+        if plan_mudou:
+            fato_plan = _fato_planejado_projetado(plan, caixinhas, ini, fim)
+            particoes = _particoes_gravadas("fact_planejado_projetado") | {
+                (int(a), int(m)) for a, m in fato_plan[["ano", "mes"]].drop_duplicates().itertuples(index=False)
+            }
+            n_plan = _gravar_particoes("fact_planejado_projetado", fato_plan, particoes)
+
+        _gravar_dimensoes(caixinhas, ini, fim)
+
+        # índices por último: se algo falhar antes, a próxima extração refaz as mesmas partições
+        _gravar_parquet(_caminho(_PASTA_ESTADO, "indice_movimentacao.parquet"), indice_mov)
+        _gravar_parquet(_caminho(_PASTA_ESTADO, "indice_planejado.parquet"), indice_plan)
+        estado.update({
+            "horizonte": horizonte,
+            "espelho_sincronizado_em": espelho_local.ultima_sincronizacao(),
+            "extraido_em": dt.datetime.now(dt.timezone.utc).isoformat(),
+        })
+        _gravar_estado(estado)
+
+        return True, {
+            "fact_movimentacao": {"particoes": n_mov, "linhas": len(fato_mov)},
+            "fact_planejado_projetado": {"particoes": n_plan, "linhas": len(fato_plan) if plan_mudou else None},
+            "horizonte": horizonte,
+        }
+    except Exception as e:
+        return False, f"Erro na extração para o BI: {e}"
+
+
+if __name__ == "__main__":
+    ok, res = extrair(completo="--completo" in sys.argv)
+    print(json.dumps(res, indent=2, default=str) if ok else res)
+    sys.exit(0 if ok else 1)
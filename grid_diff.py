@@ -0,0 +1,107 @@
+# grid_diff.py - Detecção de alterações nos st.data_editor (um só jeito para todas as páginas)
+#
+# diff_grid() compara o DataFrame original com o editado coluna a coluna (vetorizado) e
+# devolve um patch por linha alterada, só com as colunas que mudaram:
+#
+#   [{"id_plan": 12, "valor_plan": 150.0}, {"id_plan": 15, "plan_ativo": False, "dia_plan": 5}]
+#
+# Regras de igualdade (as mesmas para todas as páginas):
+#   - None, NaN, NaT e "" são "vazio" e iguais entre si
+#   - datas comparam pelo dia (date, Timestamp e "2025-01-31" são a mesma coisa)
+#   - números comparam pelo valor (10 == 10.0)
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+
+def _eh_data(s: pd.Series) -> bool:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return True
+    amostra = s.dropna()
+    return not amostra.empty and isinstance(amostra.iloc[0], (dt.date, pd.Timestamp))
+
+
+def _normalizar(a: pd.Series, b: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Coloca as duas colunas no mesmo 'tipo de comparação'."""
+    if _eh_data(a) or _eh_data(b):
+        return (
+            pd.to_datetime(a, errors="coerce").dt.normalize(),
+            pd.to_datetime(b, errors="coerce").dt.normalize(),
+        )
+    if pd.api.types.is_bool_dtype(a) or pd.api.types.is_bool_dtype(b):
+        return a.astype("boolean"), b.astype("boolean")
+    if pd.api.types.is_numeric_dtype(a) or pd.api.types.is_numeric_dtype(b):
+        return pd.to_numeric(a, errors="coerce"), pd.to_numeric(b, errors="coerce")
+    # texto/categorias: "" conta como vazio
+    a = a.astype(object)
+    b = b.astype(object)
+    return a.where(a.notna() & (a != ""), None), b.where(b.notna() & (b != ""), None)
+
+
+def _mudou(a: pd.Series, b: pd.Series) -> np.ndarray:
+    a, b = _normalizar(a, b)
+    vazio_a = a.isna().to_numpy()
+    vazio_b = b.isna().to_numpy()
+    va = a.to_numpy(dtype=object, copy=True)
+    vb = b.to_numpy(dtype=object, copy=True)
+    va[vazio_a] = None
+    vb[vazio_b] = None
+    return ~np.asarray(va == vb, dtype=bool)
+
+
+def valor_py(v):
+    """Valor do grid -> tipo Python simples (None, int, float, bool, str, date)."""
+    if v is None:
+        return None
+    if isinstance(v, pd.Timestamp):
+        return None if pd.isna(v) else v.date()
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and np.isnan(v):
+        return None
+    if v is pd.NA or v is pd.NaT:
+        return None
+    return v
+
+
+def diff_grid(
+    original: pd.DataFrame,
+    editado: pd.DataFrame,
+    chave: str,
+    ignorar: tuple[str, ...] = (),
+) -> list[dict]:
+    """
+    Patches mínimos (chave + colunas alteradas) das linhas que mudaram.
+    `original` e `editado` precisam ter o mesmo índice (num_rows="fixed").
+    Colunas em `ignorar` (checkboxes de controle, colunas derivadas) não contam como mudança.
+    """
+    if original is None or original.empty or editado is None or editado.empty:
+        return []
+
+    editado = editado.reindex(original.index)
+    colunas = [c for c in original.columns if c != chave and c not in ignorar and c in editado.columns]
+    if not colunas:
+        return []
+
+    mascara = np.column_stack([_mudou(original[c], editado[c]) for c in colunas])
+    linhas = np.flatnonzero(mascara.any(axis=1))
+
+    chaves = original[chave].to_numpy()
+    valores = editado[colunas].to_numpy(dtype=object)
+
+    patches = []
+    for i in linhas:
+        patch = {chave: valor_py(chaves[i])}
+        for j in np.flatnonzero(mascara[i]):
+            patch[colunas[j]] = valor_py(valores[i, j])
+        patches.append(patch)
+    return patches
+
+
+def linhas_marcadas(editado: pd.DataFrame, coluna: str, chave: str) -> list:
+    """Chaves das linhas com o checkbox `coluna` marcado (ex.: 'selecionar')."""
+    if editado is None or editado.empty or coluna not in editado.columns:
+        return []
+    return [valor_py(v) for v in editado.loc[editado[coluna].fillna(False).astype(bool), chave]]
@@ -0,0 +1,176 @@
+# previsao_caixa.py - Saldo diário previsto (planejados + movimentações pendentes)
+#
+# Motor sem banco: recebe DataFrames já carregados (db_crud.carregar_previsao_caixa faz as
+# consultas) e devolve o saldo projetado dia a dia por pessoa.
+#
+#   1) expandir_planejados(): cada planejado vira ocorrências datadas no período
+#        MENSAL  -> dia_plan de cada mês (último dia se o mês for mais curto), a partir do início
+#        SEMANAL -> a cada 7 dias desde dt_inicio_plan
+#        UNICO   -> dia_plan do mês de dt_inicio_plan
+#      repeticoes_plan (N != -1) limita o total de ocorrências contadas desde o início.
+#   2) descontar_lancados(): some a ocorrência que já virou movimentação (fk_planejado_id)
+#      e o resto se junta às movimentações PENDENTE (vencidas entram no 1º dia)
+#   3) saldo_diario(): matriz dias x pessoas com np.add.at + cumsum, somada ao saldo inicial
+#
+# Valores em centavos (dinheiro.py); ENTRADA soma e SAIDA subtrai.
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+import dinheiro
+
+_DIA = np.timedelta64(1, "D")
+
+
+def _sinal(tipo: pd.Series) -> np.ndarray:
+    return np.where(tipo.astype(str).str.upper().to_numpy() == "ENTRADA", 1, -1)
+
+
+def _dias_no_mes(meses: np.ndarray) -> np.ndarray:
+    """meses: datetime64[M] -> nº de dias de cada mês."""
+    return ((meses + 1).astype("datetime64[D]") - meses.astype("datetime64[D]")).astype(int)
+
+
+def expandir_planejados(planos: pd.DataFrame, ini: dt.date, fim: dt.date) -> pd.DataFrame:
+    """
+    Ocorrências dos planejados entre ini e fim (inclusive).
+    planos: [id_plan, recorrencia_plan, dia_plan, valor_plan, dt_inicio_plan, repeticoes_plan,
+             fk_pessoa_id, tipo_caixinha]
+    Retorna DF: [data, id_plan, fk_pessoa_id, centavos] (centavos com sinal)
+    """
+    colunas = ["data", "id_plan", "fk_pessoa_id", "centavos"]
+    if planos is None or planos.empty:
+        return pd.DataFrame(columns=colunas)
+
+    d_ini, d_fim = np.datetime64(ini, "D"), np.datetime64(fim, "D")
+    recorr = planos["recorrencia_plan"].astype(str).str.upper().to_numpy()
+    inicio = pd.to_datetime(planos["dt_inicio_plan"], errors="coerce").to_numpy().astype("datetime64[D]")
+    inicio = np.where(np.isnat(inicio), d_ini, inicio)
+    dia = planos["dia_plan"].fillna(1).astype(int).clip(1, 31).to_numpy()
+    repet = planos["repeticoes_plan"].fillna(-1).astype(int).to_numpy()
+    valor = dinheiro.centavos_array(planos["valor_plan"]) * _sinal(planos["tipo_caixinha"])
+    id_plan = planos["id_plan"].to_numpy()
+    pessoa = planos["fk_pessoa_id"].to_numpy()
+
+    partes = []
+
+    # MENSAL: planos x meses do período
+    m = np.flatnonzero(recorr == "MENSAL")
+    if m.size:
+        meses = np.arange(d_ini.astype("datetime64[M]"), d_fim.astype("datetime64[M]") + 1)
+        dias = np.minimum(dia[m][:, None], _dias_no_mes(meses)[None, :])
+        datas = meses.astype("datetime64[D]")[None, :] + (dias - 1) * _DIA
+        n_ocorr = (meses[None, :] - inicio[m].astype("datetime64[M]")[:, None]).astype(int) + 1
+        ok = (datas >= inicio[m][:, None]) & (datas >= d_ini) & (datas <= d_fim)
+        ok &= (repet[m][:, None] == -1) | (n_ocorr <= repet[m][:, None])
+        lin, col = np.nonzero(ok)
+        partes.append((datas[lin, col], m[lin]))
+
+    # SEMANAL: a cada 7 dias desde o início
+    s = np.flatnonzero(recorr == "SEMANAL")
+    if s.size:
+        semanas = int((d_fim - d_ini) // _DIA) // 7 + 2
+        k0 = np.maximum(0, -(-((d_ini - inicio[s]) // _DIA) // 7))  # ceil, nunca antes do início
+        k = k0[:, None] + np.arange(semanas)[None, :]
+        datas = inicio[s][:, None] + k * 7 * _DIA
+        ok = (datas >= d_ini) & (datas <= d_fim)
+        ok &= (repet[s][:, None] == -1) | (k < repet[s][:, None])
+        lin, col = np.nonzero(ok)
+        partes.append((datas[lin, col], s[lin]))
+
+    # UNICO: uma data, no mês do início
+    u = np.flatnonzero(recorr == "UNICO")
+    if u.size:
+        mes_u = inicio[u].astype("datetime64[M]")
+        datas = mes_u.astype("datetime64[D]") + (np.minimum(dia[u], _dias_no_mes(mes_u)) - 1) * _DIA
+        ok = (datas >= d_ini) & (datas <= d_fim) & (repet[u] != 0)
+        partes.append((datas[ok], u[ok]))
+
+    if not partes:
+        return pd.DataFrame(columns=colunas)
+
+    datas = np.concatenate([p[0] for p in partes])
+    idx = np.concatenate([p[1] for p in partes])
+    return pd.DataFrame({
+        "data": datas,
+        "id_plan": id_plan[idx],
+        "fk_pessoa_id": pessoa[idx],
+        "centavos": valor[idx],
+    })[colunas]
+
+
+def eventos_pendentes(pendentes: pd.DataFrame, ini: dt.date) -> pd.DataFrame:
+    """
+    Movimentações PENDENTE como eventos de caixa; as vencidas (antes de ini) caem em ini.
+    pendentes: [dt_mov, valor_mov, fk_pessoa_id, tipo_caixinha]
+    Retorna DF: [data, fk_pessoa_id, centavos]
+    """
+    if pendentes is None or pendentes.empty:
+        return pd.DataFrame(columns=["data", "fk_pessoa_id", "centavos"])
+    datas = pd.to_datetime(pendentes["dt_mov"]).to_numpy().astype("datetime64[D]")
+    return pd.DataFrame({
+        "data": np.maximum(datas, np.datetime64(ini, "D")),
+        "fk_pessoa_id": pendentes["fk_pessoa_id"].to_numpy(),
+        "centavos": dinheiro.centavos_array(pendentes["valor_mov"]) * _sinal(pendentes["tipo_caixinha"]),
+    })
+
+
+def saldo_diario(
+    eventos: pd.DataFrame,
+    ini: dt.date,
+    fim: dt.date,
+    saldo_inicial: dict | None = None,
+) -> pd.DataFrame:
+    """
+    Saldo acumulado por pessoa em cada dia de ini a fim.
+    eventos: [data, fk_pessoa_id, centavos]; saldo_inicial: {fk_pessoa_id: centavos}
+    Retorna DF longo: [data, fk_pessoa_id, movimento, saldo] (em reais)
+    """
+    saldo_inicial = saldo_inicial or {}
+    pessoas = sorted(set(eventos["fk_pessoa_id"].dropna().astype(int)) | {int(p) for p in saldo_inicial})
+    dias = np.arange(np.datetime64(ini, "D"), np.datetime64(fim, "D") + 1)
+    if not pessoas or not dias.size:
+        return pd.DataFrame(columns=["data", "fk_pessoa_id", "movimento", "saldo"])
+
+    ev = eventos.dropna(subset=["fk_pessoa_id"])
+    lin = ((pd.to_datetime(ev["data"]).to_numpy().astype("datetime64[D]") - dias[0]) // _DIA).astype(int)
+    col = np.searchsorted(pessoas, ev["fk_pessoa_id"].astype(int).to_numpy())
+    mov = np.zeros((dias.size, len(pessoas)), dtype="int64")
+    dentro = (lin >= 0) & (lin < dias.size)
+    np.add.at(mov, (lin[dentro], col[dentro]), ev["centavos"].to_numpy(dtype="int64")[dentro])
+
+    inicial = np.array([int(saldo_inicial.get(p, 0)) for p in pessoas], dtype="int64")
+    saldo = np.cumsum(mov, axis=0) + inicial[None, :]
+
+    return pd.DataFrame({
+        "data": np.repeat(dias, len(pessoas)),
+        "fk_pessoa_id": np.tile(pessoas, dias.size),
+        "movimento": dinheiro.em_reais(mov.ravel()),
+        "saldo": dinheiro.em_reais(saldo.ravel()),
+    })
+
+
+def descontar_lancados(ocorrencias: pd.DataFrame, lancadas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tira das ocorrências as que já viraram movimentação (fk_planejado_id): para cada
+    (plano, mês), descarta as k primeiras ocorrências, k = nº de movimentações lançadas.
+    lancadas: [fk_planejado_id, dt_mov]
+    """
+    if ocorrencias.empty or lancadas is None or lancadas.empty:
+        return ocorrencias
+
+    mes = pd.to_datetime(ocorrencias["data"]).dt.to_period("M")
+    oc = ocorrencias.assign(_mes=mes).sort_values("data")
+    oc["_ordem"] = oc.groupby(["id_plan", "_mes"]).cumcount()
+
+    k = (
+        lancadas.assign(_mes=pd.to_datetime(lancadas["dt_mov"]).dt.to_period("M"))
+        .groupby(["fk_planejado_id", "_mes"]).size()
+        .rename("_k").reset_index()
+        .rename(columns={"fk_planejado_id": "id_plan"})
+    )
+    oc = oc.merge(k, on=["id_plan", "_mes"], how="left")
+    oc = oc[oc["_ordem"] >= oc["_k"].fillna(0)]
+    return oc.drop(columns=["_mes", "_ordem", "_k"]).reset_index(drop=True)
@@ -0,0 +1,125 @@
+# simulacao_mc.py - Simulação Monte Carlo do saldo de fim de mês
+#
+# O planejado é uma estimativa pontual; o gasto real de cada caixinha varia de mês para mês.
+# Aqui cada caixinha ganha uma distribuição ajustada ao histórico e sorteamos milhares de
+# caminhos (NumPy, vetorizado) para o horizonte da projeção:
+#
+#   valor(caminho, mês, caixinha) = base(mês, caixinha) * fator
+#   base  = média histórica da caixinha (o planejado só entra se não houver histórico)
+#   fator ~ lognormal com média 1 e o coeficiente de variação (CV) histórico da caixinha
+#
+# O planejado é o limiar: P(despesas das caixinhas planejadas > planejado do mês). Centrar a
+# simulação no próprio planejado daria ~50% sempre, qualquer que fosse o histórico.
+# Sem banco: db_crud.carregar_simulacao_saldo monta as entradas.
+#
+#   r = simular(base, sinais, cv, saldo_inicial=1500.0, n_caminhos=10_000, processos=4)
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+PERCENTIS = (5, 25, 50, 75, 95)
+_CV_MAX = 3.0
+_LOTE = 2000  # caminhos por bloco (limita a memória do array caminhos x meses x caixinhas)
+
+
+def ajustar_distribuicoes(hist: pd.DataFrame, meses_historico: int) -> pd.DataFrame:
+    """
+    Média e CV do total mensal de cada caixinha no histórico (meses sem gasto contam como 0).
+    hist: [mes, caixinha, valor] (um total por mês e caixinha)
+    Retorna DF: [caixinha, media, cv, meses_com_valor]
+    """
+    colunas = ["caixinha", "media", "cv", "meses_com_valor"]
+    if hist is None or hist.empty:
+        return pd.DataFrame(columns=colunas)
+
+    tabela = hist.pivot_table(index="mes", columns="caixinha", values="valor", aggfunc="sum", fill_value=0.0)
+    n = max(meses_historico, len(tabela))
+    soma = tabela.sum()
+    media = soma / n
+    # variância com os meses sem lançamento (zeros) incluídos
+    var = ((tabela - media) ** 2).sum() + (n - len(tabela)) * media ** 2
+    desvio = np.sqrt(var / max(n - 1, 1))
+    cv = (desvio / media.where(media > 0)).fillna(0.0).clip(upper=_CV_MAX)
+    return pd.DataFrame({
+        "caixinha": tabela.columns,
+        "media": media.to_numpy(),
+        "cv": cv.to_numpy(),
+        "meses_com_valor": (tabela > 0).sum().to_numpy(),
+    })[colunas]
+
+
+def _bloco(args) -> tuple[np.ndarray, np.ndarray]:
+    """Simula um bloco de caminhos. Devolve (saldo fim de mês [n x M], despesas do mês [n x M])."""
+    base, sinais, cv, mascara, saldo_inicial, n, semente = args
+    rng = np.random.default_rng(semente)
+    sigma = np.sqrt(np.log1p(cv ** 2))  # lognormal com média 1
+    mu = -sigma ** 2 / 2
+
+    saldos, despesas = [], []
+    for ini in range(0, n, _LOTE):
+        k = min(_LOTE, n - ini)
+        fator = np.exp(mu + sigma * rng.standard_normal((k, *base.shape)))
+        valores = base[None, :, :] * fator  # k x meses x caixinhas
+        fluxo = valores @ sinais
+        saldos.append(saldo_inicial + np.cumsum(fluxo, axis=1))
+        despesas.append(np.einsum("kmc,mc->km", valores, mascara))
+    return np.concatenate(saldos), np.concatenate(despesas)
+
+
+def simular(
+    base: np.ndarray,
+    sinais: np.ndarray,
+    cv: np.ndarray,
+    saldo_inicial: float = 0.0,
+    n_caminhos: int = 10_000,
+    semente: int | None = None,
+    processos: int = 1,
+    mascara_despesa: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    base: [meses x caixinhas] valor esperado (positivo); sinais: +1 ENTRADA / -1 SAIDA por caixinha;
+    cv: coeficiente de variação por caixinha.
+    mascara_despesa: [meses x caixinhas] quais caixinhas somam nas despesas do mês (padrão:
+    todas as SAIDA); use as que têm planejado para comparar com o planejado.
+    processos > 1 divide os caminhos entre processos, cada um com um fluxo aleatório
+    independente (SeedSequence.spawn); com a mesma semente o resultado é reproduzível.
+    Retorna (saldos, despesas), ambos [caminhos x meses].
+    """
+    base = np.asarray(base, dtype=float)
+    sinais = np.asarray(sinais, dtype=float)
+    cv = np.asarray(cv, dtype=float)
+    if mascara_despesa is None:
+        mascara_despesa = np.broadcast_to(sinais < 0, base.shape)
+    mascara = np.asarray(mascara_despesa, dtype=float)
+    processos = max(1, min(int(processos), os.cpu_count() or 1, n_caminhos))
+
+    sementes = np.random.SeedSequence(semente).spawn(processos)
+    tamanhos = [n_caminhos // processos + (1 if i < n_caminhos % processos else 0) for i in range(processos)]
+    tarefas = [(base, sinais, cv, mascara, float(saldo_inicial), n, s) for n, s in zip(tamanhos, sementes)]
+
+    if processos == 1:
+        partes = [_bloco(tarefas[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as ex:
+            partes = list(ex.map(_bloco, tarefas))
+    return np.concatenate([p[0] for p in partes]), np.concatenate([p[1] for p in partes])
+
+
+def resumir(saldos: np.ndarray, despesas: np.ndarray, despesas_planejadas: np.ndarray, meses: list) -> dict:
+    """
+    faixas: DF [mes, p5, p25, p50, p75, p95] do saldo de fim de mês
+    estouro: DF [mes, despesa_planejada, despesa_p50, prob_estouro] (P(despesas > planejado))
+    despesas_planejadas deve cobrir as mesmas caixinhas de `despesas` (mascara_despesa de simular).
+    """
+    pct = np.percentile(saldos, PERCENTIS, axis=0)
+    faixas = pd.DataFrame({"mes": meses, **{f"p{p}": pct[i] for i, p in enumerate(PERCENTIS)}})
+    estouro = pd.DataFrame({
+        "mes": meses,
+        "despesa_planejada": despesas_planejadas,
+        "despesa_p50": np.median(despesas, axis=0),
+        "prob_estouro": (despesas > despesas_planejadas[None, :]).mean(axis=0),
+    })
+    return {"faixas": faixas, "estouro": estouro}
@@ -0,0 +1,57 @@
+import random
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dinheiro
+
+
+@pytest.mark.parametrize("valor", [None, float("nan"), pd.NA, np.nan, ""])
+def test_centavos_vazio_vira_zero(valor):
+    assert dinheiro.centavos(valor) == 0
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("10.005", 1001),
+    (10.005, 1001),
+    (Decimal("0.125"), 13),
+    (-1.005, -101),
+    (0.1, 10),
+    (7, 700),
+])
+def test_centavos_arredonda_meio_para_cima(valor, esperado):
+    assert dinheiro.centavos(valor) == esperado
+
+
+def test_centavos_invalido():
+    with pytest.raises(ValueError):
+        dinheiro.centavos("dez reais")
+
+
+def test_centavos_array_igual_ao_escalar():
+    valores = [0.1, 0.2, 1.005, 2.675, -1.005, 1234.565, None]
+    assert dinheiro.centavos_array(valores).tolist() == [dinheiro.centavos(v) for v in valores]
+
+
+def test_centavos_array_nulos_em_dtypes_de_extensao():
+    assert dinheiro.centavos_array(pd.Series([1, None], dtype="Int64")).tolist() == [100, 0]
+    assert dinheiro.centavos_array(pd.Series([Decimal("1.005"), pd.NA], dtype=object)).tolist() == [101, 0]
+
+
+def test_somar_exato():
+    assert dinheiro.somar([0.1, 0.2, 0.3]) == 0.6
+
+
+def test_dividir_pj_exemplo():
+    partes = dinheiro.dividir_pj("0.10")
+    assert partes == {"empresa": Decimal("0.02"), "pessoa": Decimal("0.07"), "reserva": Decimal("0.01")}
+    assert sum(partes.values()) == Decimal("0.10")
+
+
+def test_dividir_pj_soma_sempre_o_total():
+    rng = random.Random(42)
+    for _ in range(2000):
+        total = Decimal(rng.randint(0, 10_000_000)) / 100
+        assert sum(dinheiro.dividir_pj(total).values()) == total
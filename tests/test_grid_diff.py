@@ -0,0 +1,65 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from grid_diff import diff_grid, linhas_marcadas, valor_py
+
+
+def _original():
+    return pd.DataFrame({
+        "id": [1, 2, 3],
+        "nome": ["Aluguel", None, "Mercado"],
+        "valor": [10, 20.5, np.nan],
+        "data": pd.to_datetime(["2024-01-05", "2024-02-10", None]),
+        "ativo": [True, False, True],
+        "selecionar": [False, False, False],
+    })
+
+
+def test_sem_edicao_nao_gera_patch():
+    original = _original()
+    assert diff_grid(original, original.copy(), "id") == []
+
+
+def test_patch_so_com_as_celulas_editadas():
+    original = _original()
+    editado = original.copy()
+    editado.loc[1, "valor"] = 99.9
+    editado.loc[2, "nome"] = "Feira"
+    assert diff_grid(original, editado, "id") == [
+        {"id": 2, "valor": 99.9},
+        {"id": 3, "nome": "Feira"},
+    ]
+
+
+def test_vazios_e_tipos_equivalentes_nao_contam_como_mudanca():
+    original = _original()
+    editado = original.copy()
+    editado["nome"] = ["Aluguel", "", "Mercado"]           # None == ""
+    editado["valor"] = [10.0, 20.5, None]                  # 10 == 10.0, NaN == None
+    editado["data"] = [dt.date(2024, 1, 5), pd.Timestamp("2024-02-10 13:45"), None]  # mesmo dia
+    assert diff_grid(original, editado, "id") == []
+
+
+def test_data_editada_vira_date():
+    original = _original()
+    editado = original.copy()
+    editado.loc[0, "data"] = pd.Timestamp("2024-01-06")
+    assert diff_grid(original, editado, "id") == [{"id": 1, "data": dt.date(2024, 1, 6)}]
+
+
+def test_colunas_ignoradas():
+    original = _original()
+    editado = original.copy()
+    editado["selecionar"] = [True, False, True]
+    assert diff_grid(original, editado, "id", ignorar=("selecionar",)) == []
+    assert linhas_marcadas(editado, "selecionar", "id") == [1, 3]
+
+
+def test_valor_py():
+    assert valor_py(np.int64(3)) == 3 and type(valor_py(np.int64(3))) is int
+    assert valor_py(np.nan) is None
+    assert valor_py(pd.NA) is None
+    assert valor_py(pd.NaT) is None
+    assert valor_py(pd.Timestamp("2024-03-01 10:00")) == dt.date(2024, 3, 1)
@@ -0,0 +1,74 @@
+import datetime as dt
+
+import pandas as pd
+
+import previsao_caixa as pc
+
+
+def _planos():
+    return pd.DataFrame([
+        # aluguel: dia 31 (vira o último dia em meses curtos), desde jan
+        {"id_plan": 1, "recorrencia_plan": "MENSAL", "dia_plan": 31, "valor_plan": 1000.0,
+         "dt_inicio_plan": "2025-01-01", "repeticoes_plan": -1, "fk_pessoa_id": 1, "tipo_caixinha": "SAIDA"},
+        # salário: dia 5, só 2 ocorrências contadas desde jan (jan e fev)
+        {"id_plan": 2, "recorrencia_plan": "MENSAL", "dia_plan": 5, "valor_plan": 3000.0,
+         "dt_inicio_plan": "2025-01-01", "repeticoes_plan": 2, "fk_pessoa_id": 1, "tipo_caixinha": "ENTRADA"},
+        # feira: toda semana a partir de 03/02
+        {"id_plan": 3, "recorrencia_plan": "SEMANAL", "dia_plan": 1, "valor_plan": 50.0,
+         "dt_inicio_plan": "2025-02-03", "repeticoes_plan": -1, "fk_pessoa_id": 2, "tipo_caixinha": "SAIDA"},
+        # IPVA: único, dia 20 do mês de início
+        {"id_plan": 4, "recorrencia_plan": "UNICO", "dia_plan": 20, "valor_plan": 800.0,
+         "dt_inicio_plan": "2025-03-01", "repeticoes_plan": -1, "fk_pessoa_id": 2, "tipo_caixinha": "SAIDA"},
+    ])
+
+
+def _ocorrencias():
+    oc = pc.expandir_planejados(_planos(), dt.date(2025, 2, 1), dt.date(2025, 3, 31))
+    oc["data"] = pd.to_datetime(oc["data"]).dt.date
+    return oc
+
+
+def test_mensal_usa_ultimo_dia_em_mes_curto():
+    oc = _ocorrencias()
+    assert sorted(oc.loc[oc["id_plan"] == 1, "data"]) == [dt.date(2025, 2, 28), dt.date(2025, 3, 31)]
+    assert (oc.loc[oc["id_plan"] == 1, "centavos"] == -100000).all()
+
+
+def test_mensal_respeita_repeticoes():
+    oc = _ocorrencias()
+    assert list(oc.loc[oc["id_plan"] == 2, "data"]) == [dt.date(2025, 2, 5)]
+    assert (oc.loc[oc["id_plan"] == 2, "centavos"] == 300000).all()
+
+
+def test_semanal_e_unico():
+    oc = _ocorrencias()
+    semanal = sorted(oc.loc[oc["id_plan"] == 3, "data"])
+    assert semanal[0] == dt.date(2025, 2, 3) and len(semanal) == 9
+    assert all((b - a).days == 7 for a, b in zip(semanal, semanal[1:]))
+    assert list(oc.loc[oc["id_plan"] == 4, "data"]) == [dt.date(2025, 3, 20)]
+
+
+def test_descontar_lancados_tira_a_ocorrencia_do_mes():
+    oc = _ocorrencias()
+    lancadas = pd.DataFrame({"fk_planejado_id": [1, 3], "dt_mov": ["2025-02-27", "2025-03-02"]})
+    resto = pc.descontar_lancados(oc, lancadas)
+    resto["data"] = pd.to_datetime(resto["data"]).dt.date
+
+    assert list(resto.loc[resto["id_plan"] == 1, "data"]) == [dt.date(2025, 3, 31)]
+    # a 1ª feira de março sai; as outras de março ficam
+    marco = sorted(d for d in resto.loc[resto["id_plan"] == 3, "data"] if d.month == 3)
+    assert marco[0] == dt.date(2025, 3, 10) and len(marco) == 4
+    assert len(resto) == len(oc) - 2
+
+
+def test_saldo_diario_acumula_a_partir_do_saldo_inicial():
+    eventos = pd.DataFrame({
+        "data": pd.to_datetime(["2025-02-01", "2025-02-03", "2025-02-03"]),
+        "fk_pessoa_id": [1, 1, 2],
+        "centavos": [-1000, 2500, -500],
+    })
+    s = pc.saldo_diario(eventos, dt.date(2025, 2, 1), dt.date(2025, 2, 3), {1: 10000})
+    p1 = s[s["fk_pessoa_id"] == 1]["saldo"].tolist()
+    p2 = s[s["fk_pessoa_id"] == 2]["saldo"].tolist()
+    assert p1 == [90.0, 90.0, 115.0]
+    assert p2 == [0.0, 0.0, -5.0]
@@ -0,0 +1,46 @@
+import numpy as np
+
+import simulacao_mc as mc
+
+MESES = [1, 2, 3]
+
+
+def _prob_estouro(historico: float, planejado: float) -> np.ndarray:
+    base = np.full((len(MESES), 1), historico)
+    sinais = np.array([-1.0])
+    saldos, despesas = mc.simular(base, sinais, np.array([0.3]), n_caminhos=20_000, semente=7)
+    r = mc.resumir(saldos, despesas, np.full(len(MESES), planejado), MESES)
+    return r["estouro"]["prob_estouro"].to_numpy()
+
+
+def test_historico_acima_do_planejado_estoura_mais_que_metade():
+    assert (_prob_estouro(historico=600.0, planejado=500.0) > 0.5).all()
+
+
+def test_historico_abaixo_do_planejado_estoura_menos_que_metade():
+    assert (_prob_estouro(historico=400.0, planejado=500.0) < 0.5).all()
+
+
+def test_mascara_limita_despesas_as_caixinhas_marcadas():
+    base = np.array([[100.0, 50.0]])
+    sinais = np.array([-1.0, -1.0])
+    _, despesas = mc.simular(base, sinais, np.zeros(2), n_caminhos=10, semente=1,
+                             mascara_despesa=np.array([[True, False]]))
+    assert np.allclose(despesas, 100.0)
+
+
+def test_resumir_percentis_em_ordem():
+    rng = np.random.default_rng(3)
+    saldos = rng.normal(1000, 200, size=(5000, len(MESES)))
+    despesas = rng.normal(500, 50, size=(5000, len(MESES)))
+    faixas = mc.resumir(saldos, despesas, np.full(len(MESES), 500.0), MESES)["faixas"]
+    colunas = [f"p{p}" for p in mc.PERCENTIS]
+    assert (np.diff(faixas[colunas].to_numpy(), axis=1) >= 0).all()
+
+
+def test_mesma_semente_reproduz_com_processos():
+    base = np.full((2, 2), 100.0)
+    sinais = np.array([1.0, -1.0])
+    a = mc.simular(base, sinais, np.array([0.2, 0.4]), n_caminhos=1000, semente=11, processos=2)
+    b = mc.simular(base, sinais, np.array([0.2, 0.4]), n_caminhos=1000, semente=11, processos=2)
+    assert np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])